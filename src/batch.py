@@ -0,0 +1,151 @@
+import argparse
+import contextlib
+import io
+import json
+import re
+import sys
+import threading
+
+from src import commands
+from src.commands import COMMANDS, ALIASES, parse_input
+from src.main import close_storage, exit_on_signals, open_storage
+from src.utils.styling import STYLES
+
+# ------------------------------
+# Batch mode: one command per line, no prompts, one JSON result per line
+#
+#   {"line": 3, "command": "add-phone", "status": "ok", "message": "Added phone to Ann."}
+#
+# status is "ok", "warning" or "error". Empty lines and lines starting with
+# "#" are skipped; "exit" (or one of its aliases) stops reading.
+# ------------------------------
+
+ANSI_PATTERN = re.compile(r"\x1b\[[0-9;]*m")
+
+# Handler results are styled strings: the colour tells how the command went.
+STATUS_STYLES = [("error", STYLES["error"]), ("warning", STYLES["warning"])]
+
+# By default the journal is fsynced once, when the batch is done.
+SYNC_AT_END = sys.maxsize
+
+
+class ThreadOutput:
+    """
+    Stand-in for sys.stdout that sends each thread's output to the stream it
+    captures into (see captured_output), or to the real stdout. Unlike
+    contextlib.redirect_stdout, commands in several threads can run at once.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+
+    def _target(self):
+        return getattr(self._local, "stream", None) or self.stream
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        return self._target().flush()
+
+    def isatty(self):
+        return self._target().isatty()
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+
+_install_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def captured_output(stream):
+    """Send what this thread prints to stream while the block runs."""
+    with _install_lock:
+        if not isinstance(sys.stdout, ThreadOutput):
+            sys.stdout = ThreadOutput(sys.stdout)
+        proxy = sys.stdout
+    previous = getattr(proxy._local, "stream", None)
+    proxy._local.stream = stream
+    try:
+        yield stream
+    finally:
+        proxy._local.stream = previous
+
+
+def status_of(text):
+    for status, prefix in STATUS_STYLES:
+        if text.startswith(prefix):
+            return status
+    return "ok"
+
+
+def run_command(command, args, book, notes):
+    """Run one parsed command without prompts. Returns (command, status, message)."""
+    command = ALIASES.get(command, command)
+    if command not in COMMANDS:
+        return command, "error", f"Unknown command '{command}'."
+
+    handler = COMMANDS[command][0]
+    output = io.StringIO()
+    try:
+        # Call the undecorated handler so errors come back as exceptions.
+        with captured_output(output):
+            result = getattr(handler, "__wrapped__", handler)(args, book, notes)
+    except Exception as e:
+        return command, "error", str(e) or type(e).__name__
+
+    # Warnings printed by the handler come before its result.
+    texts = [text for text in (output.getvalue() + (result or "")).splitlines() if text.strip()]
+    status = "ok"
+    for text in texts:
+        found = status_of(text)
+        if found == "error" or status == "ok":
+            status = found
+    return command, status, ANSI_PATTERN.sub("", "\n".join(texts)).strip()
+
+
+def run_batch(lines, book, notes, journals=(), out=None):
+    """Run command lines, writing a JSON result per command to out. Returns {status: count}."""
+    out = out or sys.stdout
+    counts = {"ok": 0, "warning": 0, "error": 0}
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        command, args = parse_input(line)
+        if ALIASES.get(command, command) == "exit":
+            break
+        command, status, message = run_command(command, args, book, notes)
+        counts[status] += 1
+        out.write(json.dumps({"line": number, "command": command, "status": status, "message": message}, ensure_ascii=False) + "\n")
+        for journal in journals:
+            journal.checkpoint()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.batch", description="Run assistant commands from a file without prompts.")
+    parser.add_argument("file", nargs="?", default="-", help="command file, one command per line (default: stdin)")
+    parser.add_argument("--flush-every", type=int, default=SYNC_AT_END, metavar="N", help="fsync the journal every N changes (default: once at the end)")
+    parser.add_argument("--on-duplicate", choices=("skip", "allow"), default="skip", help="phone or email already used by another contact")
+    options = parser.parse_args(argv)
+
+    commands.INTERACTIVE = False
+    commands.ON_DUPLICATE = options.on_duplicate
+    book, notes, journals = open_storage(sync_every=options.flush_every)
+    exit_on_signals()
+    source = sys.stdin if options.file == "-" else open(options.file, encoding="utf-8")
+    try:
+        with source:
+            # The unwrapped stream: colorama's wrapper would scan every result for escape codes.
+            counts = run_batch(source, book, notes, journals, sys.__stdout__)
+    finally:
+        close_storage(journals)
+    print(json.dumps({"summary": counts}), file=sys.stderr)
+    return 1 if counts["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,565 @@
+import argparse
+import gc
+import io
+import json
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from datetime import date, timedelta
+
+from src.models import columns
+from src.models.dedupe import find_duplicates
+from src.models.contacts import MATCHERS, AddressBook, Birthday, Phone, Record
+from src.models.notes import Note, Notes
+from src.storage import exchange, persistence, snapshot
+from src.utils.validators import validate_birthday
+from src.storage.blocks import CODECS
+from src.storage.journal import note_to_dict, open_contacts, record_to_dict
+from src.storage.persistence import atomic_write, safe_load
+
+# ------------------------------
+# Benchmarks
+#
+# python -m src.benchmark [command] [options] prints one JSON line per
+# result. Without a command it runs "formats".
+#   formats   size and speed of the storage formats
+#   inserts   cost of adding a contact as the book grows
+#   journal   throughput of changes with the journal fsyncing every change,
+#             every 64 changes, and without a journal (saved at exit)
+#   startup   time from opening the contacts file to the first lookup
+#   memory    bytes per contact record, traced with tracemalloc
+#   columns   searches and birthday windows: a scan over the records, the
+#             n-gram and calendar indexes, and the ColumnStore
+#   import    a CSV import validated in-process and in a process pool, and
+#             building fields with and without validation
+#   dates     parsing, validating and formatting birthdays
+#   dedupe    finding duplicate contacts in books with 1% typo'd copies
+#
+# formats: encodes and decodes a generated book and notes with each format and
+# reports the size and the throughput. Only the codec is timed: every
+# format turns the same items into bytes and back into Record / Note
+# objects, without building a book or its indexes. As in timeit, the
+# garbage collector is off while a run is timed: its passes over the
+# generated book would swamp the codec.
+#   pickle    a list of the items, read back with the safe unpickler
+#   json      the journal's plain-dict form of the items
+#   snapshot  the binary snapshot format (string table, dates as ordinals),
+#             read back through mmap as on startup
+# Then the .pkl files end to end, saved and loaded by the persistence layer
+# (building the book or notes included), as the plain pickle of earlier
+# versions and as block files with every codec available here.
+# ------------------------------
+
+CONTACTS = 50_000
+NOTES = 10_000
+ROUNDS = 3
+INSERT_SIZES = (1_000, 10_000, 100_000)
+INSERT_BATCH = 1_000
+JOURNAL_CONTACTS = 20_000
+STARTUP_SIZES = (10_000, 100_000)
+MEMORY_SIZES = (100_000,)
+COLUMN_CONTACTS = 100_000
+COLUMN_ROUNDS = 5
+COLUMN_SEARCHES = (("name", "99"), ("addresses", "kyiv"), ("name", "person 12"), ("phones", "00012"))
+COLUMN_WINDOWS = (7, 30, 365)
+IMPORT_CONTACTS = 100_000
+IMPORT_WORKERS = (1, 2)
+CALLS = 100_000
+# Every day from 1970-01-01: far more distinct dates than the parse cache holds.
+DISTINCT_DATES = 18_816
+DEDUPE_SIZES = (10_000, 100_000)
+DUPLICATES = 0.01
+STREETS = 500
+TAGS = 50
+
+
+def generated(contacts, notes, seed=0):
+    rnd = random.Random(seed)
+    streets = [f"{rnd.choice(('Shevchenka', 'Franka', 'Khreshchatyk', 'Sadova'))} Street {number}, Kyiv" for number in range(STREETS)]
+    tags = [f"tag{number}" for number in range(TAGS)]
+    book = AddressBook()
+    for number in range(contacts):
+        book.add_record(Record.from_values(
+            f"Contact {number}",
+            [f"+38050{number:07d}"] + ([f"+38067{number:07d}"] if number % 3 == 0 else []),
+            [f"contact{number}@example.com"] if number % 2 else [],
+            rnd.sample(streets, rnd.randrange(3)),
+            date(1950 + number % 60, 1 + number % 12, 1 + number % 28) if number % 4 else None,
+        ))
+    collection = Notes()
+    for number in range(notes):
+        note = Note(f"Note {number}", f"Note {number}: " + " ".join(rnd.choice(("call", "buy", "meet", "send", "plan", "check")) for _ in range(12)))
+        note.tags = dict.fromkeys(rnd.sample(tags, rnd.randrange(4)))
+        collection.add_note(note)
+    return book, collection
+
+
+def record_from_dict(data):
+    birthday = data["birthday"]
+    return Record.from_values(data["name"], data["phones"], data["emails"], data["addresses"], date.fromisoformat(birthday) if birthday else None)
+
+
+def note_from_dict(data):
+    note = Note(data["title"], data["content"])
+    note.tags = dict.fromkeys(data["tags"])
+    return note
+
+
+def read_snapshot(data, kind, decode):
+    with tempfile.NamedTemporaryFile(delete=False) as f:
+        f.write(data)
+    try:
+        view = snapshot.Snapshot(f.name, kind)
+        try:
+            return [decode(view, offset) for offset in view.offsets()]
+        finally:
+            view.close()
+    finally:
+        os.remove(f.name)
+
+
+def formats(kind):
+    """name -> (encode(version), decode(bytes)) for "contacts" or "notes"."""
+    if kind == "contacts":
+        to_dict, from_dict = record_to_dict, record_from_dict
+        dump, snapshot_kind, decode = snapshot.dump_contacts, snapshot.KIND_CONTACTS, snapshot.Snapshot.record_at
+    else:
+        to_dict, from_dict = note_to_dict, note_from_dict
+        dump, snapshot_kind, decode = snapshot.dump_notes, snapshot.KIND_NOTES, snapshot.Snapshot.note_at
+    return {
+        "pickle": (lambda version: pickle.dumps(list(version), pickle.HIGHEST_PROTOCOL), lambda data: safe_load(io.BytesIO(data))),
+        "json": (lambda version: json.dumps([to_dict(item) for item in version]).encode("utf-8"), lambda data: [from_dict(item) for item in json.loads(data)]),
+        "snapshot": (dump, lambda data: read_snapshot(data, snapshot_kind, decode)),
+    }
+
+
+def timed(function, argument):
+    """(seconds, result) of one call, with the garbage collector off."""
+    gc.collect()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        result = function(argument)
+        return time.perf_counter() - started, result
+    finally:
+        gc.enable()
+
+
+def best_time(function, argument, rounds):
+    best = result = None
+    for _ in range(rounds):
+        elapsed, result = timed(function, argument)
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def measure(kind, version, rounds):
+    results = []
+    for name, (encode, decode) in formats(kind).items():
+        encode_seconds, data = best_time(encode, version, rounds)
+        decode_seconds, items = best_time(decode, data, rounds)
+        if len(items) != len(version):
+            raise RuntimeError(f"{name} decoded {len(items)} of {len(version)} {kind}")
+        results.append({
+            "data": kind,
+            "format": name,
+            "bytes": len(data),
+            "encode_ms": round(encode_seconds * 1000, 1),
+            "decode_ms": round(decode_seconds * 1000, 1),
+            "encode_mb_s": round(len(data) / encode_seconds / 1e6, 1),
+            "decode_items_s": round(len(items) / decode_seconds),
+        })
+    return results
+
+
+def measure_files(kind, model, rounds):
+    """Size, save and load time of the .pkl file, plain and with each block codec."""
+    if kind == "contacts":
+        save, load = persistence.save_contacts, persistence.load_contacts
+    else:
+        save, load = persistence.save_notes, persistence.load_notes
+    savers = {"plain": lambda filename: atomic_write(filename, pickle.dumps(model.version(), pickle.HIGHEST_PROTOCOL))}
+    savers.update({codec: lambda filename, codec=codec: save(model, filename, codec) for codec in CODECS})
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, f"{kind}.pkl")
+        for codec, saver in savers.items():
+            save_seconds, _ = best_time(saver, filename, rounds)
+            load_seconds, _ = best_time(load, filename, rounds)
+            results.append({
+                "data": kind,
+                "file": f"pkl/{codec}",
+                "bytes": os.path.getsize(filename),
+                "save_ms": round(save_seconds * 1000, 1),
+                "load_ms": round(load_seconds * 1000, 1),
+            })
+    return results
+
+
+def run_formats(options):
+    book, notes = generated(options.contacts, options.notes)
+    for kind, model in (("contacts", book), ("notes", notes)):
+        yield from measure(kind, model.version(), options.rounds)
+        yield from measure_files(kind, model, options.rounds)
+
+
+def phone_book(size):
+    """A book of size contacts with one phone each, built without validation."""
+    book = AddressBook()
+    for number in range(size):
+        book.add_record(Record.from_values(f"Contact {number}", [f"050{number:07d}"]))
+    return book
+
+
+def add_contacts(book, batch):
+    """Add each (name, phone) of batch as the add command does: uniqueness check, add_record, add_phone."""
+    for name, phone in batch:
+        if book.find_owner("phones", phone) is None:
+            record = Record(name)
+            book.add_record(record)
+            record.add_phone(phone)
+
+
+def run_inserts(options):
+    """Time per insert at each book size: a batch of new contacts, best of the rounds."""
+    for size in options.sizes:
+        book = phone_book(size)
+        best = None
+        for round_number in range(options.rounds):
+            # New names every round: the book grows by the batch each time.
+            first = round_number * options.batch
+            batch = [(f"New {number}", f"067{number:07d}") for number in range(first, first + options.batch)]
+            elapsed, _ = timed(lambda batch: add_contacts(book, batch), batch)
+            best = elapsed if best is None else min(best, elapsed)
+        yield {"benchmark": "inserts", "contacts": size, "insert_us": round(best / options.batch * 1e6, 2)}
+
+
+def contact_changes(book, contacts):
+    """Add contacts with a phone each, then change every phone: 2 * contacts operations."""
+    for number in range(contacts):
+        record = Record(f"Contact {number}")
+        record.add_phone(f"050{number:07d}")
+        book.add_record(record)
+    for number in range(contacts):
+        book.find(f"Contact {number}").change_phone(f"050{number:07d}", f"067{number:07d}")
+
+
+def run_journal(options):
+    """
+    Operations per second and exit time with the journal at sync_every=1 and
+    64, and without one (the book is saved once at exit). at_risk is the most
+    operations a crash of the machine can lose.
+    """
+    operations = 2 * options.contacts
+    modes = [(f"journal, sync_every={every}", every) for every in (1, 64)] + [("no journal, save at exit", None)]
+    for mode, every in modes:
+        with tempfile.TemporaryDirectory(dir=options.directory) as directory:
+            filename = os.path.join(directory, "addressbook.snap")
+            if every is None:
+                book, journal = AddressBook(), None
+            else:
+                book, journal = open_contacts(filename, sync_every=every, compact_every=operations + 1)
+            elapsed, _ = timed(lambda book: contact_changes(book, options.contacts), book)
+            if journal is None:
+                exit_seconds, _ = timed(lambda book: persistence.save_contacts(book, filename), book)
+            else:
+                exit_seconds, _ = timed(lambda journal: journal.close(), journal)
+        yield {
+            "benchmark": "journal",
+            "mode": mode,
+            "operations": operations,
+            "ops_s": round(operations / elapsed),
+            "exit_ms": round(exit_seconds * 1000, 1),
+            "at_risk": operations if every is None else every,
+        }
+
+
+def run_startup(options):
+    """Open the contacts and find one by name: the snapshot (lazy, mmap) against the .pkl files, plain and in blocks."""
+    savers = {
+        "snapshot": (snapshot.save_contacts, snapshot.load_contacts),
+        "pkl/plain": (lambda book, filename: atomic_write(filename, pickle.dumps(book.version(), pickle.HIGHEST_PROTOCOL)), persistence.load_contacts),
+        "pkl/blocks": (persistence.save_contacts, persistence.load_contacts),
+    }
+    for size in options.sizes:
+        book, _ = generated(size, 0)
+        name = f"Contact {size // 2}"
+        with tempfile.TemporaryDirectory() as directory:
+            for file, (save, load) in savers.items():
+                filename = os.path.join(directory, file.replace("/", "-"))
+                save(book, filename)
+                seconds, found = best_time(lambda filename: load(filename).find(name), filename, options.rounds)
+                if found is None:
+                    raise RuntimeError(f"{file}: {name} not found")
+                yield {
+                    "benchmark": "startup",
+                    "contacts": size,
+                    "file": file,
+                    "bytes": os.path.getsize(filename),
+                    "first_lookup_ms": round(seconds * 1000, 2),
+                }
+
+
+def memory_records(size):
+    """Records with a phone each, an email on half, an address on a third and a birthday on a quarter of them."""
+    records = []
+    for number in range(size):
+        record = Record(f"Contact {number}")
+        record.add_phone(f"050{number:07d}")
+        if number % 2 == 0:
+            record.add_email(f"contact{number}@example.com")
+        if number % 3 == 0:
+            record.add_address(f"{number} Main Street, Kyiv")
+        if number % 4 == 0:
+            record.add_birthday(f"{1 + number % 28:02d}.{1 + number % 12:02d}.{1950 + number % 60}")
+        records.append(record)
+    return records
+
+
+def run_memory(options):
+    """Memory allocated by the records alone (no book, no indexes), as tracemalloc counts it."""
+    for size in options.sizes:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            records = memory_records(size)
+            allocated, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        yield {
+            "benchmark": "memory",
+            "contacts": len(records),
+            "mib": round(allocated / 2**20, 1),
+            "bytes_per_contact": round(allocated / size),
+        }
+        del records
+
+
+def column_book(contacts, seed=0):
+    """Contacts "Person <n>" with a phone, an address in one of a few cities and, for three in four, a birthday."""
+    rnd = random.Random(seed)
+    cities = ("Kyiv", "Lviv", "Odesa", "Kharkiv", "Dnipro")
+    book = AddressBook()
+    for number in range(contacts):
+        book.add_record(Record.from_values(
+            f"Person {number}",
+            [f"050{number:07d}"],
+            [],
+            [f"{rnd.randrange(1, 200)} Street {number % 1000}, {rnd.choice(cities)}"],
+            date(1950 + number % 60, 1 + number % 12, 1 + number % 28) if number % 4 else None,
+        ))
+    return book
+
+
+def run_columns(options):
+    """Best times of each search and birthday window, with the records, the book's indexes and the ColumnStore."""
+    book = column_book(options.contacts)
+    start = date.today()
+
+    def result(query, method, seconds, found):
+        return {"benchmark": "columns", "contacts": options.contacts, "query": query, "method": method, "ms": round(seconds * 1000, 2), "found": len(found)}
+
+    for field, query in COLUMN_SEARCHES:
+        matches = MATCHERS[field]
+        label = f"search {field} {query!r}"
+        yield result(label, "scan", *best_time(lambda query: [record for record in book.data.values() if matches(record, query)], query, options.rounds))
+        # A query shorter than the n-gram index takes the scan above.
+        yield result(label, "index", *best_time(lambda query: book.search(field, query), query, options.rounds))
+    for days in COLUMN_WINDOWS:
+        yield result(f"birthdays {days} days", "index", *best_time(lambda days: book.upcoming_birthdays(start, days), days, options.rounds))
+
+    seconds, _ = timed(lambda book: book.use_columns(), book)
+    yield {"benchmark": "columns", "contacts": options.contacts, "build_ms": round(seconds * 1000, 1)}
+    store = book.columns
+    for field, query in COLUMN_SEARCHES:
+        yield result(f"search {field} {query!r}", "columns", *best_time(lambda query: store.search(field, query), query, options.rounds))
+    numpy = columns.np
+    for method in ("columns+numpy", "columns") if numpy is not None else ("columns",):
+        # The store falls back to a loop over the array without NumPy.
+        columns.np = numpy if method == "columns+numpy" else None
+        try:
+            for days in COLUMN_WINDOWS:
+                yield result(f"birthdays {days} days", method, *best_time(lambda days: store.upcoming(start, days), days, options.rounds))
+        finally:
+            columns.np = numpy
+
+
+def per_call_us(function, rounds, number=CALLS):
+    """Microseconds per call of function(), best of the rounds, as timeit measures it."""
+    return round(min(timeit.repeat(function, number=number, repeat=rounds)) / number * 1e6, 3)
+
+
+def validated_csv(filename, workers):
+    """Read and validate every row of a contacts CSV file without inserting them. Returns the number of rows."""
+    with open(filename, encoding="utf-8", errors="surrogateescape", newline="") as f:
+        rows = exchange.utf8_checked(exchange.read_csv(f, exchange.CONTACT_FIELDS))
+        return sum(len(chunk) for chunk in exchange.validated_chunks(exchange.chunked(rows), exchange.validate_contact_row, workers))
+
+
+def run_import(options):
+    """Validation stage and full import of a generated CSV file per worker count; then Phone and Birthday built with and without validation."""
+    book, _ = generated(options.contacts, 0)
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "contacts.csv")
+        exchange.export_contacts(filename, book)
+        del book
+        for workers in options.workers:
+            validation_seconds, rows = timed(lambda workers: validated_csv(filename, workers), workers)
+            import_seconds, result = timed(lambda workers: exchange.import_contacts(filename, AddressBook(), workers), workers)
+            if result.imported != options.contacts:
+                raise RuntimeError(f"imported {result.imported} of {options.contacts} contacts: {result.errors[:3]}")
+            yield {
+                "benchmark": "import",
+                "contacts": rows,
+                "workers": workers,
+                "validation_s": round(validation_seconds, 2),
+                "import_s": round(import_seconds, 2),
+            }
+    birthday = date(2000, 2, 1)
+    fields = {
+        "Phone(...)": lambda: Phone("+380501234567"),
+        "Phone.trusted": lambda: Phone.trusted("+380501234567"),
+        "Birthday(...)": lambda: Birthday("01.02.2000"),
+        "Birthday.trusted": lambda: Birthday.trusted(birthday),
+    }
+    for name, build in fields.items():
+        yield {"benchmark": "import", "field": name, "us": per_call_us(build, options.rounds)}
+
+
+def run_dates(options):
+    """Microseconds per call of the birthday validators and of the cached birthday forms, with timeit."""
+    first = date(1970, 1, 1)
+    distinct = [(first + timedelta(days=number)).strftime("%d.%m.%Y") for number in range(DISTINCT_DATES)]
+    record = Record.from_values("Contact", birthday=date(2000, 2, 1))
+    calls = {
+        "validate_birthday, same string": lambda: validate_birthday("01.02.2000"),
+        "validate_birthday, date object": lambda: validate_birthday(first),
+        "Birthday('01.02.2000')": lambda: Birthday("01.02.2000"),
+        "str_birthday": record.str_birthday,
+        "has_birthday": lambda: record.has_birthday("02.2000"),
+    }
+    for name, call in calls.items():
+        yield {"benchmark": "dates", "call": name, "us": per_call_us(call, options.rounds)}
+
+    def validate_distinct():
+        for text in distinct:
+            validate_birthday(text)
+
+    # Each pass misses the cache: it holds the last dates of the previous pass.
+    yield {"benchmark": "dates", "call": f"validate_birthday, {DISTINCT_DATES} distinct", "us": round(per_call_us(validate_distinct, options.rounds, 1) / DISTINCT_DATES, 3)}
+
+
+def random_name(rnd):
+    """Two pronounceable random words: distinct names rarely share a phonetic code."""
+    first, last = ("".join(rnd.choice("bcdfgklmnprstvz") + rnd.choice("aeiou") for _ in range(rnd.randint(2, 4))) for _ in range(2))
+    return f"{first.title()} {last.title()}"
+
+
+def with_typo(rnd, name):
+    """name with one letter (not the first) replaced, dropped or doubled."""
+    position = rnd.randrange(1, len(name))
+    letter = rnd.choice("abcdefghijklmnopqrstuvwxyz")
+    return name[:position] + rnd.choice((letter, "", name[position] * 2)) + name[position + 1:]
+
+
+def dedupe_records(size, seed=0):
+    """size records with random names and their own phone; DUPLICATES of them are typo'd copies sharing a phone."""
+    rnd = random.Random(seed)
+    copies = int(size * DUPLICATES)
+    records = [Record.from_values(random_name(rnd), [f"+38050{number:07d}"]) for number in range(size - copies)]
+    for original in rnd.sample(records, copies):
+        records.append(Record.from_values(with_typo(rnd, original.name.value), [original.phones[0].value]))
+    rnd.shuffle(records)
+    return records
+
+
+def run_dedupe(options):
+    """Time of find_duplicates over synthetic books, and the groups it finds."""
+    for size in options.sizes:
+        records = dedupe_records(size)
+        seconds, groups = timed(find_duplicates, records)
+        yield {
+            "benchmark": "dedupe",
+            "contacts": size,
+            "seconds": round(seconds, 2),
+            "us_per_contact": round(seconds / size * 1e6, 1),
+            "groups": len(groups),
+        }
+
+
+def sizes(text):
+    """argparse type: comma-separated counts, e.g. 1000,10000."""
+    try:
+        values = [int(value) for value in text.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated numbers, got {text!r}") from None
+    if any(value <= 0 for value in values):
+        raise argparse.ArgumentTypeError("sizes must be positive")
+    return values
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.benchmark", description="Measure the storage formats and the address book. Without a command, runs formats.")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+
+    command = commands.add_parser("formats", help="compare the size and speed of the storage formats")
+    command.add_argument("--contacts", type=int, default=CONTACTS, help=f"contacts to generate (default: {CONTACTS})")
+    command.add_argument("--notes", type=int, default=NOTES, help=f"notes to generate (default: {NOTES})")
+    command.add_argument("--rounds", type=int, default=ROUNDS, help=f"runs per measurement, the best counts (default: {ROUNDS})")
+    command.set_defaults(run=run_formats)
+
+    command = commands.add_parser("inserts", help="cost of adding a contact as the book grows")
+    command.add_argument("--sizes", type=sizes, default=INSERT_SIZES, help=f"book sizes (default: {','.join(map(str, INSERT_SIZES))})")
+    command.add_argument("--batch", type=int, default=INSERT_BATCH, help=f"contacts added per round (default: {INSERT_BATCH})")
+    command.add_argument("--rounds", type=int, default=ROUNDS, help=f"rounds per size, the best counts (default: {ROUNDS})")
+    command.set_defaults(run=run_inserts)
+
+    command = commands.add_parser("journal", help="throughput of changes with and without the journal")
+    command.add_argument("--contacts", type=int, default=JOURNAL_CONTACTS, help=f"contacts to add, then change (default: {JOURNAL_CONTACTS})")
+    command.add_argument("--directory", default=".", help="where to write the files; fsync costs depend on the disk (default: .)")
+    command.set_defaults(run=run_journal)
+
+    command = commands.add_parser("startup", help="time from opening the contacts to the first lookup")
+    command.add_argument("--sizes", type=sizes, default=STARTUP_SIZES, help=f"book sizes (default: {','.join(map(str, STARTUP_SIZES))})")
+    command.add_argument("--rounds", type=int, default=ROUNDS, help=f"runs per measurement, the best counts (default: {ROUNDS})")
+    command.set_defaults(run=run_startup)
+
+    command = commands.add_parser("memory", help="bytes per contact record")
+    command.add_argument("--sizes", type=sizes, default=MEMORY_SIZES, help=f"contacts to build (default: {','.join(map(str, MEMORY_SIZES))})")
+    command.set_defaults(run=run_memory)
+
+    command = commands.add_parser("columns", help="searches and birthday windows with and without the ColumnStore")
+    command.add_argument("--contacts", type=int, default=COLUMN_CONTACTS, help=f"contacts to generate (default: {COLUMN_CONTACTS})")
+    command.add_argument("--rounds", type=int, default=COLUMN_ROUNDS, help=f"runs per measurement, the best counts (default: {COLUMN_ROUNDS})")
+    command.set_defaults(run=run_columns)
+
+    command = commands.add_parser("import", help="CSV import in-process and in a process pool")
+    command.add_argument("--contacts", type=int, default=IMPORT_CONTACTS, help=f"contacts in the CSV file (default: {IMPORT_CONTACTS})")
+    command.add_argument("--workers", type=sizes, default=IMPORT_WORKERS, help=f"worker counts to try (default: {','.join(map(str, IMPORT_WORKERS))})")
+    command.add_argument("--rounds", type=int, default=ROUNDS, help=f"timeit repeats for the field timings, the best counts (default: {ROUNDS})")
+    command.set_defaults(run=run_import)
+
+    command = commands.add_parser("dates", help="parsing, validating and formatting birthdays")
+    command.add_argument("--rounds", type=int, default=ROUNDS, help=f"timeit repeats, the best counts (default: {ROUNDS})")
+    command.set_defaults(run=run_dates)
+
+    command = commands.add_parser("dedupe", help="finding duplicate contacts")
+    command.add_argument("--sizes", type=sizes, default=DEDUPE_SIZES, help=f"book sizes (default: {','.join(map(str, DEDUPE_SIZES))})")
+    command.set_defaults(run=run_dedupe)
+
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] not in commands.choices and argv[0] not in ("-h", "--help"):
+        argv = ["formats", *argv]
+    options = parser.parse_args(argv)
+    for result in options.run(options):
+        print(json.dumps(result), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,26 @@
 
 import sys
-from datetime import datetime, timedelta
+from datetime import timedelta
+from itertools import islice
 
 from src.decorators import input_error
+from src.models import dedupe
 from src.models.contacts import Record
 from src.models.notes import Note
-from src.utils.validators import validate_phone, validate_email, validate_birthday, validate_address
+from src.storage import exchange
+from src.utils.validators import validate_phone, validate_email, validate_birthday, validate_address, format_date, today as current_date
 
-from src.utils.styling import err, wrn, grt, suc, inp, sch, table_display_contacts, table_display_notes, table_display_help
+from src.utils.styling import err, wrn, grt, suc, inp, sch, table_display_contacts, table_display_notes, table_display_tags, table_display_help
 
 # Modified parse_input to support string with (white)spaces.
 def parse_input(user_input):
+    if '"' not in user_input and "'" not in user_input:
+        # Nothing quoted: plain split on spaces.
+        args = [arg for arg in user_input.strip().split(" ") if arg]
+        if not args:
+            return "", []
+        return args[0].lower(), args[1:]
+
     args = []
     current = ""
     in_quotes = False
@@ -42,18 +52,29 @@ def parse_input(user_input):
     return args[0].lower(), args[1:]
 
 
+# Batch mode (src.batch) turns prompts off. A phone or email already used by
+# another contact is then added anyway ("allow") or skipped ("skip").
+INTERACTIVE = True
+ON_DUPLICATE = "skip"
+
+
+def require_interactive(command):
+    if not INTERACTIVE:
+        raise ValueError(f"'{command}' needs its arguments when prompts are off.")
+
+
 def is_value_unique(book, field, value, current_name=None):
-    for name, record in book.data.items():
-        if name == current_name:
-            continue
-        items = getattr(record, field)
-        if any(item.value == value for item in items):
-            return name  # found in another record
-    return None
+    # Dictionary lookup in the book's phone/email index instead of a full scan.
+    return book.find_owner(field, value, current_name)
 
 
 def confirm_override_if_duplicate(book, field, value, current_name=None):
     found_in = is_value_unique(book, field, value, current_name)
+    if found_in and not INTERACTIVE:
+        if ON_DUPLICATE == "allow":
+            return True
+        print(wrn(f"This {field[:-1]} is already used in contact '{found_in}'. Skipped."))
+        return False
     if found_in:
         print(wrn(f"This {field[:-1]} is already used in contact '{found_in}'. Proceed anyway? (y/n): "), end="")
         answer = input().strip().lower()
@@ -63,6 +84,81 @@ def confirm_override_if_duplicate(book, field, value, current_name=None):
     return True
 
 
+# ------------------------------
+# Paging of long listings
+#
+# "all", "all-note" and the search commands take these options anywhere
+# after the command:
+#   --page N     show page N (from 1), PAGE_SIZE rows per page
+#   --size K     rows per page
+#   --limit K    only the first K rows
+#   --sort KEY   "all": name or birthday, "all-note": title, "find-note": rank
+#   --pager      page after page, Enter for the next one, q to stop
+# Rows come from an iterator that starts at the page, so a page of a large
+# book reads only its own rows; sorted orders are kept by the book's indexes.
+# ------------------------------
+
+PAGE_SIZE = 50
+# Option -> type of its value (None: a flag).
+PAGE_OPTIONS = {"--page": int, "--size": int, "--limit": int, "--sort": str, "--pager": None}
+
+
+def split_paging(args):
+    """Split paging options off args. Returns (other args, {option name: value})."""
+    rest = []
+    options = {}
+    args = iter(args or ())
+    for arg in args:
+        option = arg.lower()
+        if option not in PAGE_OPTIONS:
+            rest.append(arg)
+            continue
+        kind = PAGE_OPTIONS[option]
+        if kind is None:
+            options[option[2:]] = True
+            continue
+        value = next(args, None)
+        if value is None:
+            raise ValueError(f"{option} needs a value.")
+        options[option[2:]] = int(value) if kind is int else value.lower()
+    for name in ("page", "size", "limit"):
+        if options.get(name, 1) < 1:
+            raise ValueError(f"--{name} must be at least 1.")
+    return rest, options
+
+
+def show_rows(rows_from, total, title, display, options):
+    """
+    Display total rows as options ask: the first --limit rows, page after
+    page with --pager, or one page (the first by default). rows_from(offset)
+    returns an iterator starting at row offset; only the shown rows are read.
+    """
+    size = options.get("size", PAGE_SIZE)
+    if "limit" in options:
+        shown = min(options["limit"], total)
+        return display(islice(rows_from(0), shown), title, f"First {shown} of {total}" if shown < total else None)
+
+    pages = max(1, -(-total // size))
+    if options.get("pager") and INTERACTIVE:
+        rows = rows_from(0)
+        for page in range(1, pages + 1):
+            display(islice(rows, size), title, f"Page {page} of {pages}")
+            if page < pages and input(inp("Enter: next page, q: stop ")).strip().lower() == "q":
+                break
+        return ""
+
+    page = options.get("page", 1)
+    if page > pages:
+        return wrn(f"There {'is' if pages == 1 else 'are'} only {pages} page{'' if pages == 1 else 's'} of {size}.")
+    caption = f"Page {page} of {pages}, {total} in all. More: --page N, --pager" if pages > 1 else None
+    return display(islice(rows_from((page - 1) * size), size), title, caption)
+
+
+def show_found(found, title, display, options):
+    """show_rows over a list of search results."""
+    return show_rows(lambda offset: iter(found[offset:]), len(found), title, display, options)
+
+
 @input_error
 def show_help(args=None, book=None, notes=None):
     """
@@ -81,10 +177,12 @@ def add_contact(args=None, book=None, notes=None):
     """
     Interactively add a new contact, one field at a time.
     Prevents duplicate names. Uses other handlers for fields like phones/emails.
+    With arguments (add <name> [<phone> ...]) nothing is asked.
     """
-    if len(args) > 0:
-        return(wrn("To add a value, enter the add command and press Enter."))
-        
+    if args:
+        return add_contact_with_phones(args, book)
+    require_interactive("add")
+
     while True:
         name = input(inp('Enter contact name (Write "Cancel" to stop): ')).strip()
         if name.lower() == "cancel":
@@ -132,6 +230,25 @@ def add_contact(args=None, book=None, notes=None):
     print(suc(f"Contact '{name}' added successfully."))
 
 
+def add_contact_with_phones(args, book):
+    name, *phones = args
+    if name.title() in book.data:
+        return wrn(f"Contact '{name}' already exists.")
+    phones = [validate_phone(phone) for phone in phones]
+    # Every phone is checked for duplicates (and confirmed) before the contact
+    # is added, so it is added whole: with its phones, or not at all.
+    record = Record(name)
+    results = []
+    for phone in phones:
+        if confirm_override_if_duplicate(book, "phones", phone, name):
+            record.add_phone(phone)
+            results.append(suc(f"Added phone to {name}."))
+        else:
+            results.append(wrn(f"Phone {phone} was not added."))
+    book.add_record(record)
+    return "\n".join([suc(f"Contact '{name}' added successfully."), *results])
+
+
 @input_error
 def add_phone(args=None, book=None, notes=None):
     name, phone = args
@@ -152,9 +269,8 @@ def change_name(args=None, book=None, notes=None):
     name, new_name = args
     record = book.find(name)
     if record:
+        # The book re-keys the record and its indexes on rename.
         record.change_name(new_name)
-        book.delete(name)
-        book.add_record(record)
         return suc(f"{name}'s name updated.")
     return err("Contact not found.")
 
@@ -341,57 +457,123 @@ def delete_birthday(args=None, book=None, notes=None):
 
 @input_error
 def birthdays(args=None, book=None, notes=None):
+    """
+    Show birthdays in the next N days, sorted by date.
+    Optional second argument groups them by "week" or "month".
+    """
     delta = int(args[0]) if args else 7
-    today = datetime.today().date()
-    upcoming = []
-    for rec in book.data.values():
-        if rec.has_birthday():
-            bday = rec.birthday.value.replace(year=today.year)
-            if bday < today:
-                bday = bday.replace(year=today.year + 1)
-            if 0 <= (bday - today).days <= delta:
-                upcoming.append(f"{rec.str_name()}: {rec.str_birthday()}")
-    if upcoming:
-        return sch("\n".join(upcoming))
-    return wrn("No upcoming birthdays.")
+    group = args[1].lower() if len(args) > 1 else None
+    if group not in (None, "week", "month"):
+        return wrn(f"Unknown grouping: '{group}'. Use week or month.")
+
+    upcoming = book.upcoming_birthdays(current_date(), delta)
+    if not upcoming:
+        return wrn("No upcoming birthdays.")
+
+    lines = []
+    heading = None
+    for when, rec in upcoming:
+        if group == "week":
+            monday = when - timedelta(days=when.weekday())
+            current = f"Week of {format_date(monday)}:"
+        elif group == "month":
+            current = f"{when.strftime('%B %Y')}:"
+        else:
+            current = None
+        if current != heading:
+            lines.append(current)
+            heading = current
+        lines.append(f"{'  ' if group else ''}{rec.str_name()}: {rec.str_birthday()}")
+    return sch("\n".join(lines))
 
 
 def find_contact(args=None, book=None, notes=None):
-    field, query = args
-    found_records = []
+    """
+    Find contacts whose field contains the keyword.
+    "find fuzzy <name>" tolerates typos and ranks the closest names first.
+    """
+    args, options = split_paging(args)
+    field, query, *more = args
 
     field = field.lower()
 
-    for record in book.data.values():
-        if "name" in field:
-            if record.has_name(query):
-                found_records.append(record)
-        elif "phone" in field:
-            if record.has_phone(query):
-                found_records.append(record)
-        elif "email" in field:
-            if record.has_email(query):
-                found_records.append(record)
-        elif "address" in field:
-            if record.has_address(query):
-                found_records.append(record)
-        elif "birthday" in field:
-            if record.has_birthday(query):
-                found_records.append(record)
-        else:
-            return wrn(f"Unknown field: '{field}'.")
-
-    if found_records:    
-        return table_display_contacts(found_records, "Found Records")
+    if field == "fuzzy":
+        found_records = book.fuzzy_search(" ".join([query, *more]))
+        if found_records:
+            return show_found(found_records, "Closest Names", table_display_contacts, options)
+        return wrn("No similar names found.")
+    elif more:
+        return wrn("Put a keyword with spaces in quotes.")
+    elif "name" in field:
+        found_records = book.search("name", query)
+    elif "phone" in field:
+        found_records = book.search("phones", query)
+    elif "email" in field:
+        found_records = book.search("emails", query)
+    elif "address" in field:
+        found_records = book.search("addresses", query)
+    elif "birthday" in field:
+        found_records = book.search("birthday", query)
+    else:
+        return wrn(f"Unknown field: '{field}'.")
+
+    if found_records:
+        return show_found(found_records, "Found Records", table_display_contacts, options)
 
     return wrn("No matching contacts found.")
 
 
+@input_error
+def dedupe_contacts(args=None, book=None, notes=None):
+    """
+    Find likely duplicate contacts and offer to merge each group into its first contact.
+    Optional arguments: the minimum score (0..1) and "merge" to merge every group without asking.
+    Without prompts (batch mode) groups are only listed unless "merge" is given.
+    """
+    min_score = float(args[0]) if args and args[0] != "merge" else dedupe.MIN_SCORE
+    merge_all = "merge" in (args or ())
+    groups = dedupe.find_duplicates(book.data.values(), min_score)
+    if not groups:
+        return wrn("No duplicate contacts found.")
+
+    merged = 0
+    for score, records in groups:
+        keep = records[0].name.value
+        if not merge_all:
+            table_display_contacts(records, f"Possible duplicates (score {score:.2f})")
+            if not INTERACTIVE:
+                continue
+            print(wrn(f"Merge into '{keep}'? (y/n/q): "), end="")
+            answer = input().strip().lower()
+            if answer == "q":
+                break
+            if answer != "y":
+                continue
+        dedupe.merge(book, records)
+        merged += 1
+
+    if not merged:
+        return wrn(f"Found {len(groups)} groups of duplicates, none merged.")
+    return suc(f"Merged {merged} of {len(groups)} groups of duplicates.")
+
+
 @input_error
 def add_note(args=None, book=None, notes=None):
-    if len(args) > 0:
-        return(wrn("To add a note, enter the add-note command and press Enter."))
-    
+    """
+    Interactively add a note with its tags.
+    With arguments (add-note <title> <content> [<tag> ...]) nothing is asked.
+    """
+    if args:
+        title, content, *tags = args
+        if title in notes.notes:
+            return wrn(f"Note with title '{title}' already exists.")
+        note = Note(title, content)
+        for tag in dict.fromkeys(tags):
+            note.add_tag(tag)
+        notes.add_note(note)
+        return suc(f"Note '{title}' added successfully.")
+    require_interactive("add-note")
+
     while True:
         title = input(inp("Enter note title: ")).strip()
         if not title:
@@ -422,10 +604,15 @@ def add_note(args=None, book=None, notes=None):
 def change_note(args=None, book=None, notes=None):
     """
     Interactively change the title and text of an existing note.
+    With arguments (change-note <title> <new_content>) only the text is replaced.
     """
-    if len(args) > 0:
-        return(wrn("To change a note, enter the change-note command and press Enter."))
-    
+    if args:
+        title, new_text = args
+        if notes.change_note(title, new_text):
+            return suc(f"Note '{title}' updated successfully.")
+        return err(f"Note '{title}' not found.")
+    require_interactive("change-note")
+
     if not notes.notes:
         print(wrn("No notes to change."))
         return
@@ -439,7 +626,7 @@ def change_note(args=None, book=None, notes=None):
     print(sch(f"Current text: {note.content}"))
     new_text = input(inp("Enter new text (leave empty to keep current): ")).strip()
     if new_text:
-        note.content = new_text
+        note.change_content(new_text)
 
     while True:
         new_title = input(inp("Enter new title (leave empty to keep current): ")).strip()
@@ -449,9 +636,8 @@ def change_note(args=None, book=None, notes=None):
             print(wrn(f"Note with title '{new_title}' already exists."))
             continue
         else:
-            # Rename in the dict
-            notes.notes[new_title] = notes.notes.pop(title)
-            note.title = new_title
+            # Notes re-keys the note and its indexes on rename
+            note.change_title(new_title)
             break
 
     print(suc(f"Note '{note.title}' updated successfully."))
@@ -462,12 +648,8 @@ def change_title(args=None, book=None, notes=None):
     title, new_title = args
     note = notes.find(title)
     if note:
-        ## make a copy of record
+        ## Notes re-keys the note and its indexes on rename
         note.change_title(new_title)
-        ## delete record
-        notes.delete_note(title)
-        ## add a new record    
-        notes.add_note(note)
         return suc(f"{title}'s name updated.")
     return err("Note not found.")
 
@@ -482,10 +664,19 @@ def delete_note(args=None, book=None, notes=None):
 
 @input_error
 def find_note(args=None, book=None, notes=None):
+    """Show notes containing the keyword, in insertion order or with --sort rank best matches first."""
+    args, options = split_paging(args)
+    order = options.get("sort")
+    if order not in (None, "rank"):
+        return wrn(f"Unknown sort: '{order}'. Use rank.")
     keyword = args[0]
-    found = notes.find_note(keyword)
+    if len(args) > 1:
+        # Word search through the full-text index: all, any or phrase
+        found = notes.search(keyword, args[1].lower())
+    else:
+        found = notes.find_note(keyword, ranked=order == "rank")
     if found:
-        return table_display_notes(found, keyword)
+        return show_found(found, keyword, table_display_notes, options)
     return sch("No notes found.")
 
 
@@ -501,13 +692,34 @@ def add_tag(args=None, book=None, notes=None):
 
 @input_error
 def find_tag(args=None, book=None, notes=None):
+    args, options = split_paging(args)
     tag = args[0]
-    found = notes.find_by_tag(tag)
+    if len(args) > 1:
+        found = notes.find_by_tags(args)
+    else:
+        found = notes.find_by_tag(tag)
     if found:
-        return table_display_notes(found, tag)
+        return show_found(found, " & ".join(args), table_display_notes, options)
     return wrn("No notes found with this tag.")
 
 
+@input_error
+def find_any_tag(args=None, book=None, notes=None):
+    args, options = split_paging(args)
+    found = notes.find_by_tags(args, match_all=False)
+    if found:
+        return show_found(found, " | ".join(args), table_display_notes, options)
+    return wrn("No notes found with these tags.")
+
+
+@input_error
+def all_tags(args=None, book=None, notes=None):
+    counts = notes.tag_counts()
+    if not counts:
+        return wrn("No tags found.")
+    return table_display_tags(counts, "All Tags")
+
+
 @input_error
 def edit_tag(args=None, book=None, notes=None):
     title, old_tag, new_tag = args
@@ -528,26 +740,83 @@ def delete_tag(args=None, book=None, notes=None):
     return err("Note not found.")
 
 
+@input_error
+def import_data(args=None, book=None, notes=None):
+    """
+    Import contacts (default) or notes from a .csv, .jsonl or .vcf file.
+    Bad rows are reported and skipped; the rest are imported.
+    An optional worker count validates rows in that many processes.
+    """
+    filename = args[0]
+    kind = args[1].lower() if len(args) > 1 else "contacts"
+    workers = int(args[2]) if len(args) > 2 else exchange.WORKERS
+    if kind == "contacts":
+        result = exchange.import_contacts(filename, book, workers)
+    elif kind == "notes":
+        result = exchange.import_notes(filename, notes, workers)
+    else:
+        return wrn(f"Unknown data kind: '{kind}'. Use contacts or notes.")
+
+    lines = [suc(f"Imported {result.imported} {kind} from {filename}.")]
+    if result.failed:
+        lines.append(wrn(f"Skipped {result.failed} rows:"))
+        lines += [wrn(f"  line {line}: {message}") for line, message in result.errors]
+        if result.failed > len(result.errors):
+            lines.append(wrn(f"  ... and {result.failed - len(result.errors)} more."))
+    return "\n".join(lines)
+
+
+@input_error
+def export_data(args=None, book=None, notes=None):
+    """
+    Export contacts (default) or notes to a .csv, .jsonl or .vcf file.
+    """
+    filename = args[0]
+    kind = args[1].lower() if len(args) > 1 else "contacts"
+    if kind == "contacts":
+        count = exchange.export_contacts(filename, book)
+    elif kind == "notes":
+        count = exchange.export_notes(filename, notes)
+    else:
+        return wrn(f"Unknown data kind: '{kind}'. Use contacts or notes.")
+    return suc(f"Exported {count} {kind} to {filename}.")
+
+
 @input_error
 def all_contacts(args=None, book=None, notes=None):
-    if not book or not book.data:
+    """
+    Show contacts a page at a time (options above show_rows), in book order
+    or with --sort name / birthday (by month and day, no birthday last).
+    """
+    _, options = split_paging(args)
+    order = options.get("sort")
+    if order not in (None, "name", "birthday"):
+        return wrn(f"Unknown sort: '{order}'. Use name or birthday.")
+    if not book or not len(book):
         return wrn("No records found.")
-    table_display_contacts(book.data.values(), "All Contacts")
+    return show_rows(lambda offset: book.ordered(order, offset), len(book), "All Contacts", table_display_contacts, options)
 
 
+@input_error
 def all_notes(args=None, book=None, notes=None):
+    """Show notes a page at a time, in insertion order or with --sort title."""
+    _, options = split_paging(args)
+    order = options.get("sort")
+    if order not in (None, "title"):
+        return wrn(f"Unknown sort: '{order}'. Use title.")
     if not notes or not notes.notes:
         return wrn("No notes found.")
-    return table_display_notes(notes.notes.values(), "All Notes")
+    return show_rows(lambda offset: notes.ordered(order, offset), len(notes.notes), "All Notes", table_display_notes, options)
 
 
 @input_error
 def exit_bot(args=None, book=None, notes=None):
     """
-    Save data and exit the bot.
+    Exit the bot. Every change is already in the journals; whoever opened the
+    storage closes it on the way out (see main.close_storage), which folds
+    them into the snapshots.
     """
     print(grt("Saving data and exiting... Goodbye!"))
-    book.save_to_file()
     sys.exit()
 
 
@@ -565,11 +834,14 @@ COMMANDS = {
     "help": (show_help, "help", "Show available commands", "Util"),
     "hello": (hello, "hello", "Greets the user", "Util"),
     "exit": (exit_bot, "exit", "Exit bot", "Util"),
+    "import": (import_data, "import <file> [contacts|notes] [workers]", "Import from .csv, .jsonl or .vcf", "Util"),
+    "export": (export_data, "export <file> [contacts|notes]", "Export to .csv, .jsonl or .vcf", "Util"),
 
-    "all": (all_contacts, "all", "Show all contacts", "Contacts"),
-    "add": (add_contact, "add <name> <phone>", "Add new contact and phone", "Contacts"),
-    "find": (find_contact, "find <field> <keyword>", "Find contact", "Contacts"),
+    "all": (all_contacts, "all [--page N] [--size K] [--limit K] [--sort name|birthday] [--pager]", "Show all contacts, a page at a time", "Contacts"),
+    "add": (add_contact, "add [<name> <phone> ...]", "Add new contact and phones", "Contacts"),
+    "find": (find_contact, "find <field> <keyword> | find fuzzy <name>", "Find contact", "Contacts"),
     "delete-contact": (delete_contact, "delete-contact <name>", "Delete Contact", "Contacts"),
+    "dedupe": (dedupe_contacts, "dedupe [<min_score>] [merge]", "Find and merge duplicate contacts", "Contacts"),
 
     "add-phone": (add_phone, "add-phone <name> <new_phone>", "Adding a new phone number", "Contacts - Phone"),
     "change-phone": (change_phone, "change <name> <old_phone> <new_phone>", "Change existing phone number", "Contacts - Phone"),
@@ -586,22 +858,62 @@ COMMANDS = {
     "add-birthday": (add_birthday, "add-birthday <name> <DD.MM.YYYY>", "Add birthday", "Contacts - Birthday"),
     "change-birthday": (change_birthday, "change-birthday <name> <DD.MM.YYYY>", "Change birthday", "Contacts - Birthday"),
     "delete-birthday": (delete_birthday, "delete-birthday <name>", "Delete birthday", "Contacts - Birthday"),
-    "birthdays": (birthdays, "birthdays <days>", "Show birthdays in next N days", "Contacts - Birthday"),
+    "birthdays": (birthdays, "birthdays <days> [week|month]", "Show birthdays in next N days", "Contacts - Birthday"),
 
     "add-address": (add_address, "add-address <name> <address>", "Add address to contact", "Contacts - Address"),
     "change-address": (change_address, "change-address <name> <...>", "Change address", "Contacts - Address"),
     "delete-address": (delete_address, "delete-address <name>", "Delete address", "Contacts - Address"),
     "addresses": (get_addresses, "addresses <name>", "Show addresses", "Contacts - Address"),
 
-    "all-note": (all_notes, "all-note", "Show all notes", "Notes"),
-    "add-note": (add_note, "add-note <title> <content>", "Add note", "Notes"),
+    "all-note": (all_notes, "all-note [--page N] [--size K] [--limit K] [--sort title] [--pager]", "Show all notes, a page at a time", "Notes"),
+    "add-note": (add_note, "add-note [<title> <content> <tag> ...]", "Add note", "Notes"),
     "change-title": (change_title, "change-title <old_title> <new_title>", "Change note title", "Notes - Title"),
-    "change-note": (change_note, "change-note <title> <new_content>", "Change note content", "Notes - Content"),
+    "change-note": (change_note, "change-note [<title> <new_content>]", "Change note content", "Notes - Content"),
     "delete-note": (delete_note, "delete-note <title>", "Delete note", "Notes"),
-    "find-note": (find_note, "find-note <keyword>", "Find note", "Notes - Content"),
+    "find-note": (find_note, "find-note <keyword> [all|any|phrase] [--sort rank]", "Find note", "Notes - Content"),
 
     "add-tag": (add_tag, "add-tag <title> <tag>", "Add tag to note", "Notes - Tags"),
-    "find-tag": (find_tag, "find-tag <tag>", "Find notes by tag", "Notes - Tags"),
+    "find-tag": (find_tag, "find-tag <tag> [<tag> ...]", "Find notes having all given tags", "Notes - Tags"),
+    "find-any-tag": (find_any_tag, "find-any-tag <tag> [<tag> ...]", "Find notes having any of the tags", "Notes - Tags"),
+    "tags": (all_tags, "tags", "Show all tags with note counts", "Notes - Tags"),
     "edit-tag": (edit_tag, "edit-tag <title> <old_tag> <new_tag>", "Edit a tag", "Notes - Tags"),
     "delete-tag": (delete_tag, "delete-tag <title> <tag>", "Delete a tag", "Notes - Tags")
 }
+
+
+# Argument kinds by position, used by tab completion (src.utils.autocomplete):
+# "contact", "note" and "tag" complete from the book and the notes, "phone",
+# "email" and "address" from the contact named by the first argument, and a
+# tuple lists fixed choices. A kind ending in "..." repeats for the rest.
+ARGUMENTS = {
+    "find": (("name", "phone", "email", "address", "birthday", "fuzzy"),),
+    "delete-contact": ("contact",),
+    "add-phone": ("contact",),
+    "change-phone": ("contact", "phone"),
+    "delete-phone": ("contact", "phone"),
+    "phone": ("contact",),
+    "change-name": ("contact",),
+    "add-email": ("contact",),
+    "change-email": ("contact", "email"),
+    "delete-email": ("contact", "email"),
+    "emails": ("contact",),
+    "add-birthday": ("contact",),
+    "change-birthday": ("contact",),
+    "delete-birthday": ("contact",),
+    "birthdays": ((), ("week", "month")),
+    "add-address": ("contact",),
+    "change-address": ("contact", "address"),
+    "delete-address": ("contact", "address"),
+    "addresses": ("contact",),
+    "import": ((), ("contacts", "notes")),
+    "export": ((), ("contacts", "notes")),
+    "change-title": ("note",),
+    "change-note": ("note",),
+    "delete-note": ("note",),
+    "find-note": ((), ("all", "any", "phrase")),
+    "add-tag": ("note", "tag"),
+    "find-tag": ("tag...",),
+    "find-any-tag": ("tag...",),
+    "edit-tag": ("note", "tag", "tag"),
+    "delete-tag": ("note", "tag"),
+}
@@ -0,0 +1,124 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from src import commands
+from src.models.contacts import AddressBook, Record
+from src.models.notes import Notes
+from src.server import HOST, Server
+
+# ------------------------------
+# Load generator for the server (src.server), local clients only
+#
+# Opens --clients connections that each send --requests requests one after
+# another: phone and find lookups, and with --writes a share of add-phone
+# changes. Reports requests per second and latency percentiles. Without an
+# address it starts a server in this process over a generated book on a
+# temporary Unix socket (clients and server then share one CPU).
+# ------------------------------
+
+CLIENTS = 50
+REQUESTS = 200
+CONTACTS = 10_000
+WRITES = 0.1
+
+
+def generated_book(size):
+    book = AddressBook()
+    for number in range(size):
+        book.add_record(Record.from_values(f"Contact {number}", [f"+38050{number:07d}"], [], [], None))
+    return book
+
+
+def percentile(values, share):
+    """The value below which share of the sorted values fall."""
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+async def client(connect, requests, contacts, writes, latencies, statuses, client_number):
+    reader, writer = await connect()
+    random.seed(client_number)
+    try:
+        for number in range(requests):
+            name = f"Contact {random.randrange(contacts)}"
+            if random.random() < writes:
+                # Unique per client and request: never refused as a duplicate.
+                request = {"command": "add-phone", "args": [name, f"+39{client_number:05d}{number:06d}"]}
+            elif number % 2:
+                request = {"command": "phone", "args": [name]}
+            else:
+                request = {"command": "find", "args": ["name", name, "--limit", "5"]}
+            started = time.perf_counter()
+            writer.write(json.dumps(request).encode("utf-8") + b"\n")
+            response = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - started)
+            statuses[response["status"]] = statuses.get(response["status"], 0) + 1
+    finally:
+        writer.close()
+
+
+async def run(options):
+    server = None
+    socket_dir = None
+    if options.unix:
+        connect = lambda: asyncio.open_unix_connection(options.unix)
+    elif options.port:
+        connect = lambda: asyncio.open_connection(options.host, options.port)
+    else:
+        socket_dir = tempfile.mkdtemp()
+        path = os.path.join(socket_dir, "assistant.sock")
+        server = Server(generated_book(options.contacts), Notes())
+        await server.start(unix_path=path)
+        connect = lambda: asyncio.open_unix_connection(path)
+
+    latencies = []
+    statuses = {}
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            client(connect, options.requests, options.contacts, options.writes, latencies, statuses, number)
+            for number in range(options.clients)
+        ))
+    finally:
+        elapsed = time.perf_counter() - started
+        if server is not None:
+            await server.stop()
+            os.remove(path)
+            os.rmdir(socket_dir)
+
+    latencies.sort()
+    return {
+        "clients": options.clients,
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+        "statuses": statuses,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.loadtest", description="Measure throughput and latency of the assistant server.")
+    parser.add_argument("--unix", metavar="PATH", help="connect to a server on this Unix socket")
+    parser.add_argument("--host", default=HOST, help=f"server address with --port (default: {HOST})")
+    parser.add_argument("--port", type=int, help="connect to a server on this TCP port")
+    parser.add_argument("--clients", type=int, default=CLIENTS, help=f"concurrent connections (default: {CLIENTS})")
+    parser.add_argument("--requests", type=int, default=REQUESTS, help=f"requests per connection (default: {REQUESTS})")
+    parser.add_argument("--writes", type=float, default=WRITES, help=f"share of requests that change the book (default: {WRITES})")
+    parser.add_argument("--contacts", type=int, default=CONTACTS, help=f"contacts named 'Contact N' the requests pick from (default: {CONTACTS})")
+    options = parser.parse_args(argv)
+
+    commands.INTERACTIVE = False
+    print(json.dumps(asyncio.run(run(options))))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
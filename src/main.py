@@ -1,15 +1,77 @@
 
+import os
+import signal
+import sys
+import warnings
+
 from src.models.contacts import AddressBook
 from src.models.notes import Notes
-from src.utils.autocomplete import smart_guess
-from src.storage.persistence import load_contacts, save_contacts, load_notes, save_notes
-from src.commands import COMMANDS, ALIASES, parse_input, show_help
+from src.utils.autocomplete import CommandResolver, Completer, install_completion
+from src.storage import sqlite_backend
+from src.storage.journal import open_contacts, open_notes
+from src.storage.persistence import DamagedFileWarning, LoadError
+from src.commands import COMMANDS, ALIASES, ARGUMENTS, parse_input, show_help
 
 from src.utils.styling import err, wrn, grt, suc, inp
 
+# "pickle" (snapshot + journal) or "sqlite"
+STORAGE = os.environ.get("ASSISTANT_STORAGE", "pickle")
+# "1" keeps a columnar copy of the contacts for short find queries.
+COLUMNS = os.environ.get("ASSISTANT_COLUMNS") == "1"
+
+def open_storage(**journal_options):
+    """Load contacts and notes from the configured STORAGE. Returns (book, notes, journals)."""
+    if STORAGE == "sqlite":
+        # Changes are written to the database as they happen.
+        book = sqlite_backend.load_contacts()
+        notes = sqlite_backend.load_notes()
+        journals = []
+    else:
+        # Every change is journaled right away; closing folds the journals into the snapshots.
+        book, contacts_journal = open_contacts(**journal_options)
+        notes, notes_journal = open_notes(**journal_options)
+        journals = [contacts_journal, notes_journal]
+        if COLUMNS:
+            book.use_columns()
+    return book, notes, journals
+
+def close_storage(journals):
+    """Stop the journals' background threads and fold the journals into the snapshots."""
+    for journal in journals:
+        journal.close()
+
+def exit_on_signals():
+    """Turn SIGTERM and SIGHUP into SystemExit, so finally blocks close the storage as on Ctrl+C."""
+    def leave(signum, frame):
+        sys.exit(128 + signum)
+    for name in ("SIGTERM", "SIGHUP"):
+        # No SIGHUP on Windows.
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), leave)
+
 def main():
-    book = load_contacts()
-    notes = load_notes()
+    try:
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always", DamagedFileWarning)
+            book, notes, journals = open_storage()
+    except LoadError as e:
+        print(err(f"{e} Restore it from a backup or move it away to start over."))
+        sys.exit(1)
+    for warning in caught:
+        print(wrn(str(warning.message)))
+    exit_on_signals()
+    try:
+        repl(book, notes, journals)
+    except (KeyboardInterrupt, EOFError):
+        # Ctrl+C or Ctrl+D at the prompt.
+        print()
+        print(grt("Good bye! Data saved."))
+    finally:
+        close_storage(journals)
+
+def repl(book, notes, journals):
+    resolver = CommandResolver(COMMANDS, ALIASES)
+    install_completion(Completer(resolver, ARGUMENTS, book, notes))
 
     print(grt("Welcome to the Assistant Bot!"))
     show_help()
@@ -23,21 +85,25 @@ def main():
 
             command, args = parse_input(user_input)
 
-            guessed_command = smart_guess(command, COMMANDS, ALIASES)
+            resolution = resolver.resolve(command)
+            guessed_command = resolution.command
 
             if guessed_command in ["close", "exit"]:
-                save_contacts(book)
-                save_notes(notes)
+                # main() closes the storage.
                 print(grt("Good bye! Data saved (and sent to Pentagon)."))
                 break
 
+            if guessed_command is None and resolution.candidates:
+                print(wrn(f"'{command}' could be: {', '.join(resolution.candidates)}. Type more of it."))
+                continue
+
             if guessed_command is None:
                 print(err(f"Unknown command '{command}'. Type 'help' to see available commands."))
                 continue
 
-            # If guessed command differs from input command, ask for confirmation
-            if guessed_command != command:
-                answer = input(wrn(f"Not sure what '{command}' meant. Did you mean '") + suc(guessed_command) + wrn("'? (Y/N): ")).strip().lower()
+            # If the command was guessed from a prefix or a typo, ask for confirmation
+            if not resolution.exact:
+                answer = input(wrn(f"Not sure what '{command}' meant. Did you mean '") + suc(resolution.candidates[0]) + wrn("'? (Y/N): ")).strip().lower()
                 if answer != 'y':
                     continue
 
@@ -46,6 +112,12 @@ def main():
             if result:
                 print(result)
 
+            for journal in journals:
+                journal.checkpoint()
+
+        except EOFError:
+            # Ctrl+D: no more input, leave through main().
+            raise
         except Exception as e:
             print(err(f"[bold red]Unexpected error: {e}"))
 
@@ -0,0 +1,160 @@
+import calendar
+from array import array
+from bisect import bisect_right
+from datetime import timedelta
+from itertools import accumulate
+from typing import Dict, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    # Without NumPy the birthday scan is a Python loop over the array.
+    np = None
+
+# ----------------- Columnar store -----------------
+#
+# ColumnStore keeps a column-oriented copy of the address book for scans over
+# every contact. Each contact occupies a row; a text field is one list of
+# normalized values packed into a single string, with the owner row of every
+# value in an array, and birthdays are arrays of day numbers per row.
+#
+# It implements the same add / remove / update hooks as the indexes. A changed
+# record is retired and appended again as a new row, so columns only grow;
+# once more than half of the rows are retired the store is rebuilt.
+
+SEPARATOR = "\x00"
+COMPACT_MIN_ROWS = 1024
+
+
+class TextColumn:
+    """Values of one field packed into one string, so a substring scan is str.find in C."""
+
+    def __init__(self, field, normalize=None):
+        self.field = field
+        self.normalize = normalize or (lambda value: value)
+        self.values: List[str] = []
+        self.owners = array("q")
+        # Packed form (values joined by SEPARATOR, start of each value),
+        # rebuilt on the first scan after an append.
+        self._packed = None
+
+    def append(self, row, record):
+        for value in record.field_values(self.field):
+            self.values.append(self.normalize(value))
+            self.owners.append(row)
+        self._packed = None
+
+    def _pack(self):
+        if self._packed is None:
+            # One assignment: a query in another thread sees both parts or neither.
+            self._packed = (
+                SEPARATOR.join(self.values) + SEPARATOR,
+                array("q", accumulate((len(value) + 1 for value in self.values), initial=0)),
+            )
+        return self._packed
+
+    def rows(self, query):
+        """Rows owning a value that contains query (each row once, ascending)."""
+        query = self.normalize(query)
+        if not query:
+            return sorted(set(self.owners))
+        if SEPARATOR in query:
+            return []
+        packed, starts = self._pack()
+        found = {}
+        position = packed.find(query)
+        while position != -1:
+            value = bisect_right(starts, position) - 1
+            found[self.owners[value]] = None
+            # One hit per value is enough: continue with the next one.
+            position = packed.find(query, starts[value + 1])
+        return sorted(found)
+
+
+class ColumnStore:
+    """Column-oriented copy of the records of an AddressBook."""
+
+    def __init__(self, text_fields: Dict[str, object]):
+        self._text_fields = text_fields
+        self._reset()
+
+    def _reset(self):
+        self.records = []
+        self._rows = {}
+        self._retired = 0
+        self.columns = {field: TextColumn(field, normalize) for field, normalize in self._text_fields.items()}
+        # Birthday as a date ordinal and as month * 100 + day (0 when unset).
+        self.birthdays = array("l")
+        self.birth_days = array("H")
+
+    def _append(self, record):
+        row = len(self.records)
+        self.records.append(record)
+        self._rows[record] = row
+        for column in self.columns.values():
+            column.append(row, record)
+        birthday = record.birthday.value if record.birthday else None
+        self.birthdays.append(birthday.toordinal() if birthday else 0)
+        self.birth_days.append(birthday.month * 100 + birthday.day if birthday else 0)
+
+    def _retire(self, record):
+        row = self._rows.pop(record, None)
+        if row is None:
+            return
+        self.records[row] = None
+        self.birthdays[row] = 0
+        self.birth_days[row] = 0
+        self._retired += 1
+
+    def _compact(self):
+        if self._retired < COMPACT_MIN_ROWS or self._retired * 2 < len(self.records):
+            return
+        live = [record for record in self.records if record is not None]
+        self._reset()
+        for record in live:
+            self._append(record)
+
+    def add(self, record):
+        self._append(record)
+
+    def remove(self, record):
+        self._retire(record)
+        self._compact()
+
+    def update(self, record, field, old, new):
+        self._retire(record)
+        self._append(record)
+        self._compact()
+
+    def search(self, field, query) -> list:
+        """Records with a value in field containing query (retired rows skipped)."""
+        records = self.records
+        return [records[row] for row in self.columns[field].rows(query) if records[row] is not None]
+
+    def upcoming(self, start, days) -> List[Tuple[object, object]]:
+        """(celebration date, record) pairs from start to start + days, sorted by date."""
+        # (date, month * 100 + day) of every celebration inside the window, in order.
+        window = []
+        for offset in range(days + 1):
+            when = start + timedelta(days=offset)
+            window.append((when, when.month * 100 + when.day))
+            if when.month == 2 and when.day == 28 and not calendar.isleap(when.year):
+                window.append((when, 229))
+        wanted_keys = {key for _, key in window}
+
+        if np is not None:
+            # Lookup table indexed by the key: one gather over the whole column.
+            wanted = np.zeros(1232, dtype=bool)
+            wanted[list(wanted_keys)] = True
+            column = np.frombuffer(self.birth_days, dtype=np.uint16)
+            rows = np.flatnonzero(wanted[column])
+            hits = zip(rows.tolist(), column[rows].tolist())
+            del column
+        else:
+            hits = ((row, key) for row, key in enumerate(self.birth_days) if key in wanted_keys)
+
+        rows_by_key = {}
+        for row, key in hits:
+            rows_by_key.setdefault(key, []).append(row)
+        records = self.records
+        return [(when, records[row]) for when, key in window for row in rows_by_key.get(key, ())]
@@ -1,36 +1,106 @@
 
+import heapq
+import sys
+from itertools import chain, islice
 from collections import UserDict
-from src.utils.validators import validate_phone, validate_email, validate_birthday, validate_name, validate_address
+from src.models.indexes import ValueIndex, NGramIndex, BirthdayIndex, FuzzyIndex, PrefixIndex
+from src.models.columns import ColumnStore
+from src.models.versions import Version, VersionIndex
+from src.utils.locking import RWLock, reading, writing, writing_through
+from src.utils.validators import validate_phone, validate_email, validate_birthday, validate_name, validate_address, format_date, phone_key, email_key
 
 # ----------------- Field classes -----------------
 
 class Field:
+    # One slot instead of a per-instance __dict__; strings are interned so
+    # repeated values (cities, names, ...) are stored once.
+    __slots__ = ("value",)
+
     def __init__(self, value):
-        self.value = value
+        self.value = sys.intern(value) if isinstance(value, str) else value
+        self._derive()
+
+    @classmethod
+    def trusted(cls, value):
+        """Build the field from an already validated value, without validating it again."""
+        field = cls.__new__(cls)
+        field.value = sys.intern(value) if isinstance(value, str) else value
+        field._derive()
+        return field
+
+    def _derive(self):
+        """Compute the slots derived from value (every way a field is built ends here)."""
+
+    def __getstate__(self):
+        return {"value": self.value}
+
+    def __setstate__(self, state):
+        # Same layout as the instance __dict__ of pickles from before __slots__.
+        value = state["value"]
+        self.value = sys.intern(value) if isinstance(value, str) else value
+        self._derive()
+
+
+class KeyedField(Field):
+    """Field compared by the canonical key of its value, computed once when it is built."""
+    __slots__ = ("key",)
+
+    canonical = staticmethod(lambda value: value)
+
+    def _derive(self):
+        key = self.canonical(self.value)
+        # Mostly the value is already canonical: share the string instead of keeping a copy.
+        self.key = self.value if key == self.value else key
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
 
 
 class Name(Field):
+    __slots__ = ()
+
     def __init__(self, value: str):
         value = validate_name(value)
         super().__init__(value.title())
 
 
-class Phone(Field):
+class Phone(KeyedField):
+    __slots__ = ()
+
+    canonical = staticmethod(phone_key)
+
     def __init__(self, value):
         super().__init__(validate_phone(value))
 
 
-class Email(Field):
+class Email(KeyedField):
+    __slots__ = ()
+
+    canonical = staticmethod(email_key)
+
     def __init__(self, value):
         super().__init__(validate_email(value))
 
 
 class Birthday(Field):
+    # The DD.MM.YYYY form is kept next to the date: it is what gets searched and shown.
+    __slots__ = ("text",)
+
     def __init__(self, value):
         super().__init__(validate_birthday(value))
 
+    def _derive(self):
+        self.text = format_date(self.value)
+
 
 class Address(Field):
+    __slots__ = ()
+
     def __init__(self, value: str):
         value = validate_address(value)
         super().__init__(value.title())
@@ -41,18 +111,79 @@ class Address(Field):
 class Record:
     """Record represents a single contact with name, phones, email, birthday and address."""
 
+    # Multi-valued fields are tuples (the empty one is shared), replaced on change.
+    # _book is the AddressBook the record belongs to; notified on every field change.
+    __slots__ = ("name", "phones", "emails", "birthday", "addresses", "_book", "__weakref__")
+
+    STATE_FIELDS = ("name", "phones", "emails", "birthday", "addresses")
+
     def __init__(self, name):
         self.name = Name(name)
-        self.phones = []
-        self.emails = []
+        self.phones = ()
+        self.emails = ()
         self.birthday = None
-        self.addresses = []
+        self.addresses = ()
+        self._book = None
+
+    @classmethod
+    def from_values(cls, name, phones=(), emails=(), addresses=(), birthday=None):
+        """
+        Build a record from values that were already validated and normalized
+        (titled name and addresses, birthday as a date), without validating them again.
+        """
+        record = cls.__new__(cls)
+        record.name = Name.trusted(name)
+        record.phones = tuple(map(Phone.trusted, phones))
+        record.emails = tuple(map(Email.trusted, emails))
+        record.birthday = Birthday.trusted(birthday) if birthday else None
+        record.addresses = tuple(map(Address.trusted, addresses))
+        record._book = None
+        return record
+
+    def __getstate__(self):
+        return {field: getattr(self, field) for field in self.STATE_FIELDS}
+
+    def copy(self):
+        """Copy belonging to no book; shares the field values (they are replaced, never changed in place)."""
+        record = Record.__new__(Record)
+        record.name = self.name
+        record.phones = self.phones
+        record.emails = self.emails
+        record.birthday = self.birthday
+        record.addresses = self.addresses
+        record._book = None
+        return record
+
+    def __setstate__(self, state):
+        # Pickles from before __slots__ carry the instance __dict__ with lists.
+        self.name = state["name"]
+        self.phones = tuple(state["phones"])
+        self.emails = tuple(state["emails"])
+        self.birthday = state["birthday"]
+        self.addresses = tuple(state["addresses"])
+        self._book = None
+
+    def field_values(self, field):
+        """Return the raw values stored in a field ("name", "phones", "birthday", ...)."""
+        if field == "name":
+            return [self.name.value]
+        if field == "birthday":
+            return [self.birthday.value] if self.birthday else []
+        return [item.value for item in getattr(self, field)]
+
+    def _changed(self, field, old=None, new=None):
+        """Let the owning address book keep its indexes in sync."""
+        if self._book is not None:
+            self._book._field_changed(self, field, old, new)
 
 
     # Name methods
+    @writing_through("_book")
     def change_name(self, new_name):
         """Change name."""
+        old_name = self.name.value
         self.name = Name(new_name.title())
+        self._changed("name", old_name, self.name.value)
         
     def has_name(self, name):
         return name.lower() in self.name.value.lower()
@@ -62,29 +193,35 @@ class Record:
     
 
     # Address methods
+    @writing_through("_book")
     def add_address(self, address: str):
         """Add an address to the contact (no duplicates)."""
         address = address.title()
         if any(p.value == address for p in self.addresses):
             raise ValueError(f"Address '{address}' already exists for {self.name.value}.")
-        self.addresses.append(Address(address))
+        self.addresses += (Address(address),)
+        self._changed("addresses", None, self.addresses[-1].value)
 
+    @writing_through("_book")
     def change_address(self, old_address: str, new_address: str):
         """Change an existing address."""
         old_address = old_address.title()
         new_address = new_address.title()
         for idx, addr in enumerate(self.addresses):
             if addr.value == old_address:
-                self.addresses[idx] = Address(new_address)
+                self.addresses = self.addresses[:idx] + (Address(new_address),) + self.addresses[idx + 1:]
+                self._changed("addresses", addr.value, self.addresses[idx].value)
                 return True
         return False
 
+    @writing_through("_book")
     def delete_address(self, address: str):
         """Delete an address."""
         address = address.title()
-        for p in self.addresses:
+        for idx, p in enumerate(self.addresses):
             if p.value == address:
-                self.addresses.remove(p)
+                self.addresses = self.addresses[:idx] + self.addresses[idx + 1:]
+                self._changed("addresses", address, None)
                 return True
         return False
     
@@ -96,27 +233,40 @@ class Record:
 
 
     # Phone methods
+    @writing_through("_book")
     def add_phone(self, phone):
-        """Add a phone to the contact (no duplicates)."""
-        if any(p.value == phone for p in self.phones):
+        """Add a phone to the contact (no duplicates, compared in canonical form)."""
+        new = Phone(phone)
+        if new in self.phones:
             raise ValueError(f"Phone '{phone}' already exists for {self.name.value}.")
-        self.phones.append(Phone(phone))
+        self.phones += (new,)
+        self._changed("phones", None, new.value)
+
+    def _phone_position(self, phone):
+        key = phone_key(phone)
+        return next((idx for idx, p in enumerate(self.phones) if p.key == key), None)
 
+    @writing_through("_book")
     def change_phone(self, old_phone, new_phone):
         """Change existing phone to a new one."""
-        for idx, p in enumerate(self.phones):
-            if p.value == old_phone:
-                self.phones[idx] = Phone(new_phone)
-                return True
-        return False
-
+        idx = self._phone_position(old_phone)
+        if idx is None:
+            return False
+        old = self.phones[idx].value
+        self.phones = self.phones[:idx] + (Phone(new_phone),) + self.phones[idx + 1:]
+        self._changed("phones", old, self.phones[idx].value)
+        return True
+
+    @writing_through("_book")
     def delete_phone(self, phone):
         """Delete a phone from the contact."""
-        for p in self.phones:
-            if p.value == phone:
-                self.phones.remove(p)
-                return True
-        return False
+        idx = self._phone_position(phone)
+        if idx is None:
+            return False
+        old = self.phones[idx].value
+        self.phones = self.phones[:idx] + self.phones[idx + 1:]
+        self._changed("phones", old, None)
+        return True
     
     def has_phone(self, phone=""):
         return any(phone in p.value for p in self.phones)
@@ -126,56 +276,76 @@ class Record:
 
 
     # Email methods
+    @writing_through("_book")
     def add_email(self, email):
-        """Add an email to the contact (no duplicates)."""
-        if any(e.value == email for e in self.emails):
+        """Add an email to the contact (no duplicates, compared in canonical form)."""
+        new = Email(email)
+        if new in self.emails:
             raise ValueError(f"Email '{email}' already exists for {self.name.value}.")
-        self.emails.append(Email(email))
+        self.emails += (new,)
+        self._changed("emails", None, new.value)
+
+    def _email_position(self, email):
+        key = email_key(email)
+        return next((idx for idx, e in enumerate(self.emails) if e.key == key), None)
 
+    @writing_through("_book")
     def change_email(self, old_email, new_email):
         """Change an existing email."""
-        for idx, e in enumerate(self.emails):
-            if e.value == old_email:
-                self.emails[idx] = Email(new_email)
-                return True
-        return False
-
+        idx = self._email_position(old_email)
+        if idx is None:
+            return False
+        old = self.emails[idx].value
+        self.emails = self.emails[:idx] + (Email(new_email),) + self.emails[idx + 1:]
+        self._changed("emails", old, self.emails[idx].value)
+        return True
+
+    @writing_through("_book")
     def delete_email(self, email):
         """Delete an email from the contact."""
-        for e in self.emails:
-            if e.value == email:
-                self.emails.remove(e)
-                return True
-        return False
+        idx = self._email_position(email)
+        if idx is None:
+            return False
+        old = self.emails[idx].value
+        self.emails = self.emails[:idx] + self.emails[idx + 1:]
+        self._changed("emails", old, None)
+        return True
     
     def has_email(self, email=""):
-        return any(email.lower() in e.value.lower() for e in self.emails)
+        email = email.lower()
+        return any(email in e.key for e in self.emails)
     
     def str_emails(self):
         return ', '.join([p.value for p in self.emails])
     
 
     # Birthday methods
+    @writing_through("_book")
     def add_birthday(self, birthday):
         """Add birthday to contact."""
+        old = self.birthday.value if self.birthday else None
         self.birthday = Birthday(birthday)
+        self._changed("birthday", old, self.birthday.value)
 
     def change_birthday(self, birthday):
         """Overwrite existing birthday."""
         self.add_birthday(birthday)
 
+    @writing_through("_book")
     def delete_birthday(self):
         """Delete birthday from contact."""
         if self.birthday:
+            old = self.birthday.value
             self.birthday = None
+            self._changed("birthday", old, None)
             return True
         return False
     
     def has_birthday(self, birthday=""):
-        return self.birthday != None and birthday in self.birthday.value.strftime("%d.%m.%Y")
+        return self.birthday != None and birthday in self.birthday.text
     
     def str_birthday(self):
-        return self.birthday.value.strftime("%d.%m.%Y") if self.birthday else ""
+        return self.birthday.text if self.birthday else ""
 
 
     def __str__(self):
@@ -189,21 +359,227 @@ class Record:
 
 # ----------------- AddressBook class -----------------
 
+# Matches returned by a fuzzy name search.
+FUZZY_LIMIT = 10
+
+# Record method telling whether a field contains a query, by field name.
+MATCHERS = {
+    "name": Record.has_name,
+    "phones": Record.has_phone,
+    "emails": Record.has_email,
+    "addresses": Record.has_address,
+    "birthday": Record.has_birthday,
+}
+
+def _birthday_text(value):
+    """Birthdays are searched in their DD.MM.YYYY form."""
+    return value if isinstance(value, str) else format_date(value)
+
+
 class AddressBook(UserDict):
     """AddressBook manages multiple Record objects."""
 
+    # Last journal operation contained in a saved snapshot (see storage.journal).
+    journal_seq = 0
+
+    def __init__(self, *args, **kwargs):
+        self._init_indexes()
+        super().__init__(*args, **kwargs)
+
+    def _init_indexes(self):
+        """Create the secondary indexes kept in sync with every record mutation."""
+        self.phone_index = ValueIndex("phones", phone_key)
+        self.email_index = ValueIndex("emails", email_key)
+        self.text_indexes = {
+            "name": NGramIndex("name", str.lower),
+            "phones": NGramIndex("phones"),
+            "emails": NGramIndex("emails", str.lower),
+            "addresses": NGramIndex("addresses", str.lower),
+            "birthday": NGramIndex("birthday", _birthday_text),
+        }
+        self.birthday_index = BirthdayIndex()
+        self.fuzzy_index = FuzzyIndex("name")
+        self.name_prefixes = PrefixIndex("name")
+        # Detached copies of the records for version().
+        self.versions = VersionIndex(Record.copy, "name")
+        self._indexes = [self.phone_index, self.email_index, self.birthday_index, self.fuzzy_index, self.name_prefixes, self.versions, *self.text_indexes.values()]
+        # Insertion position of every record, so indexed results keep book order.
+        self._order = {}
+        self._next_order = 0
+        # Optional columnar copy of the records, see use_columns().
+        self.columns = None
+        # Runtime observers (e.g. a journal) with the same hooks as indexes.
+        self._listeners = []
+        # Lookups share it; changes (to the book or its records) take it alone.
+        self.lock = RWLock()
+
+    def __getstate__(self):
+        # Indexes are derived data: only records are pickled.
+        return {"data": self.data, "journal_seq": self.journal_seq}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_indexes()
+        for record in self.data.values():
+            self._bind(record)
+
+    @writing
+    def use_columns(self):
+        """Also keep the records in a ColumnStore; searches too short for the n-gram indexes scan it."""
+        if self.columns is None:
+            normalizers = {field: index.normalize for field, index in self.text_indexes.items()}
+            self.columns = ColumnStore(normalizers)
+            for record in self.data.values():
+                self.columns.add(record)
+            self._indexes.append(self.columns)
+
+    def _new_order(self):
+        self._next_order += 1
+        return self._next_order
+
+    @writing
+    def add_listener(self, listener):
+        """Subscribe to add(record) / remove(record) / update(record, field, old, new) events."""
+        self._listeners.append(listener)
+
+    @writing
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def _bind(self, record, notify=True):
+        record._book = self
+        self._order[record] = self._new_order()
+        for index in self._indexes + (self._listeners if notify else []):
+            index.add(record)
+
+    def _unbind(self, record):
+        for index in self._indexes + self._listeners:
+            index.remove(record)
+        self._order.pop(record, None)
+        record._book = None
+
+    @writing
+    def _field_changed(self, record, field, old, new):
+        if field == "name":
+            old_key, new_key = old.title(), new.title()
+            if self.data.get(old_key) is record:
+                del self.data[old_key]
+            if new_key in self.data:
+                # Renaming onto an existing contact overwrites it.
+                del self[new_key]
+            self.data[new_key] = record
+            self._order[record] = self._new_order()
+        for index in self._indexes + self._listeners:
+            index.update(record, field, old, new)
+
+    @writing
+    def __setitem__(self, key, record):
+        if key in self.data:
+            del self[key]
+        self.data[key] = record
+        self._bind(record)
+
+    @writing
+    def __delitem__(self, key):
+        self._unbind(self.data.pop(key))
+
     def add_record(self, record):
         """Add a new record to the address book."""
-        self.data[record.name.value.title()] = record
+        self[record.name.value.title()] = record
 
+    @reading
     def find(self, name):
         """Find record by name."""
         return self.data.get(name.title())
 
+    @reading
+    def find_owner(self, field, value, exclude=None):
+        """Find the name of a record holding value in field ("phones" or "emails")."""
+        index = self.phone_index if field == "phones" else self.email_index
+        owner = index.find_owner(value, self.find(exclude) if exclude else None)
+        return owner.name.value if owner else None
+
+    @reading
+    def search(self, field, query):
+        """Find records whose field contains query, in book order."""
+        matches = MATCHERS[field]
+        candidates = self.text_indexes[field].candidates(query)
+        if candidates is None and self.columns is not None:
+            # Too short for the n-gram index: scan the packed column instead.
+            found = self.columns.search(field, query)
+            found.sort(key=self._order.__getitem__)
+            return found
+        if candidates is None:
+            return [record for record in self.data.values() if matches(record, query)]
+        found = [record for record in candidates if matches(record, query)]
+        found.sort(key=self._order.__getitem__)
+        return found
+
+    @reading
+    def fuzzy_search(self, query, limit=FUZZY_LIMIT):
+        """Records whose name matches every word of query up to a typo or two, closest first."""
+        matches = self.fuzzy_index.matches(query)
+        order = self._order
+        return heapq.nsmallest(limit, matches, key=lambda record: (matches[record], order[record]))
+
+    @reading
+    def complete_names(self, prefix, limit=None):
+        """Contact names starting with prefix (case insensitive), sorted."""
+        return self.name_prefixes.complete(prefix, limit)
+
+    @reading
+    def ordered(self, order=None, offset=0):
+        """
+        Iterate records from position offset in the given order: None (book
+        order), "name" or "birthday" (by month and day; no birthday last).
+        Sorted orders are read from the maintained indexes, not sorted here.
+        The records are read as the iterator goes: hold lock.read() while
+        iterating if other threads may change the book, or iterate a version().
+        """
+        if order is None:
+            return islice(self.data.values(), offset, None)
+        if order == "name":
+            return map(self.find, self.name_prefixes.values(offset))
+        if order != "birthday":
+            raise ValueError(f"Unknown order: '{order}'. Use name or birthday.")
+        dated = len(self.birthday_index)
+        undated = (record for record in self.data.values() if record.birthday is None)
+        return chain(self.birthday_index.records(offset), islice(undated, max(offset - dated, 0), None))
+
+    @reading
+    def version(self):
+        """The book as it is now, unaffected by later changes (see BookVersion). Taken in O(1)."""
+        return BookVersion(self.versions.snapshot(), self.journal_seq)
+
+    @reading
+    def upcoming_birthdays(self, start, days):
+        """Return (celebration date, record) pairs for the next days after start, sorted by date."""
+        return self.birthday_index.upcoming(start, days)
+
+    @writing
     def delete(self, name):
         """Delete record by name."""
         name = name.title()
         if name in self.data:
-            del self.data[name]
+            del self[name]
             return True
         return False
+
+
+class BookVersion(Version):
+    """
+    Point-in-time view of an AddressBook: copies of its records in book order.
+    Iterating or searching it takes no lock and never sees a later change.
+    """
+
+    def key(self, record):
+        return record.name.value.title()
+
+    def search(self, field, query):
+        """Records whose field contains query, in book order (a scan: a version has no indexes)."""
+        matches = MATCHERS[field]
+        return [record for record in self if matches(record, query)]
+
+    def __reduce__(self):
+        # Pickle as a plain AddressBook.
+        return (AddressBook, (), {"data": dict(self.items()), "journal_seq": self.journal_seq})
@@ -0,0 +1,144 @@
+import re
+from typing import Dict, List, Tuple
+
+# ----------------- Duplicate detection -----------------
+#
+# Comparing every pair of contacts is quadratic, so records are first put in
+# blocks by keys that duplicates are likely to share:
+#   ("phone", key)  every canonical phone (see validators.phone_key)
+#   ("email", key)  every canonical email (see validators.email_key)
+#   ("name", code)  a rough phonetic code of the name, word order ignored
+# Only records sharing a block are scored against each other. Blocks larger
+# than MAX_BLOCK are skipped: a key that common (a shared office number, a
+# very frequent name) says little, and scoring it would be quadratic again.
+
+MAX_BLOCK = 50
+MIN_SCORE = 0.6
+
+# Weight of the name similarity; the rest comes from a shared phone or email.
+NAME_WEIGHT = 0.6
+
+_NOT_LETTERS = re.compile(r"[^a-z0-9а-яіїєґ]+")
+# Letters that hardly change how a name sounds (vowels, h, w, y, soft sign).
+_SILENT = re.compile(r"[aeiouhwyаеєиіїоуюяьй]")
+
+
+def name_code(name):
+    """
+    Phonetic-ish code of a name: lowercase words without vowels and repeated
+    letters, sorted, so "Jon Smith", "John Smith" and "Smith Jon" share it.
+    """
+    words = []
+    for word in _NOT_LETTERS.split(name.lower()):
+        if not word:
+            continue
+        code = word[0] + _SILENT.sub("", word[1:])
+        words.append(re.sub(r"(.)\1+", r"\1", code))
+    return " ".join(sorted(words))
+
+
+def _trigrams(name):
+    text = f"  {name.lower()} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def blocking_keys(record):
+    keys = [("phone", phone.key) for phone in record.phones]
+    keys += [("email", email.key) for email in record.emails]
+    code = name_code(record.name.value)
+    if code:
+        keys.append(("name", code))
+    return keys
+
+
+def score(first, second, first_grams=None, second_grams=None):
+    """Similarity of two records from 0 to 1: name trigrams plus a shared phone or email."""
+    first_grams = first_grams or _trigrams(first.name.value)
+    second_grams = second_grams or _trigrams(second.name.value)
+    name = len(first_grams & second_grams) / len(first_grams | second_grams)
+    shared = not set(first.phones).isdisjoint(second.phones) or not set(first.emails).isdisjoint(second.emails)
+    return NAME_WEIGHT * name + (1 - NAME_WEIGHT) * shared
+
+
+def find_duplicates(records, min_score=MIN_SCORE) -> List[Tuple[float, List[object]]]:
+    """
+    Groups of likely duplicates among records, as (best score, records in the
+    given order), most certain groups first. Pairs scoring at least min_score
+    are joined, so a group can be a chain of similar records.
+    """
+    records = list(records)
+    blocks: Dict[tuple, List[int]] = {}
+    for position, record in enumerate(records):
+        for key in blocking_keys(record):
+            found = blocks.get(key)
+            if found is None:
+                blocks[key] = [position]
+            else:
+                found.append(position)
+
+    # Union-find over record positions.
+    parent = list(range(len(records)))
+
+    def root(position):
+        while parent[position] != position:
+            parent[position] = parent[parent[position]]
+            position = parent[position]
+        return position
+
+    grams = {}
+    best: Dict[int, float] = {}
+    scored = set()
+    for members in blocks.values():
+        if len(members) < 2 or len(members) > MAX_BLOCK:
+            continue
+        for position in members:
+            if position not in grams:
+                grams[position] = _trigrams(records[position].name.value)
+        for i, first in enumerate(members):
+            for second in members[i + 1:]:
+                if (first, second) in scored:
+                    continue
+                scored.add((first, second))
+                value = score(records[first], records[second], grams[first], grams[second])
+                if value < min_score:
+                    continue
+                a, b = root(first), root(second)
+                if a != b:
+                    parent[max(a, b)] = min(a, b)
+                top = min(a, b)
+                best[top] = max(best.get(top, 0.0), best.pop(max(a, b), 0.0), value)
+
+    groups: Dict[int, List[int]] = {}
+    for position in grams:
+        groups.setdefault(root(position), []).append(position)
+    result = []
+    for top, members in groups.items():
+        if len(members) > 1:
+            members.sort()
+            result.append((best[top], [records[position] for position in members]))
+    result.sort(key=lambda group: -group[0])
+    return result
+
+
+def merge(book, records):
+    """
+    Merge records into the first one: it gets every phone, email and address
+    the others have (once), and their birthday if it has none. The others are
+    deleted from the book. Returns the kept record.
+    """
+    keep, *others = records
+    for other in others:
+        book.delete(other.name.value)
+    for other in others:
+        for phone in other.phones:
+            if phone not in keep.phones:
+                keep.add_phone(phone.value)
+        for email in other.emails:
+            if email not in keep.emails:
+                keep.add_email(email.value)
+        for address in other.addresses:
+            if all(address.value != kept.value for kept in keep.addresses):
+                keep.add_address(address.value)
+        if keep.birthday is None and other.birthday is not None:
+            keep.add_birthday(other.birthday.value)
+    return keep
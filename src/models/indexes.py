@@ -0,0 +1,636 @@
+import bisect
+import calendar
+import math
+import re
+import threading
+from itertools import islice
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+# ----------------- Index classes -----------------
+#
+# Every index kept by AddressBook implements the same three hooks:
+#   add(record)                      - record was added to the book
+#   remove(record)                   - record was removed from the book
+#   update(record, field, old, new)  - a single field value changed
+# For multi-valued fields (phones, emails, addresses) ``old is None`` means
+# a value was added and ``new is None`` means it was deleted.
+
+
+class QueuedIndex:
+    """Base of the indexes that queue added records and index them on the next query.
+
+    Queries may run in several threads at once (under the book's read lock),
+    so the first to find records queued indexes them while the others wait.
+    A _flush empties _pending last: a query seeing no queued records sees
+    them fully indexed.
+    """
+
+    def __init__(self):
+        self._pending: Set[object] = set()
+        self._flush_lock = threading.Lock()
+
+    def _flush(self):
+        raise NotImplementedError
+
+    def _ready(self):
+        if self._pending:
+            with self._flush_lock:
+                if self._pending:
+                    self._flush()
+
+
+class ValueIndex:
+    """Reverse index: normalized field value -> records holding that value."""
+
+    def __init__(self, field, normalize=None):
+        self.field = field
+        self.normalize = normalize or (lambda value: value)
+        self._owners: Dict[str, Dict[object, None]] = {}
+
+    def _link(self, value, record):
+        self._owners.setdefault(self.normalize(value), {})[record] = None
+
+    def _unlink(self, value, record):
+        key = self.normalize(value)
+        owners = self._owners.get(key)
+        if owners is None:
+            return
+        owners.pop(record, None)
+        if not owners:
+            del self._owners[key]
+
+    def add(self, record):
+        for value in record.field_values(self.field):
+            self._link(value, record)
+
+    def remove(self, record):
+        for value in record.field_values(self.field):
+            self._unlink(value, record)
+
+    def update(self, record, field, old, new):
+        if field != self.field:
+            return
+        if old is not None:
+            self._unlink(old, record)
+        if new is not None:
+            self._link(new, record)
+
+    def owners(self, value) -> List[object]:
+        """Return records holding the value (in insertion order)."""
+        return list(self._owners.get(self.normalize(value), ()))
+
+    def find_owner(self, value, exclude=None) -> Optional[object]:
+        """Return the first record holding the value, skipping ``exclude``."""
+        for record in self._owners.get(self.normalize(value), ()):
+            if record is not exclude:
+                return record
+        return None
+
+
+class NGramIndex(QueuedIndex):
+    """Inverted trigram index over one field, used to narrow substring searches.
+
+    Candidates returned by ``candidates`` are a superset of the real matches,
+    callers still verify them with the record's own ``has_*`` method.
+
+    Added records are only queued; their grams are indexed by the next query,
+    so bulk loads do not pay for the index until it is used.
+    """
+
+    N = 3
+
+    def __init__(self, field, normalize=None):
+        super().__init__()
+        self.field = field
+        self.normalize = normalize or (lambda value: value)
+        self._postings: Dict[str, Set[object]] = {}
+
+    def _grams(self, value):
+        text = self.normalize(value)
+        return {text[i:i + self.N] for i in range(len(text) - self.N + 1)}
+
+    def _link(self, value, record):
+        postings = self._postings
+        for gram in self._grams(value):
+            # get() first: setdefault(gram, set()) would build a throwaway set per gram.
+            found = postings.get(gram)
+            if found is None:
+                postings[gram] = {record}
+            else:
+                found.add(record)
+
+    def _unlink(self, value, record, keep=()):
+        for gram in self._grams(value).difference(keep):
+            postings = self._postings.get(gram)
+            if postings is None:
+                continue
+            postings.discard(record)
+            if not postings:
+                del self._postings[gram]
+
+    def _flush(self):
+        for record in self._pending:
+            for value in record.field_values(self.field):
+                self._link(value, record)
+        self._pending = set()
+
+    def add(self, record):
+        self._pending.add(record)
+
+    def remove(self, record):
+        if record in self._pending:
+            self._pending.discard(record)
+            return
+        for value in record.field_values(self.field):
+            self._unlink(value, record)
+
+    def update(self, record, field, old, new):
+        # A queued record is indexed with its current values anyway.
+        if field != self.field or record in self._pending:
+            return
+        if old is not None:
+            # Other values of the record may share grams with the old one.
+            keep = set()
+            for value in record.field_values(self.field):
+                keep |= self._grams(value)
+            self._unlink(old, record, keep)
+        if new is not None:
+            self._link(new, record)
+
+    def candidates(self, query) -> Optional[Set[object]]:
+        """Return records that may contain query, or None if it is too short to narrow."""
+        grams = self._grams(query)
+        if not grams:
+            return None
+        self._ready()
+        postings = []
+        for gram in grams:
+            found = self._postings.get(gram)
+            if not found:
+                return set()
+            postings.append(found)
+        postings.sort(key=len)
+        return postings[0].intersection(*postings[1:])
+
+
+class PrefixIndex(QueuedIndex):
+    """Sorted index of the values of one field, for completing what was typed so far.
+
+    Values are kept as their lowercase keys in a sorted list; a prefix is the
+    run of keys starting at its bisect position, so completing costs a binary
+    search plus the results. Each key maps to the values spelled that way with
+    the number of records holding them. Added records are queued like in
+    NGramIndex and merged in one sort when many arrive at once.
+    """
+
+    def __init__(self, field):
+        super().__init__()
+        self.field = field
+        self._keys: List[str] = []
+        self._values: Dict[str, Dict[str, int]] = {}
+        # Keys spelled more than one way; while there are none, the n-th value is the n-th key.
+        self._shared = 0
+
+    def _link(self, value, new_keys=None):
+        key = value.lower()
+        spellings = self._values.get(key)
+        if spellings is None:
+            self._values[key] = spellings = {}
+            if new_keys is None:
+                bisect.insort(self._keys, key)
+            else:
+                new_keys.append(key)
+        elif value not in spellings and len(spellings) == 1:
+            self._shared += 1
+        spellings[value] = spellings.get(value, 0) + 1
+
+    def _unlink(self, value):
+        key = value.lower()
+        spellings = self._values.get(key)
+        if spellings is None or value not in spellings:
+            return
+        spellings[value] -= 1
+        if not spellings[value]:
+            del spellings[value]
+            if len(spellings) == 1:
+                self._shared -= 1
+        if not spellings:
+            del self._values[key]
+            del self._keys[bisect.bisect_left(self._keys, key)]
+
+    def _flush(self):
+        new_keys = []
+        for record in self._pending:
+            for value in record.field_values(self.field):
+                self._link(value, new_keys)
+        if len(new_keys) * 32 < len(self._keys):
+            for key in new_keys:
+                bisect.insort(self._keys, key)
+        elif new_keys:
+            # Many new keys (e.g. a load): timsort merges them with the sorted run.
+            self._keys += new_keys
+            self._keys.sort()
+        self._pending = set()
+
+    def add(self, record):
+        self._pending.add(record)
+
+    def remove(self, record):
+        if record in self._pending:
+            self._pending.discard(record)
+            return
+        for value in record.field_values(self.field):
+            self._unlink(value)
+
+    def update(self, record, field, old, new):
+        if field != self.field or record in self._pending:
+            return
+        if old is not None:
+            self._unlink(old)
+        if new is not None:
+            self._link(new)
+
+    def complete(self, prefix, limit=None) -> List[str]:
+        """Values starting with prefix (case insensitive), sorted, at most limit of them."""
+        self._ready()
+        prefix = prefix.lower()
+        keys = self._keys
+        found = []
+        position = bisect.bisect_left(keys, prefix)
+        while position < len(keys) and keys[position].startswith(prefix):
+            found.extend(sorted(self._values[keys[position]]))
+            if limit is not None and len(found) >= limit:
+                return found[:limit]
+            position += 1
+        return found
+
+    def values(self, offset=0) -> Iterator[str]:
+        """Indexed values in sorted order from the offset-th one, generated as they are read."""
+        self._ready()
+        keys, values = self._keys, self._values
+        if not self._shared:
+            position, offset = offset, 0
+        else:
+            position = 0
+            while position < len(keys) and offset >= len(values[keys[position]]):
+                offset -= len(values[keys[position]])
+                position += 1
+        for position in range(position, len(keys)):
+            yield from sorted(values[keys[position]])[offset:]
+            offset = 0
+
+
+class BirthdayIndex:
+    """Calendar index: (month, day) -> records, with the keys kept sorted.
+
+    Records born on 29 February are celebrated on 28 February in non-leap years.
+    """
+
+    def __init__(self):
+        self._days: Dict[Tuple[int, int], Dict[object, None]] = {}
+        self._keys: List[Tuple[int, int]] = []
+        self._count = 0
+
+    def __len__(self):
+        """Number of records with a birthday."""
+        return self._count
+
+    def _link(self, value, record):
+        key = (value.month, value.day)
+        if key not in self._days:
+            self._days[key] = {}
+            bisect.insort(self._keys, key)
+        if record not in self._days[key]:
+            self._count += 1
+        self._days[key][record] = None
+
+    def _unlink(self, value, record):
+        key = (value.month, value.day)
+        records = self._days.get(key)
+        if records is None or record not in records:
+            return
+        del records[record]
+        self._count -= 1
+        if not records:
+            del self._days[key]
+            del self._keys[bisect.bisect_left(self._keys, key)]
+
+    def add(self, record):
+        for value in record.field_values("birthday"):
+            self._link(value, record)
+
+    def remove(self, record):
+        for value in record.field_values("birthday"):
+            self._unlink(value, record)
+
+    def update(self, record, field, old, new):
+        if field != "birthday":
+            return
+        if old is not None:
+            self._unlink(old, record)
+        if new is not None:
+            self._link(new, record)
+
+    @staticmethod
+    def occurrence(key, year) -> date:
+        """Date the (month, day) birthday is celebrated in the given year."""
+        month, day = key
+        if (month, day) == (2, 29) and not calendar.isleap(year):
+            return date(year, 2, 28)
+        return date(year, month, day)
+
+    def upcoming(self, start: date, days: int) -> List[Tuple[date, object]]:
+        """Return (celebration date, record) pairs from start to start + days, sorted by date."""
+        end = start + timedelta(days=days)
+        found = []
+        first = bisect.bisect_left(self._keys, (start.month, start.day))
+        for year in range(start.year, end.year + 1):
+            for key in self._keys[first:]:
+                when = self.occurrence(key, year)
+                if when > end:
+                    return found
+                found.extend((when, record) for record in self._days[key])
+            first = 0
+        return found
+
+    def records(self, offset=0) -> Iterator[object]:
+        """Records with a birthday in calendar order (by month and day, not year), from the offset-th one."""
+        for key in self._keys:
+            records = self._days[key]
+            if offset >= len(records):
+                offset -= len(records)
+                continue
+            yield from islice(records, offset, None)
+            offset = 0
+
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class TextIndex:
+    """Positional inverted index over word tokens with BM25 ranking.
+
+    Documents are arbitrary hashable objects; ``add`` takes the list of text
+    fields to index. Fields are separated by a position gap, so a phrase
+    never matches across e.g. the title and the content.
+    """
+
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[object, List[int]]] = {}
+        self._lengths: Dict[object, int] = {}
+        self._terms: Dict[object, Set[str]] = {}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def add(self, doc, texts) -> None:
+        """Index a document made of several text fields."""
+        if doc in self._lengths:
+            self.remove(doc)
+        positions: Dict[str, List[int]] = {}
+        position = 0
+        for text in texts:
+            for token in tokenize(text):
+                positions.setdefault(token, []).append(position)
+                position += 1
+            position += 1
+        for token, token_positions in positions.items():
+            self._postings.setdefault(token, {})[doc] = token_positions
+        self._lengths[doc] = position
+        self._terms[doc] = set(positions)
+        self._total_length += position
+
+    def remove(self, doc) -> None:
+        """Drop a document from the index."""
+        length = self._lengths.pop(doc, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for token in self._terms.pop(doc):
+            docs = self._postings[token]
+            del docs[doc]
+            if not docs:
+                del self._postings[token]
+
+    def _matching(self, terms, any_term=False):
+        postings = [self._postings.get(term, {}) for term in terms]
+        if not postings:
+            return set()
+        if any_term:
+            return set().union(*postings)
+        postings.sort(key=len)
+        return set(postings[0]).intersection(*postings[1:])
+
+    def _has_phrase(self, doc, terms) -> bool:
+        starts = self._postings[terms[0]][doc]
+        following = [set(self._postings[term][doc]) for term in terms[1:]]
+        return any(
+            all(start + offset in positions for offset, positions in enumerate(following, 1))
+            for start in starts
+        )
+
+    def score(self, doc, terms) -> float:
+        """BM25 score of a document for the query terms."""
+        length = self._lengths.get(doc)
+        if not length:
+            return 0.0
+        count = len(self._lengths)
+        average = self._total_length / count
+        total = 0.0
+        for term in set(terms):
+            docs = self._postings.get(term, {})
+            positions = docs.get(doc)
+            if not positions:
+                continue
+            idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            tf = len(positions)
+            total += idf * tf * (self.K1 + 1) / (tf + self.K1 * (1 - self.B + self.B * length / average))
+        return total
+
+    def search(self, query: str, mode: str = "all") -> List[Tuple[object, float]]:
+        """Return (doc, score) pairs, best first.
+
+        mode is "all" (every term must occur), "any" (at least one term)
+        or "phrase" (terms must occur next to each other, in order).
+        """
+        if mode not in ("all", "any", "phrase"):
+            raise ValueError(f"Unknown search mode '{mode}'. Use all, any or phrase.")
+        terms = tokenize(query)
+        docs = self._matching(terms, any_term=(mode == "any"))
+        if mode == "phrase" and len(terms) > 1:
+            docs = [doc for doc in docs if self._has_phrase(doc, terms)]
+        return sorted(((doc, self.score(doc, terms)) for doc in docs), key=lambda item: -item[1])
+
+
+def edit_distance(first: str, second: str) -> int:
+    """
+    Damerau-Levenshtein distance: insertions, deletions, substitutions and
+    swaps of adjacent letters. Unlike the restricted variant it is a metric,
+    which BKTree relies on.
+    """
+    if first == second:
+        return 0
+    if not first or not second:
+        return len(first) + len(second)
+    infinity = len(first) + len(second)
+    # Row of the matrix where each letter was last seen in first.
+    last_row: Dict[str, int] = {}
+    rows = [[infinity] * (len(second) + 2)]
+    rows.append([infinity] + list(range(len(second) + 1)))
+    for i, a in enumerate(first, 1):
+        row = [infinity, i]
+        last_column = 0
+        for j, b in enumerate(second, 1):
+            k = last_row.get(b, 0)
+            l = last_column
+            if a == b:
+                cost = rows[i][j]
+                last_column = j
+            else:
+                cost = min(rows[i][j], rows[i][j + 1], row[j]) + 1
+            swap = rows[k][l] + (i - k - 1) + 1 + (j - l - 1)
+            row.append(cost if cost < swap else swap)
+        rows.append(row)
+        last_row[a] = i
+    return rows[-1][-1]
+
+
+class BKTree:
+    """Burkhard-Keller tree: words within an edit distance of a query without comparing all of them.
+
+    Every node is [word, {distance: child}]; a child's word is exactly that
+    distance from its parent, so by the triangle inequality a search only
+    descends into children whose distance is within tolerance of its own.
+    """
+
+    def __init__(self):
+        self._root = None
+        self.size = 0
+
+    def add(self, word):
+        if self._root is None:
+            self._root = [word, {}]
+            self.size = 1
+            return
+        node = self._root
+        while True:
+            distance = edit_distance(word, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = [word, {}]
+                self.size += 1
+                return
+            node = child
+
+    def search(self, word, tolerance) -> List[Tuple[int, str]]:
+        """(distance, word) for every word within tolerance of word."""
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = edit_distance(word, node[0])
+            if distance <= tolerance:
+                found.append((distance, node[0]))
+            for child_distance, child in node[1].items():
+                if distance - tolerance <= child_distance <= distance + tolerance:
+                    stack.append(child)
+        return found
+
+
+class FuzzyIndex(QueuedIndex):
+    """Typo-tolerant word index over one field: the distinct words in a BK-tree.
+
+    Owners are usually records (through the add / remove / update hooks), but
+    link / unlink take any hashable owner. Like NGramIndex, added records are
+    only queued until the next query. Words no longer used stay in the tree
+    until they outnumber the live ones, then the tree is rebuilt.
+    """
+
+    def __init__(self, field="name"):
+        super().__init__()
+        self.field = field
+        self._owners: Dict[str, Dict[object, None]] = {}
+        self._tree = BKTree()
+
+    @staticmethod
+    def tolerance(word) -> int:
+        """Typos allowed in a query word: none in very short words, two in long ones."""
+        return 0 if len(word) <= 2 else 1 if len(word) <= 5 else 2
+
+    def link(self, text, owner):
+        for word in tokenize(text):
+            owners = self._owners.get(word)
+            if owners is None:
+                self._owners[word] = owners = {}
+                self._tree.add(word)
+            owners[owner] = None
+
+    def unlink(self, text, owner):
+        for word in tokenize(text):
+            owners = self._owners.get(word)
+            if owners is None:
+                continue
+            owners.pop(owner, None)
+            if not owners:
+                del self._owners[word]
+        if self._tree.size > 2 * max(len(self._owners), 512):
+            self._tree = BKTree()
+            for word in self._owners:
+                self._tree.add(word)
+
+    def _flush(self):
+        for record in self._pending:
+            for value in record.field_values(self.field):
+                self.link(value, record)
+        self._pending = set()
+
+    def add(self, record):
+        self._pending.add(record)
+
+    def remove(self, record):
+        if record in self._pending:
+            self._pending.discard(record)
+            return
+        for value in record.field_values(self.field):
+            self.unlink(value, record)
+
+    def update(self, record, field, old, new):
+        if field != self.field or record in self._pending:
+            return
+        if old is not None:
+            self.unlink(old, record)
+        if new is not None:
+            self.link(new, record)
+
+    def matches(self, query) -> Dict[object, int]:
+        """
+        Owners matching every word of query within its tolerance, with the total
+        edit distance (0: every word found as typed).
+        """
+        self._ready()
+        totals: Optional[Dict[object, int]] = None
+        for word in dict.fromkeys(tokenize(query)):
+            best: Dict[object, int] = {}
+            for distance, found in self._tree.search(word, self.tolerance(word)):
+                for owner in self._owners.get(found, ()):
+                    if distance < best.get(owner, distance + 1):
+                        best[owner] = distance
+            if totals is None:
+                totals = best
+            else:
+                totals = {owner: totals[owner] + distance for owner, distance in best.items() if owner in totals}
+            if not totals:
+                return {}
+        return totals or {}
@@ -1,45 +1,105 @@
+from itertools import islice
+from typing import Iterator, List, Dict, Optional
 
-from typing import List, Dict, Optional
+from src.models.indexes import NGramIndex, PrefixIndex, TextIndex, tokenize
+from src.models.versions import Version, VersionIndex
+from src.utils.locking import RWLock, reading, writing, writing_through
 
 class Note:
     """Class representing a single note with title, content, and tags."""
 
+    # Notes collection the note belongs to; notified on every change.
+    _notes = None
+
     def __init__(self, title: str, content: str):
         self.title: str = title
         self.content: str = content
-        self.tags = []
-            
+        # Insertion-ordered set of tags (dict keys).
+        self.tags: Dict[str, None] = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_notes", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Older pickles store tags as a list.
+        self.tags = dict.fromkeys(self.tags)
+
+    def copy(self) -> "Note":
+        """Copy belonging to no Notes, with its own tags."""
+        note = Note(self.title, self.content)
+        note.tags = dict(self.tags)
+        return note
+
+    def field_values(self, field: str) -> List[str]:
+        """Return the raw values stored in a field ("title", "content" or "tags")."""
+        if field == "tags":
+            return list(self.tags)
+        return [getattr(self, field)]
+
+    def _changed(self, field, old=None, new=None):
+        """Let the owning Notes keep its indexes in sync."""
+        if self._notes is not None:
+            self._notes._note_changed(self, field, old, new)
+
+    @writing_through("_notes")
     def change_title(self, new_title):
         """Change name."""
+        old_title = self.title
         self.title = new_title
+        self._changed("title", old_title, new_title)
+
+    @writing_through("_notes")
+    def change_content(self, new_content: str) -> None:
+        """Replace the note text."""
+        old_content = self.content
+        self.content = new_content
+        self._changed("content", old_content, new_content)
 
+    @writing_through("_notes")
     def add_tag(self, tag: str) -> None:
         """Add a unique tag to the note."""
         if tag in self.tags:
             raise ValueError(f"Tag '{tag}' already exists in '{self.title}'.")
-        self.tags.append(tag)
+        self.tags[tag] = None
+        self._changed("tags", None, tag)
 
+    @writing_through("_notes")
     def edit_tag(self, old_tag: str, new_tag: str) -> None:
         """Rename an existing tag, ensuring uniqueness."""
         if old_tag not in self.tags:
             raise ValueError(f"Tag '{old_tag}' not found in '{self.title}'.")
         if new_tag in self.tags:
             raise ValueError(f"Tag '{new_tag}' already exists in '{self.title}'.")
-        idx = self.tags.index(old_tag)
-        self.tags[idx] = new_tag
+        # Rebuild to keep the renamed tag in its position.
+        self.tags = {new_tag if t == old_tag else t: None for t in self.tags}
+        self._changed("tags", old_tag, new_tag)
 
+    @writing_through("_notes")
     def delete_tag(self, tag: str) -> None:
         """Remove a tag from the note."""
         if tag not in self.tags:
             raise ValueError(f"Tag '{tag}' not found in '{self.title}'.")
-        self.tags.remove(tag)
-        
+        del self.tags[tag]
+        self._changed("tags", tag, None)
+
     def str_tags(self):
         return  ", ".join(self.tags) if self.tags else "No tags"
-    
+
     def str_content_short(self):
         return self.content if len(self.content) <= 50 else self.content[:50] + "..."
 
+    def matches(self, keyword: str) -> bool:
+        """Check if the keyword is a substring of the title, content or a tag (case insensitive)."""
+        keyword_lower = keyword.lower()
+        return (
+            keyword_lower in self.content.lower()
+            or keyword_lower in self.title.lower()
+            or any(keyword_lower in tag.lower() for tag in self.tags)
+        )
+
     def __str__(self) -> str:
         tags_str = self.str_tags()
         return f"[{self.title}] {self.content} (Tags: {tags_str})"
@@ -48,42 +108,226 @@ class Note:
 class Notes:
     """Class for managing multiple notes."""
 
+    # Last journal operation contained in a saved snapshot (see storage.journal).
+    journal_seq = 0
+
     def __init__(self):
         self.notes: Dict[str, Note] = {}
+        self._init_indexes()
+
+    def _init_indexes(self):
+        """Create the search indexes kept in sync with every note mutation."""
+        # Words of the titles and contents (tags have tag_index).
+        self.text_index = TextIndex()
+        # tag -> titles of notes carrying it (insertion-ordered set)
+        self.tag_index: Dict[str, Dict[str, None]] = {}
+        self.substring_indexes = [
+            NGramIndex("title", str.lower),
+            NGramIndex("content", str.lower),
+            NGramIndex("tags", str.lower),
+        ]
+        # Sorted titles and tags for completion.
+        self.title_prefixes = PrefixIndex("title")
+        self.tag_prefixes = PrefixIndex("tags")
+        # Detached copies of the notes for version().
+        self.versions = VersionIndex(Note.copy, "title")
+        # Every index above with the add / remove / update hooks.
+        self._indexes = [*self.substring_indexes, self.title_prefixes, self.tag_prefixes, self.versions]
+        # Insertion position of every note, so indexed results keep notes order.
+        self._order = {}
+        self._next_order = 0
+        # Runtime observers (e.g. a journal) with the same hooks as indexes.
+        self._listeners = []
+        # Lookups share it; changes (to the notes or a note) take it alone.
+        self.lock = RWLock()
+
+    def __getstate__(self):
+        # Indexes are derived data: only notes are pickled.
+        return {"notes": self.notes, "journal_seq": self.journal_seq}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_indexes()
+        for note in self.notes.values():
+            self._bind(note)
+
+    def _link_tag(self, tag: str, title: str) -> None:
+        self.tag_index.setdefault(tag, {})[title] = None
+
+    def _unlink_tag(self, tag: str, title: str) -> None:
+        titles = self.tag_index.get(tag)
+        if titles is None:
+            return
+        titles.pop(title, None)
+        if not titles:
+            del self.tag_index[tag]
+
+    def _new_order(self) -> int:
+        self._next_order += 1
+        return self._next_order
+
+    @writing
+    def add_listener(self, listener) -> None:
+        """Subscribe to add(note) / remove(note) / update(note, field, old, new) events."""
+        self._listeners.append(listener)
+
+    @writing
+    def remove_listener(self, listener) -> None:
+        self._listeners.remove(listener)
 
+    def _bind(self, note: Note, notify: bool = True) -> None:
+        note._notes = self
+        self._order[note] = self._new_order()
+        for tag in note.tags:
+            self._link_tag(tag, note.title)
+        self.text_index.add(note, [note.title, note.content])
+        for index in self._indexes + (self._listeners if notify else []):
+            index.add(note)
+
+    def _unbind(self, note: Note) -> None:
+        for tag in note.tags:
+            self._unlink_tag(tag, note.title)
+        self.text_index.remove(note)
+        for index in self._indexes + self._listeners:
+            index.remove(note)
+        self._order.pop(note, None)
+        note._notes = None
+
+    @writing
+    def _note_changed(self, note: Note, field: str, old, new) -> None:
+        if field == "title" and self.notes.get(old) is note:
+            del self.notes[old]
+            if new in self.notes:
+                # Renaming onto an existing note overwrites it.
+                self._unbind(self.notes.pop(new))
+            self.notes[new] = note
+            self._order[note] = self._new_order()
+            for tag in note.tags:
+                self._unlink_tag(tag, old)
+                self._link_tag(tag, new)
+        elif field == "tags":
+            if old is not None:
+                self._unlink_tag(old, note.title)
+            if new is not None:
+                self._link_tag(new, note.title)
+        if field != "tags":
+            self.text_index.add(note, [note.title, note.content])
+        for index in self._indexes + self._listeners:
+            index.update(note, field, old, new)
+
+    @writing
     def add_note(self, note: Note) -> None:
         """Add a new note."""
+        if note.title in self.notes:
+            self._unbind(self.notes.pop(note.title))
         self.notes[note.title] = note
+        self._bind(note)
 
+    @reading
     def find(self, title: str) -> Optional[Note]:
         """Find a note by its title."""
         return self.notes.get(title)
 
-    def find_note(self, keyword: str) -> List[Note]:
-        """Find notes containing the keyword in all (case insensitive)."""
-        keyword_lower = keyword.lower()
-        return [
-            note for note in self.notes.values()
-            if keyword_lower in note.content.lower()
-            or keyword_lower in note.title.lower()
-            or any(keyword_lower in tag.lower() for tag in note.tags)
-        ]
-        
+    @reading
+    def find_note(self, keyword: str, ranked: bool = False) -> List[Note]:
+        """Find notes containing the keyword in all (case insensitive), in insertion order or, ranked, best matches first."""
+        candidates = set()
+        for index in self.substring_indexes:
+            found = index.candidates(keyword)
+            if found is None:
+                candidates = None
+                break
+            candidates |= found
+        if candidates is None:
+            found = [note for note in self.notes.values() if note.matches(keyword)]
+        else:
+            found = [note for note in candidates if note.matches(keyword)]
+            found.sort(key=self._order.__getitem__)
+        if ranked:
+            terms = tokenize(keyword)
+            found.sort(key=lambda note: -self.text_index.score(note, terms))
+        return found
+
+    @reading
+    def search(self, query: str, mode: str = "all") -> List[Note]:
+        """Full-text search by words: mode is "all", "any" or "phrase"; best matches first."""
+        return [note for note, _ in self.text_index.search(query, mode)]
+
+    @writing
     def delete_note(self, title: str) -> bool:
         """Delete a note by title."""
         if title in self.notes:
-            del self.notes[title]
+            self._unbind(self.notes.pop(title))
             return True
         return False
 
+    @writing
     def change_note(self, title: str, new_content: str) -> bool:
         """Change content of an existing note."""
         note = self.find(title)
         if note:
-            note.content = new_content
+            note.change_content(new_content)
             return True
         return False
-    
+
+    @reading
     def find_by_tag(self, tag: str) -> List[Note]:
         """Find notes containing a specific tag."""
-        return [note for note in self.notes.values() if tag in note.tags]
+        return [self.notes[title] for title in self.tag_index.get(tag, ())]
+
+    @reading
+    def find_by_tags(self, tags: List[str], match_all: bool = True) -> List[Note]:
+        """Find notes having all (or, with match_all=False, any) of the tags."""
+        title_sets = [self.tag_index.get(tag, {}) for tag in tags]
+        if not title_sets:
+            return []
+        if match_all:
+            title_sets.sort(key=len)
+            titles = [title for title in title_sets[0] if all(title in other for other in title_sets[1:])]
+        else:
+            titles = dict.fromkeys(title for title_set in title_sets for title in title_set)
+        return [self.notes[title] for title in titles]
+
+    @reading
+    def complete_titles(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        """Note titles starting with prefix (case insensitive), sorted."""
+        return self.title_prefixes.complete(prefix, limit)
+
+    @reading
+    def complete_tags(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        """Tags starting with prefix (case insensitive), sorted."""
+        return self.tag_prefixes.complete(prefix, limit)
+
+    @reading
+    def ordered(self, order: Optional[str] = None, offset: int = 0) -> Iterator[Note]:
+        """Iterate notes from position offset, in insertion order or by "title" (from the title index)."""
+        if order is None:
+            return islice(self.notes.values(), offset, None)
+        if order == "title":
+            return map(self.find, self.title_prefixes.values(offset))
+        raise ValueError(f"Unknown order: '{order}'. Use title.")
+
+    @reading
+    def version(self) -> "NotesVersion":
+        """The notes as they are now, unaffected by later changes (see NotesVersion). Taken in O(1)."""
+        return NotesVersion(self.versions.snapshot(), self.journal_seq)
+
+    @reading
+    def tag_counts(self) -> Dict[str, int]:
+        """Return every tag with the number of notes using it."""
+        return {tag: len(titles) for tag, titles in self.tag_index.items()}
+
+
+class NotesVersion(Version):
+    """Point-in-time view of Notes: copies of the notes in insertion order, read without a lock."""
+
+    def key(self, note: Note) -> str:
+        return note.title
+
+    def find_note(self, keyword: str) -> List[Note]:
+        """Notes containing the keyword, in insertion order (a scan: a version has no indexes)."""
+        return [note for note in self if note.matches(keyword)]
+
+    def __reduce__(self):
+        # Pickle as plain Notes.
+        return (Notes, (), {"notes": dict(self.items()), "journal_seq": self.journal_seq})
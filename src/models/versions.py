@@ -0,0 +1,249 @@
+from typing import Iterator, Optional, Tuple
+
+from src.models.indexes import QueuedIndex
+
+# ----------------- Versions -----------------
+#
+# VersionIndex keeps a detached copy of every record (or note) in a persistent
+# map: a 32-way trie keyed by the item's position in the book, where a change
+# copies only the nodes on the path to the changed leaf and shares the rest
+# with the previous map. A version of the whole book is therefore just the
+# current root, taken in O(1), and it stays as it was however the book
+# changes afterwards. Saves, exports and long scans iterate a version instead
+# of the live book, so they need no lock and hold up no change.
+#
+# Changed items are copied into the map only when a version is taken, and
+# copying paths is wasted while nobody holds a version, so changes are made
+# under an edit token: nodes created under the current token are in no map
+# handed out yet and are changed in place. Taking a version starts a new
+# token, which freezes every node that exists. A version then costs O(1)
+# plus the changes queued since the previous one.
+#
+# Positions follow the book's dict order: an added or renamed item gets the
+# next position, so iterating the trie in key order is iterating the book.
+
+BITS = 5
+WIDTH = 1 << BITS
+MASK = WIDTH - 1
+EMPTY_SLOTS = [None] * WIDTH
+
+
+class _Node(list):
+    """WIDTH slots (children, or values in a leaf) and the edit token allowed to change them in place."""
+
+    __slots__ = ("edit",)
+
+
+def _node(slots, edit=None):
+    node = _Node(slots)
+    node.edit = edit
+    return node
+
+
+class PersistentMap:
+    """
+    Map of non-negative int keys to values (never None), iterated in key order.
+    set() and remove() return the changed map and leave this one as it is,
+    except for nodes made under the edit token they are given.
+    """
+
+    __slots__ = ("_root", "_shift", "_count")
+
+    def __init__(self, root=None, shift=0, count=0):
+        self._root = root
+        self._shift = shift
+        self._count = count
+
+    @classmethod
+    def from_values(cls, values) -> "PersistentMap":
+        """Map of the values under keys 1, 2, 3..., built bottom up in O(n)."""
+        nodes = [None, *values]
+        count = len(nodes) - 1
+        if not count:
+            return cls()
+        shift = 0
+        while True:
+            nodes = [_node((nodes[start:start + WIDTH] + EMPTY_SLOTS)[:WIDTH]) for start in range(0, len(nodes), WIDTH)]
+            if len(nodes) == 1:
+                return cls(nodes[0], shift, count)
+            shift += BITS
+
+    def __len__(self):
+        return self._count
+
+    def get(self, key):
+        if key >> self._shift >= WIDTH:
+            return None
+        node = self._root
+        shift = self._shift
+        while node is not None and shift:
+            node = node[(key >> shift) & MASK]
+            shift -= BITS
+        return None if node is None else node[key & MASK]
+
+    @staticmethod
+    def _path(root, shift, key):
+        """Nodes from root down to the leaf holding key (None where missing)."""
+        path = [root]
+        while shift:
+            node = path[-1]
+            path.append(None if node is None else node[(key >> shift) & MASK])
+            shift -= BITS
+        return path
+
+    def set(self, key, value, edit=None) -> "PersistentMap":
+        """The map with key set to value."""
+        root, shift = self._root, self._shift
+        while key >> shift >= WIDTH:
+            # Grow a level: the old root becomes the first child of the new one.
+            root = None if root is None else _node([root] + EMPTY_SLOTS[1:], edit)
+            shift += BITS
+        path = self._path(root, shift, key)
+        count = self._count + (path[-1] is None or path[-1][key & MASK] is None)
+        # Leaf first. A node owned by the edit is changed in place, and then
+        # its parents are owned too and already point to it; others are copied.
+        child = value
+        level = 0
+        for node in reversed(path):
+            slot = (key >> level) & MASK
+            if edit is not None and node is not None and node.edit is edit:
+                node[slot] = child
+                return PersistentMap(path[0], shift, count)
+            node = _node(node or EMPTY_SLOTS, edit)
+            node[slot] = child
+            child = node
+            level += BITS
+        return PersistentMap(child, shift, count)
+
+    def remove(self, key, edit=None) -> "PersistentMap":
+        """The map without key."""
+        if key >> self._shift >= WIDTH:
+            return self
+        path = self._path(self._root, self._shift, key)
+        if path[-1] is None or path[-1][key & MASK] is None:
+            return self
+        count = self._count - 1
+        child = None
+        level = 0
+        for node in reversed(path):
+            owned = edit is not None and node.edit is edit
+            if not owned:
+                node = _node(node, edit)
+            node[(key >> level) & MASK] = child
+            level += BITS
+            if node.count(None) == WIDTH:
+                # Nothing left below this node: prune it.
+                child = None
+            elif owned:
+                return PersistentMap(path[0], self._shift, count)
+            else:
+                child = node
+        return PersistentMap(child, self._shift, count)
+
+    def __iter__(self) -> Iterator[object]:
+        """Values in key order."""
+        if self._root is None:
+            return
+        # Stack of (node, shift) still to visit, next first; leaves hold the values.
+        stack = [(self._root, self._shift)]
+        while stack:
+            node, shift = stack.pop()
+            if not shift:
+                for value in node:
+                    if value is not None:
+                        yield value
+                continue
+            stack.extend((child, shift - BITS) for child in reversed(node) if child is not None)
+
+
+class VersionIndex(QueuedIndex):
+    """
+    Detached copies of the records of a book (or notes of a Notes) in a
+    PersistentMap, kept through the add / remove / update hooks. copy(item)
+    makes the detached copy; key_field is the field whose change moves an
+    item to the end, as renaming does in the book.
+
+    Added and changed items are queued and copied into the map when the
+    next version is taken, so a change costs no copy, and an item changed
+    many times between two versions is copied once.
+    """
+
+    def __init__(self, copy, key_field):
+        super().__init__()
+        self.copy = copy
+        self.key_field = key_field
+        self._items = PersistentMap()
+        self._edit = object()
+        self._positions = {}
+        self._next_position = 0
+
+    def _flush(self):
+        items = self._items
+        for item in self._pending:
+            items = items.set(self._positions[item], self.copy(item), self._edit)
+        self._items = items
+        self._pending.clear()
+
+    def snapshot(self) -> PersistentMap:
+        """The current map, frozen: from now on changes copy the nodes they touch."""
+        # Called under the model's read lock, maybe by several threads at once.
+        with self._flush_lock:
+            if self._pending:
+                self._flush()
+            self._edit = object()
+            return self._items
+
+    def add(self, item):
+        self._next_position += 1
+        self._positions[item] = self._next_position
+        self._pending.add(item)
+
+    def remove(self, item):
+        self._pending.discard(item)
+        position = self._positions.pop(item, None)
+        if position is not None:
+            self._items = self._items.remove(position, self._edit)
+
+    def update(self, item, field, old, new):
+        if item not in self._positions:
+            return
+        if field == self.key_field:
+            self.remove(item)
+            self.add(item)
+        else:
+            self._pending.add(item)
+
+
+class Version:
+    """
+    Read-only point-in-time view of a book or notes: detached copies of the
+    items in book order, and the journal_seq they include. Pickles as the
+    model it was taken from, holding just these items.
+    """
+
+    def __init__(self, items: PersistentMap, journal_seq=0):
+        self._items = items
+        self.journal_seq = journal_seq
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def values(self):
+        return iter(self._items)
+
+    def key(self, item) -> str:
+        raise NotImplementedError
+
+    def items(self) -> Iterator[Tuple[str, object]]:
+        """(key, item) pairs in book order."""
+        return ((self.key(item), item) for item in self._items)
+
+    def find(self, key) -> Optional[object]:
+        """The item with this key: a scan, the version keeps no lookup index."""
+        return next((item for item in self._items if self.key(item) == key), None)
+
+    def version(self):
+        return self
@@ -0,0 +1,221 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from src import commands
+from src.batch import run_command
+from src.commands import ALIASES, parse_input
+from src.main import close_storage, open_storage
+
+# ------------------------------
+# Server mode: several clients share one book over a local socket
+#
+# One JSON object per line each way:
+#   request   {"id": 7, "line": "add-phone Ann 0501234567"}
+#             {"id": 7, "command": "phone", "args": ["Ann"]}
+#   response  {"id": 7, "command": "phone", "status": "ok", "message": "..."}
+# "id" is optional and echoed back; status is "ok", "warning" or "error" as in
+# batch mode. "exit" (or an alias) closes the connection. import and export
+# open files on the server's host: they are refused unless the server runs
+# with --data-dir, and then only take files inside that directory.
+#
+# Reads run as soon as they arrive, side by side in a pool of READ_THREADS
+# threads, under the read locks of the book and the notes. Changes are
+# queued for a single writer thread and applied in arrival order under the
+# write locks, so a command never sees another one half done. A connection's
+# requests are answered in order, so a client reads its own changes. The
+# journal is fsynced by its background thread, not after every change.
+# ------------------------------
+
+HOST = "127.0.0.1"
+PORT = 8765
+# Longest request line accepted.
+LINE_LIMIT = 1 << 20
+READ_THREADS = 4
+
+# Commands that do not change the book or the notes.
+READ_COMMANDS = {
+    "help", "hello", "all", "find", "phone", "emails", "addresses", "birthdays",
+    "all-note", "find-note", "find-tag", "find-any-tag", "tags", "export",
+}
+# Reads that work on a version() of the book or notes: they take no lock for
+# their whole run, so a long export does not hold up changes.
+VERSION_COMMANDS = {"export"}
+# Commands that open a file named by the client on the server's host: off
+# unless the server is given a data directory, and then confined to it.
+FILE_COMMANDS = {"import", "export"}
+
+
+def parse_request(line):
+    """Turn a request line into (id, command, args). Raises ValueError for a bad request."""
+    request = json.loads(line)
+    if not isinstance(request, dict):
+        raise ValueError("Expected a JSON object.")
+    if "line" in request:
+        command, args = parse_input(str(request["line"]))
+    else:
+        command = str(request.get("command", "")).lower()
+        args = request.get("args", [])
+        if not isinstance(args, list):
+            raise ValueError("'args' must be a list.")
+        args = [str(arg) for arg in args]
+    if not command:
+        raise ValueError("No command given.")
+    return request.get("id"), ALIASES.get(command, command), args
+
+
+class Server:
+    """Runs client requests against one book and notes: reads in a thread pool, changes through a single writer."""
+
+    def __init__(self, book, notes, journals=(), read_threads=READ_THREADS, data_dir=None):
+        self.book = book
+        self.notes = notes
+        self.journals = list(journals)
+        self.data_dir = os.path.realpath(data_dir) if data_dir else None
+        self._writes = asyncio.Queue()
+        self._writer = None
+        self._servers = []
+        self._read_pool = ThreadPoolExecutor(read_threads, thread_name_prefix="read")
+        self._write_pool = ThreadPoolExecutor(1, thread_name_prefix="write")
+
+    async def start(self, host=HOST, port=PORT, unix_path=None):
+        """Start listening on a Unix socket if unix_path is given, else on host:port."""
+        self._writer = asyncio.create_task(self._apply_writes())
+        if unix_path:
+            server = await asyncio.start_unix_server(self._serve, path=unix_path, limit=LINE_LIMIT)
+        else:
+            server = await asyncio.start_server(self._serve, host, port, limit=LINE_LIMIT)
+        self._servers.append(server)
+        return server
+
+    async def stop(self):
+        """Stop accepting clients and let the writer apply the changes already queued."""
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        await self._writes.join()
+        self._writer.cancel()
+        self._read_pool.shutdown()
+        self._write_pool.shutdown()
+
+    def _read(self, command, args):
+        if command in VERSION_COMMANDS:
+            return run_command(command, args, self.book, self.notes)
+        # Always the book first, then the notes (as in _write): no lock order cycles.
+        with self.book.lock.read(), self.notes.lock.read():
+            return run_command(command, args, self.book, self.notes)
+
+    def _write(self, command, args):
+        with self.book.lock.write(), self.notes.lock.write():
+            result = run_command(command, args, self.book, self.notes)
+            for journal in self.journals:
+                journal.checkpoint()
+        return result
+
+    async def _apply_writes(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            command, args, future = await self._writes.get()
+            try:
+                result = await loop.run_in_executor(self._write_pool, self._write, command, args)
+            except Exception as e:
+                result = (command, "error", str(e) or type(e).__name__)
+            if not future.cancelled():
+                future.set_result(result)
+            self._writes.task_done()
+
+    def _confined(self, args):
+        """args with the file name (the first one) resolved inside data_dir. Raises ValueError if that is off or the file is outside it."""
+        if self.data_dir is None:
+            raise ValueError("Files cannot be imported or exported through the server: start it with --data-dir to allow files in one directory.")
+        if not args:
+            # The command reports its usage.
+            return args
+        path = os.path.realpath(os.path.join(self.data_dir, args[0]))
+        if os.path.commonpath([self.data_dir, path]) != self.data_dir:
+            raise ValueError(f"'{args[0]}' is outside the data directory.")
+        return [path, *args[1:]]
+
+    async def execute(self, command, args):
+        """Run one command. Returns (command, status, message)."""
+        if command in FILE_COMMANDS:
+            try:
+                args = self._confined(args)
+            except ValueError as e:
+                return command, "error", str(e)
+        loop = asyncio.get_running_loop()
+        if command in READ_COMMANDS:
+            return await loop.run_in_executor(self._read_pool, self._read, command, args)
+        future = loop.create_future()
+        await self._writes.put((command, args, future))
+        return await future
+
+    async def _serve(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                request_id = None
+                try:
+                    request_id, command, args = parse_request(line)
+                except ValueError as e:
+                    response = {"status": "error", "message": f"Bad request: {e}"}
+                else:
+                    if command == "exit":
+                        break
+                    command, status, message = await self.execute(command, args)
+                    response = {"command": command, "status": status, "message": message}
+                if request_id is not None:
+                    response = {"id": request_id, **response}
+                writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            # Client gone, or a line over LINE_LIMIT.
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host=HOST, port=PORT, unix_path=None, journal_options=None, data_dir=None):
+    """Open the storage, serve until SIGINT or SIGTERM, then save and close."""
+    book, notes, journals = open_storage(**(journal_options or {}))
+    server = Server(book, notes, journals, data_dir=data_dir)
+    listening = await server.start(host, port, unix_path)
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopped.set)
+    where = unix_path or "{}:{}".format(*listening.sockets[0].getsockname()[:2])
+    print(f"Serving on {where}", file=sys.stderr)
+    try:
+        await stopped.wait()
+    finally:
+        await server.stop()
+        close_storage(journals)
+        if unix_path and os.path.exists(unix_path):
+            os.remove(unix_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.server", description="Share the assistant's book with local clients over a JSON lines socket.")
+    parser.add_argument("--host", default=HOST, help=f"TCP address to listen on (default: {HOST})")
+    parser.add_argument("--port", type=int, default=PORT, help=f"TCP port (default: {PORT})")
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--data-dir", metavar="DIR", help="allow import and export of files in this directory (default: refused)")
+    parser.add_argument("--on-duplicate", choices=("skip", "allow"), default="skip", help="phone or email already used by another contact")
+    options = parser.parse_args(argv)
+
+    # No prompts: the server has no terminal to ask.
+    commands.INTERACTIVE = False
+    commands.ON_DUPLICATE = options.on_duplicate
+    # fsync is left to the journal's background thread.
+    asyncio.run(serve(options.host, options.port, options.unix, {"sync_every": sys.maxsize}, options.data_dir))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+import lzma
+import struct
+import sys
+import zlib
+
+try:
+    # Python 3.14+
+    from compression import zstd
+except ImportError:
+    try:
+        import zstandard as zstd
+    except ImportError:
+        # Without zstd, files are compressed with zlib unless a codec is named.
+        zstd = None
+
+# ------------------------------
+# Block files
+#
+# A stream of blocks, each compressed on its own and checksummed, so damage
+# costs only the blocks it hits. The writer and the reader hold one block at
+# a time, never the whole file. All integers little-endian:
+#
+#   header  magic, version, codec id
+#   block   sync marker, u32 stored length, u32 raw length, u32 CRC-32 of the
+#           two lengths and the stored bytes, then the stored bytes
+#   end     a block of raw length 0 holding the u64 number of blocks before it
+#
+# A block with a wrong checksum (or one that does not decompress) is skipped:
+# the reader looks for the next sync marker and goes on from there. A file
+# without its end block was cut short. Either way the reader still yields
+# every good block and says what it missed.
+# ------------------------------
+
+MAGIC = b"ABBLOCK\x00"
+VERSION = 1
+HEADER = struct.Struct("<8sHB")
+SYNC = b"\xabBLK"
+BLOCK = struct.Struct("<4sIII")
+LENGTHS = struct.Struct("<II")
+U64 = struct.Struct("<Q")
+# Bytes read at a time while looking for the next sync marker.
+SCAN_CHUNK = 1 << 16
+
+# name -> (id stored in the header, compress, decompress)
+CODECS = {
+    "none": (0, bytes, bytes),
+    "zlib": (1, lambda data: zlib.compress(data, 6), zlib.decompress),
+    # The blocks carry their own checksum: no need for the one xz adds.
+    "lzma": (2, lambda data: lzma.compress(data, check=lzma.CHECK_NONE), lzma.decompress),
+}
+if zstd is not None:
+    CODECS["zstd"] = (3, lambda data: zstd.compress(data, 3), zstd.decompress)
+CODEC_NAMES = {0: "none", 1: "zlib", 2: "lzma", 3: "zstd"}
+DEFAULT_CODEC = "zstd" if zstd is not None else "zlib"
+
+
+class BlockError(ValueError):
+    """The file is not a block file this version can read."""
+
+
+def is_block_file(f) -> bool:
+    """Whether the binary file f starts as a block file. Leaves f where it was."""
+    position = f.tell()
+    start = f.read(len(MAGIC))
+    f.seek(position)
+    return start == MAGIC
+
+
+def checksum(lengths, stored):
+    """CRC-32 of a block: its packed lengths, then its stored bytes."""
+    return zlib.crc32(stored, zlib.crc32(lengths))
+
+
+def frame(stored, raw_length=None):
+    """Block header + stored bytes; raw_length defaults to the stored length (no compression)."""
+    raw_length = len(stored) if raw_length is None else raw_length
+    lengths = LENGTHS.pack(len(stored), raw_length)
+    return BLOCK.pack(SYNC, len(stored), raw_length, checksum(lengths, stored)) + stored
+
+
+def read_frame(data, offset):
+    """Stored bytes of the block at offset in data (bytes or mmap), or None if it is damaged or cut short."""
+    if offset + BLOCK.size > len(data):
+        return None
+    sync, stored_length, raw_length, expected = BLOCK.unpack_from(data, offset)
+    start = offset + BLOCK.size
+    if sync != SYNC or start + stored_length > len(data):
+        return None
+    stored = data[start:start + stored_length]
+    if checksum(LENGTHS.pack(stored_length, raw_length), stored) != expected:
+        return None
+    return stored
+
+
+class BlockWriter:
+    """Writes blocks to a binary file as they come. close() writes the end block (it does not close the file)."""
+
+    def __init__(self, f, codec=DEFAULT_CODEC):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec {codec!r}, expected one of: {', '.join(CODECS)}.")
+        codec_id, self._compress, _ = CODECS[codec]
+        self._f = f
+        self.blocks = 0
+        f.write(HEADER.pack(MAGIC, VERSION, codec_id))
+
+    def _write(self, stored, raw_length):
+        self._f.write(frame(stored, raw_length))
+
+    def write_block(self, data):
+        if not data:
+            raise ValueError("A block cannot be empty.")
+        self._write(self._compress(data), len(data))
+        self.blocks += 1
+
+    def close(self):
+        self._write(U64.pack(self.blocks), 0)
+
+
+class BlockReader:
+    """
+    Iterates over the blocks of a binary file, decompressed, skipping damaged
+    ones. Once iterated: blocks is the number read, expected the number the
+    end block gives (None without one), damaged the file offsets where
+    damage starts, and complete whether nothing was missed.
+    """
+
+    def __init__(self, f):
+        self._f = f
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise BlockError("The file is too short to be a block file.")
+        magic, version, codec_id = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise BlockError(f"Not a block file (version {VERSION}).")
+        name = CODEC_NAMES.get(codec_id)
+        if name not in CODECS:
+            missing = "zstd (pip install zstandard)" if name == "zstd" else f"codec {codec_id}"
+            raise BlockError(f"The file is compressed with {missing}, which is not available here.")
+        self.codec = name
+        self._decompress = CODECS[name][2]
+        self.blocks = 0
+        self.expected = None
+        self.damaged = []
+
+    @property
+    def complete(self):
+        return self.expected == self.blocks and not self.damaged
+
+    def _resync(self, start):
+        """Seek to the first sync marker after start. Returns False if there is none."""
+        self._f.seek(start)
+        tail = b""
+        while True:
+            chunk = self._f.read(SCAN_CHUNK)
+            if not chunk:
+                return False
+            data = tail + chunk
+            found = data.find(SYNC)
+            if found >= 0:
+                self._f.seek(self._f.tell() - len(data) + found)
+                return True
+            # A marker may straddle two chunks.
+            tail = data[1 - len(SYNC):]
+
+    def __iter__(self):
+        f = self._f
+        # False from the first bad block until a good one: one damaged region is reported once.
+        in_sync = True
+        while True:
+            offset = f.tell()
+            head = f.read(BLOCK.size)
+            if not head:
+                return
+            block = None
+            if len(head) == BLOCK.size:
+                sync, stored_length, raw_length, expected = BLOCK.unpack(head)
+                stored = f.read(stored_length) if sync == SYNC else b""
+                if sync == SYNC and len(stored) == stored_length and checksum(head[4:12], stored) == expected:
+                    if not raw_length:
+                        self.expected = U64.unpack(stored)[0]
+                        return
+                    try:
+                        block = self._decompress(stored)
+                    except Exception:
+                        # The checksum matched: written broken, or a marker
+                        # inside compressed data that happens to check out.
+                        block = None
+                    if block is not None and len(block) != raw_length:
+                        block = None
+            if block is None:
+                if in_sync:
+                    self.damaged.append(offset)
+                in_sync = False
+                if not self._resync(offset + 1):
+                    return
+                continue
+            in_sync = True
+            self.blocks += 1
+            yield block
+
+    def report(self, name="The file"):
+        """One line saying what was missed, for a reader that is not complete."""
+        if self.expected is None:
+            missed = "it was cut short"
+        else:
+            missed = f"{self.expected - self.blocks} of {self.expected} blocks lost"
+        where = ", ".join(str(offset) for offset in self.damaged)
+        return f"{name} is damaged ({missed}" + (f"; bad data at byte {where}" if where else "") + f"): recovered {self.blocks} blocks."
+
+
+def check(filename):
+    """Read every block of a block file. Returns its reader, for blocks / expected / damaged / complete."""
+    with open(filename, "rb") as f:
+        reader = BlockReader(f)
+        for _ in reader:
+            pass
+    return reader
+
+
+if __name__ == "__main__":
+    # python -m src.storage.blocks FILE... : check block files
+    status = 0
+    for filename in sys.argv[1:]:
+        try:
+            reader = check(filename)
+        except (OSError, BlockError) as e:
+            print(f"{filename}: {e}")
+            status = 1
+            continue
+        if reader.complete:
+            print(f"{filename}: {reader.blocks} blocks, {reader.codec}, ok.")
+        else:
+            print(reader.report(filename))
+            status = 1
+    sys.exit(status)
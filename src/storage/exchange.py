@@ -0,0 +1,391 @@
+import csv
+import io
+import json
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+from src.models.contacts import Record
+from src.models.notes import Note
+from src.storage.persistence import atomic_file
+from src.utils.validators import validate_phone, validate_email, validate_birthday, validate_name, validate_address, parse_date, format_date, phone_key, email_key
+
+# ------------------------------
+# Streaming import / export
+#
+# Files are read and written one row at a time through generators, so memory
+# use does not grow with the file. The format follows the file extension:
+#   .csv    name, phones, emails, addresses, birthday  /  title, content, tags
+#           (multiple values separated by ";")
+#   .jsonl  one JSON object per line with the same keys, lists for multiple values
+#   .vcf    vCard 3.0 (contacts only)
+# Birthdays are DD.MM.YYYY, except in vCards (YYYY-MM-DD).
+# ------------------------------
+
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".vcf": "vcard", ".vcard": "vcard"}
+
+CONTACT_FIELDS = ["name", "phones", "emails", "addresses", "birthday"]
+NOTE_FIELDS = ["title", "content", "tags"]
+LIST_FIELDS = {"phones", "emails", "addresses", "tags"}
+SEPARATOR = ";"
+
+# Rows are validated this many at a time before they are inserted, by this
+# many worker processes (1: in this process).
+CHUNK_SIZE = 1000
+WORKERS = 1
+# Rejected rows kept for the report (the rest are only counted).
+MAX_REPORTED_ERRORS = 20
+
+
+class ImportResult:
+    """Counts of an import run and the first rejected rows as (line, message)."""
+
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def reject(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+def file_format(filename):
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unknown file type '{extension}'. Use {', '.join(FORMATS)}.")
+    return FORMATS[extension]
+
+
+def chunked(items, size=CHUNK_SIZE):
+    """Yield lists of up to size items."""
+    items = iter(items)
+    while chunk := list(islice(items, size)):
+        yield chunk
+
+# ------------------------------
+# Readers: yield (line, row) where row is a dict, or the error of an unreadable line
+# ------------------------------
+
+def _split(value):
+    return [item.strip() for item in value.split(SEPARATOR) if item.strip()]
+
+def read_csv(f, fields):
+    reader = csv.DictReader(f)
+    rows = iter(reader)
+    while True:
+        try:
+            row = next(rows)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            # The csv reader goes on with the next line.
+            yield reader.reader.line_num, ValueError(f"Invalid CSV: {e}")
+            continue
+        values = {}
+        for field in fields:
+            value = row.get(field) or ""
+            values[field] = _split(value) if field in LIST_FIELDS else value.strip()
+        yield reader.line_num, values
+
+def read_jsonl(f, fields):
+    for line, text in enumerate(f, 1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError as e:
+            yield line, ValueError(f"Invalid JSON: {e}")
+            continue
+        if not isinstance(row, dict):
+            yield line, ValueError("Expected a JSON object.")
+            continue
+        try:
+            values = {field: _json_value(field, row.get(field)) for field in fields}
+        except ValueError as e:
+            yield line, e
+            continue
+        yield line, values
+
+def _json_value(field, value):
+    if field in LIST_FIELDS:
+        if value is None:
+            return []
+        if isinstance(value, str):
+            return [value]
+        if not isinstance(value, list) or any(isinstance(item, (dict, list)) for item in value):
+            raise ValueError(f"'{field}' must be a string or a list of strings.")
+        return [str(item) for item in value]
+    if isinstance(value, (dict, list)):
+        raise ValueError(f"'{field}' must be a string.")
+    return "" if value is None else str(value)
+
+def _vcard_lines(f):
+    """Unfold continuation lines: yield (line number, logical line)."""
+    pending, start = None, 0
+    for line, text in enumerate(f, 1):
+        text = text.rstrip("\r\n")
+        if text[:1] in (" ", "\t") and pending is not None:
+            pending += text[1:]
+            continue
+        if pending is not None:
+            yield start, pending
+        pending, start = text, line
+    if pending is not None:
+        yield start, pending
+
+# Component separator of structured values (ADR), unless escaped.
+VCARD_COMPONENT = re.compile(r"(?<!\\);")
+
+def _vcard_unescape(value):
+    return value.replace("\\n", "\n").replace("\\N", "\n").replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\")
+
+def _vcard_birthday(value):
+    value = value.strip()
+    for pattern in ("%Y-%m-%d", "%Y%m%d"):
+        try:
+            return format_date(datetime.strptime(value, pattern).date())
+        except ValueError:
+            continue
+    return value
+
+def read_vcard(f, fields):
+    row, start = None, 0
+    for line, text in _vcard_lines(f):
+        if ":" not in text:
+            continue
+        key, value = text.split(":", 1)
+        name = key.split(";", 1)[0].upper()
+        if "." in name:
+            # Grouped properties: item1.TEL
+            name = name.rsplit(".", 1)[1]
+        if name == "BEGIN" and value.strip().upper() == "VCARD":
+            row, start = {"name": "", "phones": [], "emails": [], "addresses": [], "birthday": ""}, line
+        elif row is None:
+            continue
+        elif name == "END":
+            yield start, row
+            row = None
+        elif name == "FN":
+            row["name"] = _vcard_unescape(value).strip()
+        elif name == "TEL":
+            row["phones"].append(value.strip().replace(" ", "").replace("-", ""))
+        elif name == "EMAIL":
+            row["emails"].append(value.strip())
+        elif name == "ADR":
+            parts = [_vcard_unescape(part).strip() for part in VCARD_COMPONENT.split(value)]
+            row["addresses"].append(", ".join(part for part in parts if part))
+        elif name == "BDAY":
+            row["birthday"] = _vcard_birthday(value)
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl, "vcard": read_vcard}
+
+def _is_utf8(value):
+    try:
+        (value if isinstance(value, str) else "".join(value)).encode("utf-8")
+    except UnicodeEncodeError:
+        return False
+    return True
+
+def utf8_checked(rows):
+    """
+    Pass (line, row) pairs on, turning rows with bytes that are not UTF-8
+    into errors. Files are read with errors="surrogateescape": a strict
+    decoder fails on a whole buffer of rows at once, this way only the rows
+    holding the bad bytes (as lone surrogates) are lost.
+    """
+    for line, row in rows:
+        if isinstance(row, dict) and not all(map(_is_utf8, row.values())):
+            row = ValueError("Not valid UTF-8.")
+        yield line, row
+
+# ------------------------------
+# Writers
+# ------------------------------
+
+def _csv_row(row):
+    return {field: SEPARATOR.join(value) if field in LIST_FIELDS else value for field, value in row.items()}
+
+def write_csv(f, rows, fields):
+    writer = csv.DictWriter(f, fieldnames=fields)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(_csv_row(row))
+
+def write_jsonl(f, rows, fields):
+    for row in rows:
+        f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+def _vcard_escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace(",", "\\,").replace(";", "\\;")
+
+def write_vcard(f, rows, fields):
+    for row in rows:
+        name = _vcard_escape(row["name"])
+        lines = ["BEGIN:VCARD", "VERSION:3.0", f"FN:{name}", f"N:{name};;;;"]
+        lines += [f"TEL:{phone}" for phone in row["phones"]]
+        lines += [f"EMAIL:{email}" for email in row["emails"]]
+        lines += [f"ADR:;;{_vcard_escape(address)};;;;" for address in row["addresses"]]
+        if row["birthday"]:
+            lines.append("BDAY:" + parse_date(row["birthday"]).isoformat())
+        lines.append("END:VCARD")
+        f.write("\r\n".join(lines) + "\r\n")
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl, "vcard": write_vcard}
+
+# ------------------------------
+# Rows <-> models
+# ------------------------------
+
+def contact_row(record):
+    return {
+        "name": record.name.value,
+        "phones": record.field_values("phones"),
+        "emails": record.field_values("emails"),
+        "addresses": record.field_values("addresses"),
+        "birthday": record.str_birthday(),
+    }
+
+def note_row(note):
+    return {"title": note.title, "content": note.content, "tags": list(note.tags)}
+
+def _unique(values, kind, owner, key=None):
+    """Reject a row listing the same value twice (compared by key, e.g. phone_key)."""
+    seen = set()
+    for value in values:
+        canonical = key(value) if key else value
+        if canonical in seen:
+            raise ValueError(f"{kind} '{value}' already exists for {owner}.")
+        seen.add(canonical)
+    return values
+
+def validate_contact_row(row):
+    """Validate and normalize a contact row into the arguments of Record.from_values."""
+    name = validate_name(row["name"]).title()
+    return (
+        name,
+        _unique([validate_phone(phone) for phone in row["phones"]], "Phone", name, phone_key),
+        _unique([validate_email(email) for email in row["emails"]], "Email", name, email_key),
+        _unique([validate_address(address).title() for address in row["addresses"]], "Address", name),
+        validate_birthday(row["birthday"]) if row["birthday"] else None,
+    )
+
+def contact_from_values(values):
+    return Record.from_values(*values)
+
+def validate_note_row(row):
+    """Validate a note row into (title, content, tags)."""
+    if not row["title"]:
+        raise ValueError("Title cannot be empty.")
+    return row["title"], row["content"], list(dict.fromkeys(row["tags"]))
+
+def note_from_values(values):
+    title, content, tags = values
+    note = Note(title, content)
+    note.tags = dict.fromkeys(tags)
+    return note
+
+def validate_chunk(chunk, validate):
+    """Turn (line, row) pairs into (line, values) pairs, or (line, error message) for bad rows."""
+    validated = []
+    for line, row in chunk:
+        if isinstance(row, Exception):
+            validated.append((line, str(row)))
+            continue
+        try:
+            validated.append((line, validate(row)))
+        except ValueError as e:
+            validated.append((line, str(e)))
+    return validated
+
+def validated_chunks(chunks, validate, workers=1):
+    """
+    Yield validate_chunk results in order. With workers > 1 the chunks are
+    validated in a process pool, at most two chunks per worker in flight.
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield validate_chunk(chunk, validate)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(validate_chunk, chunk, validate))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+# ------------------------------
+# Import / export
+# ------------------------------
+
+def _import(filename, fields, validate, build, insert, workers):
+    result = ImportResult()
+    read = READERS[file_format(filename)]
+    with open(filename, encoding="utf-8", errors="surrogateescape", newline="") as f:
+        for chunk in validated_chunks(chunked(utf8_checked(read(f, fields))), validate, workers):
+            _insert_chunk(chunk, build, insert, result)
+    return result
+
+def _insert_chunk(chunk, build, insert, result):
+    for line, values in chunk:
+        if isinstance(values, str):
+            result.reject(line, values)
+            continue
+        problem = insert(build(values))
+        if problem:
+            result.reject(line, problem)
+        else:
+            result.imported += 1
+
+def import_contacts(filename, book, workers=WORKERS):
+    """Add (or overwrite by name) the contacts in filename. Returns an ImportResult."""
+    def insert(record):
+        # Phones and emails stay unique across contacts: one lookup in the book's index each.
+        name = record.name.value
+        for field in ("phones", "emails"):
+            for value in record.field_values(field):
+                owner = book.find_owner(field, value, name)
+                if owner:
+                    return f"{field[:-1].title()} '{value}' is already used by '{owner}'."
+        book.add_record(record)
+
+    return _import(filename, CONTACT_FIELDS, validate_contact_row, contact_from_values, insert, workers)
+
+def import_notes(filename, notes, workers=WORKERS):
+    """Add (or overwrite by title) the notes in filename. Returns an ImportResult."""
+    if file_format(filename) == "vcard":
+        raise ValueError("vCard files hold contacts only.")
+    return _import(filename, NOTE_FIELDS, validate_note_row, note_from_values, notes.add_note, workers)
+
+def _export(filename, rows, fields):
+    write = WRITERS[file_format(filename)]
+    count = 0
+
+    def counted():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    with atomic_file(filename) as f:
+        text = io.TextIOWrapper(f, encoding="utf-8", newline="")
+        write(text, counted(), fields)
+        # Flushed into f, which atomic_file then fsyncs and renames.
+        text.detach()
+    return count
+
+def export_contacts(filename, book):
+    """Write every contact, as of the call, to filename. Returns the number written."""
+    return _export(filename, map(contact_row, book.version()), CONTACT_FIELDS)
+
+def export_notes(filename, notes):
+    """Write every note, as of the call, to filename. Returns the number written."""
+    if file_format(filename) == "vcard":
+        raise ValueError("vCard files hold contacts only.")
+    return _export(filename, map(note_row, notes.version()), NOTE_FIELDS)
@@ -0,0 +1,381 @@
+import glob
+import json
+import os
+import pickle
+import queue
+import sys
+import threading
+import time
+import warnings
+from datetime import date
+
+from src.models.contacts import Record
+from src.models.notes import Note
+from src.storage.persistence import DamagedFileWarning, atomic_file
+from src.storage.snapshot import CONTACTS_SNAPSHOT, NOTES_SNAPSHOT, load_contacts, load_notes, write_contacts, write_notes
+
+# Operations are fsynced after this many appends (or by the background thread
+# after SYNC_INTERVAL seconds), and folded into a new snapshot every
+# COMPACT_EVERY operations or, once any are logged, every COMPACT_INTERVAL seconds.
+SYNC_EVERY = 64
+SYNC_INTERVAL = 1.0
+COMPACT_EVERY = 50_000
+COMPACT_INTERVAL = 300.0
+
+# ------------------------------
+# Plain-dict form of records and notes
+# ------------------------------
+
+def record_to_dict(record):
+    return {
+        "name": record.name.value,
+        "phones": record.field_values("phones"),
+        "emails": record.field_values("emails"),
+        "addresses": record.field_values("addresses"),
+        "birthday": record.birthday.value.isoformat() if record.birthday else None,
+    }
+
+def record_from_dict(data):
+    record = Record(data["name"])
+    for phone in data["phones"]:
+        record.add_phone(phone)
+    for email in data["emails"]:
+        record.add_email(email)
+    for address in data["addresses"]:
+        record.add_address(address)
+    if data["birthday"]:
+        record.add_birthday(date.fromisoformat(data["birthday"]))
+    return record
+
+def note_to_dict(note):
+    return {"title": note.title, "content": note.content, "tags": list(note.tags)}
+
+def note_from_dict(data):
+    note = Note(data["title"], data["content"])
+    for tag in data["tags"]:
+        note.add_tag(tag)
+    return note
+
+# ------------------------------
+# Journal
+# ------------------------------
+
+class Journal:
+    """
+    Append-only operation log (JSON lines) next to a snapshot file.
+
+    The journal listens to model change events and appends one line per
+    operation. On open, operations newer than the snapshot's journal_seq are
+    replayed. Compaction takes a version of the model (O(1)), rotates the log
+    into a frozen segment and lets a background thread stream the version into
+    the snapshot file with write(version, f) (atomically: a temp file renamed
+    over it) and drop the segment. It runs from checkpoint() between
+    commands, or from the background thread once the log has waited
+    compact_interval seconds; either way under the model's read lock, so
+    never in the middle of an operation.
+    """
+
+    def __init__(self, snapshot_path, write=pickle.dump, sync_every=SYNC_EVERY, sync_interval=SYNC_INTERVAL, compact_every=COMPACT_EVERY, compact_interval=COMPACT_INTERVAL):
+        self.snapshot_path = snapshot_path
+        self.write = write
+        self.path = f"{snapshot_path}.wal"
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.compact_every = compact_every
+        self.compact_interval = compact_interval
+        self.model = None
+        self.seq = 0
+        self._file = None
+        self._unsynced = 0
+        self._since_compaction = 0
+        self._compaction_due = False
+        self._compacted_at = time.monotonic()
+        self._lock = threading.RLock()
+        self._jobs = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="journal", daemon=True)
+        # The last failure of the background thread, or None.
+        self.error = None
+
+    # --- model specific encoding, see subclasses ---
+
+    def add(self, item):
+        raise NotImplementedError
+
+    def remove(self, item):
+        raise NotImplementedError
+
+    def update(self, item, field, old, new):
+        raise NotImplementedError
+
+    def apply(self, model, op):
+        raise NotImplementedError
+
+    # --- log files ---
+
+    def _segments(self):
+        """Frozen segments (oldest first) followed by the active log."""
+        frozen = glob.glob(glob.escape(self.path) + ".*")
+        frozen = [path for path in frozen if path.rsplit(".", 1)[1].isdigit()]
+        frozen.sort(key=lambda path: int(path.rsplit(".", 1)[1]))
+        return frozen + ([self.path] if os.path.exists(self.path) else [])
+
+    @staticmethod
+    def _read(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-write.
+                    return
+
+    def open(self, model):
+        """Replay the log on top of the loaded snapshot and start journaling model changes."""
+        self.model = model
+        self.seq = model.journal_seq
+        skipped = 0
+        for path in self._segments():
+            for op in self._read(path):
+                if op["seq"] > self.seq:
+                    try:
+                        self.apply(model, op)
+                    except (AttributeError, KeyError, ValueError):
+                        # A change to an item a damaged snapshot lost.
+                        skipped += 1
+                    self.seq = op["seq"]
+        if skipped:
+            warnings.warn(DamagedFileWarning(f"{self.path}: {skipped} logged changes could not be replayed (their items are missing)."))
+        self._file = open(self.path, "a", encoding="utf-8")
+        model.add_listener(self)
+        self._thread.start()
+        return model
+
+    def append(self, op):
+        with self._lock:
+            self.seq += 1
+            op["seq"] = self.seq
+            self._file.write(json.dumps(op, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self._unsynced += 1
+            self._since_compaction += 1
+            if self._unsynced >= self.sync_every:
+                self._sync()
+            if self._since_compaction >= self.compact_every:
+                self._compaction_due = True
+
+    @property
+    def dirty(self):
+        """Operations logged since the last snapshot (replayed on open if lost)."""
+        return self._since_compaction
+
+    def checkpoint(self):
+        """Compact if enough operations were logged."""
+        if self._compaction_due:
+            self.compact()
+
+    def _sync(self):
+        if self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def _version(self):
+        """The model as of the last logged operation."""
+        self.model.journal_seq = self.seq
+        return self.model.version()
+
+    def _rotate(self):
+        """
+        Take a version of the model, move the log into a frozen segment and
+        queue both for the background thread. Does nothing if no operation
+        was logged since the last rotation: checkpoint() and the background
+        thread may both find a compaction due, and only the first rotates.
+        """
+        # The model lock before the journal's, as in a model operation appending.
+        with self.model.lock.read(), self._lock:
+            if not self._since_compaction:
+                self._compaction_due = False
+                return
+            version = self._version()
+            self._sync()
+            self._file.close()
+            # Unique: every rotation follows at least one operation, and each raises seq.
+            frozen = f"{self.path}.{self.seq}"
+            os.replace(self.path, frozen)
+            self._file = open(self.path, "a", encoding="utf-8")
+            self._since_compaction = 0
+            self._compaction_due = False
+            self._compacted_at = time.monotonic()
+            # Queued under the lock, so snapshots are written in the order of their segments.
+            self._jobs.put((version, frozen))
+
+    def compact(self):
+        """Rotate the log and hand a version of the model to the background thread."""
+        self._rotate()
+
+    def _autosave_due(self):
+        if self._compaction_due:
+            return True
+        return self._since_compaction and time.monotonic() - self._compacted_at >= self.compact_interval
+
+    def _write_snapshot(self, version, frozen):
+        self._save(version)
+        os.remove(frozen)
+
+    def _save(self, version):
+        """Write version as the snapshot: into a temp file renamed over it once complete."""
+        with atomic_file(self.snapshot_path) as f:
+            self.write(version, f)
+
+    def _idle(self):
+        """Between jobs: fsync the log, and rotate it if an autosave is due."""
+        with self._lock:
+            self._sync()
+        if self._autosave_due():
+            self._rotate()
+
+    def _guarded(self, work, *args):
+        """Run work on the background thread, reporting a failure instead of ending the thread."""
+        try:
+            work(*args)
+        except Exception as e:
+            # The operations stay in the log (and a frozen segment), replayed on open.
+            self.error = e
+            print(f"Journal {self.path}: {type(e).__name__}: {e}", file=sys.stderr)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                job = self._jobs.get(timeout=self.sync_interval)
+            except queue.Empty:
+                self._guarded(self._idle)
+                continue
+            if job is None:
+                # Woken up by close().
+                break
+            self._guarded(self._write_snapshot, *job)
+
+    def close(self):
+        """Stop the background thread and fold everything into the snapshot."""
+        self.model.remove_listener(self)
+        self._stop.set()
+        self._jobs.put(None)
+        self._thread.join()
+        while not self._jobs.empty():
+            job = self._jobs.get()
+            if job is not None:
+                self._write_snapshot(*job)
+        with self._lock:
+            self._sync()
+            self._file.close()
+            if self._unchanged():
+                # The snapshot already holds everything: rewriting it would
+                # decode a lazily loaded model for nothing.
+                os.remove(self.path)
+                return
+            self._save(self._version())
+            for path in self._segments():
+                os.remove(path)
+
+    def _unchanged(self):
+        """Whether the snapshot file holds every operation: none logged since it, none left to replay."""
+        return (
+            not self._since_compaction
+            and os.path.exists(self.snapshot_path)
+            and self._segments() == [self.path]
+            and not os.path.getsize(self.path)
+        )
+
+
+class ContactsJournal(Journal):
+    """Journal for AddressBook operations."""
+
+    def add(self, record):
+        self.append({"op": "add", "record": record_to_dict(record)})
+
+    def remove(self, record):
+        self.append({"op": "remove", "name": record.name.value})
+
+    def update(self, record, field, old, new):
+        if field == "birthday":
+            old = old.isoformat() if old else None
+            new = new.isoformat() if new else None
+        # A rename is addressed by the old name.
+        name = old if field == "name" else record.name.value
+        self.append({"op": "update", "name": name, "field": field, "old": old, "new": new})
+
+    def apply(self, book, op):
+        if op["op"] == "add":
+            book.add_record(record_from_dict(op["record"]))
+            return
+        if op["op"] == "remove":
+            book.delete(op["name"])
+            return
+
+        record = book.find(op["name"])
+        field, old, new = op["field"], op["old"], op["new"]
+        if field == "name":
+            record.change_name(new)
+        elif field == "birthday":
+            if new is None:
+                record.delete_birthday()
+            else:
+                record.add_birthday(date.fromisoformat(new))
+        else:
+            kind = {"phones": "phone", "emails": "email", "addresses": "address"}[field]
+            if old is None:
+                getattr(record, f"add_{kind}")(new)
+            elif new is None:
+                getattr(record, f"delete_{kind}")(old)
+            else:
+                getattr(record, f"change_{kind}")(old, new)
+
+
+class NotesJournal(Journal):
+    """Journal for Notes operations."""
+
+    def add(self, note):
+        self.append({"op": "add", "note": note_to_dict(note)})
+
+    def remove(self, note):
+        self.append({"op": "remove", "title": note.title})
+
+    def update(self, note, field, old, new):
+        # A rename is addressed by the old title.
+        title = old if field == "title" else note.title
+        self.append({"op": "update", "title": title, "field": field, "old": old, "new": new})
+
+    def apply(self, notes, op):
+        if op["op"] == "add":
+            notes.add_note(note_from_dict(op["note"]))
+            return
+        if op["op"] == "remove":
+            notes.delete_note(op["title"])
+            return
+
+        note = notes.find(op["title"])
+        field, old, new = op["field"], op["old"], op["new"]
+        if field == "title":
+            note.change_title(new)
+        elif field == "content":
+            note.change_content(new)
+        elif old is None:
+            note.add_tag(new)
+        elif new is None:
+            note.delete_tag(old)
+        else:
+            note.edit_tag(old, new)
+
+# ------------------------------
+# Journaled loading
+# ------------------------------
+
+def open_contacts(filename=CONTACTS_SNAPSHOT, **options):
+    """Open the contacts snapshot, replay its journal and keep journaling. Returns (book, journal)."""
+    journal = ContactsJournal(filename, write_contacts, **options)
+    return journal.open(load_contacts(filename)), journal
+
+def open_notes(filename=NOTES_SNAPSHOT, **options):
+    """Open the notes snapshot, replay its journal and keep journaling. Returns (notes, journal)."""
+    journal = NotesJournal(filename, write_notes, **options)
+    return journal.open(load_notes(filename)), journal
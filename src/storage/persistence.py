@@ -1,37 +1,190 @@
 
+import io
+import os
 import pickle
+import warnings
+from contextlib import contextmanager
+from itertools import islice
+
 from src.models.contacts import AddressBook
 from src.models.notes import Notes
+from src.storage.blocks import DEFAULT_CODEC, BlockError, BlockReader, BlockWriter, is_block_file
 
 CONTACTS_FILE = "addressbook.pkl"
 NOTES_FILE = "notes.pkl"
+# Records (or notes) pickled together in one block of a .pkl file: a damaged
+# block loses this many.
+BLOCK_ITEMS = 1000
+
+
+class LoadError(ValueError):
+    """A data file exists but cannot be read: damaged, or compressed with a codec missing here."""
+
+
+class DamagedFileWarning(UserWarning):
+    """Some blocks of a data file were damaged; the rest was loaded."""
 
 # ------------------------------
-# AddressBook persistence
+# Safe unpickling
+#
+# Unpickling can call anything a file names, so .pkl files are read with an
+# unpickler that only finds the model classes and the few helpers their
+# pickles (old ones included) refer to.
 # ------------------------------
 
-def save_contacts(book, filename=CONTACTS_FILE):
-    with open(filename, "wb") as f:
-        pickle.dump(book, f)
+ALLOWED_GLOBALS = {
+    ("src.models.contacts", name) for name in ("AddressBook", "Record", "Field", "KeyedField", "Name", "Phone", "Email", "Birthday", "Address")
+} | {
+    ("src.models.notes", "Notes"),
+    ("src.models.notes", "Note"),
+    ("datetime", "date"),
+    ("datetime", "datetime"),
+    # Protocol 0 and 1 pickles: objects without __reduce__, and bytes.
+    ("copyreg", "_reconstructor"),
+    ("copy_reg", "_reconstructor"),
+    ("builtins", "object"),
+    ("__builtin__", "object"),
+    ("_codecs", "encode"),
+}
 
-def load_contacts(filename=CONTACTS_FILE):
+class ModelUnpickler(pickle.Unpickler):
+    """Unpickler refusing every global outside ALLOWED_GLOBALS."""
+
+    def find_class(self, module, name):
+        if (module, name) not in ALLOWED_GLOBALS:
+            raise pickle.UnpicklingError(f"{module}.{name} is not allowed in a data file.")
+        return super().find_class(module, name)
+
+def safe_load(f):
+    """pickle.load limited to the model classes."""
+    return ModelUnpickler(f).load()
+
+# ------------------------------
+# Atomic file writes
+# ------------------------------
+
+@contextmanager
+def atomic_file(filename):
+    """
+    Binary file to write in place of filename: written to a temp file that
+    is fsynced and renamed over filename once the block ends without error.
+    """
+    tmp = f"{filename}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        os.remove(tmp)
+        raise
+    os.replace(tmp, filename)
+    sync_directory(filename)
+
+def atomic_write(filename, data):
+    """Write bytes to a temp file, fsync it and rename it over filename."""
+    with atomic_file(filename) as f:
+        f.write(data)
+
+def sync_directory(filename):
+    """fsync the directory holding filename, so a rename into it survives a crash."""
+    if os.name != "posix":
+        # Windows cannot open a directory; its renames are journaled by NTFS.
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY)
     try:
-        with open(filename, "rb") as f:
-            return pickle.load(f)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+# ------------------------------
+# Block-compressed pickles
+#
+# .pkl files are block files (see blocks.py): a first block with the
+# model's state but its items, e.g. {"journal_seq": 12}, then blocks of up
+# to BLOCK_ITEMS (key, item) pairs, each pickled on its own. Saving streams
+# the blocks out of a version of the model; loading streams them back, and
+# a damaged block costs only its items. Plain pickles of older versions
+# are still read.
+# ------------------------------
+
+def save_blocks(filename, version, codec=DEFAULT_CODEC):
+    """Write a version of a book or notes as a block-compressed pickle."""
+    with atomic_file(filename) as f:
+        writer = BlockWriter(f, codec)
+        writer.write_block(pickle.dumps({"journal_seq": version.journal_seq}, pickle.HIGHEST_PROTOCOL))
+        items = iter(version.items())
+        while batch := list(islice(items, BLOCK_ITEMS)):
+            writer.write_block(pickle.dumps(batch, pickle.HIGHEST_PROTOCOL))
+        writer.close()
+
+def _load_blocks(f, filename, cls, items_field):
+    reader = BlockReader(f)
+    state = {"journal_seq": 0}
+    items = {}
+    unreadable = 0
+    for block in reader:
+        try:
+            value = safe_load(io.BytesIO(block))
+            if isinstance(value, dict):
+                state.update(value)
+            else:
+                items.update(dict(value))
+        except Exception:
+            # Checked out but does not unpickle into a state or (key, item)
+            # pairs: written broken, or refused by the safe unpickler.
+            unreadable += 1
+    if not reader.complete or unreadable:
+        report = reader.report(filename) if not reader.complete else f"{filename} is damaged: recovered {reader.blocks - unreadable} blocks."
+        if unreadable:
+            report += f" {unreadable} blocks could not be unpickled."
+        warnings.warn(DamagedFileWarning(f"{report} Loaded {len(items)} items; the file is left as it was."))
+    state[items_field] = items
+    # As unpickling the whole model would.
+    model = cls.__new__(cls)
+    model.__setstate__(state)
+    return model
+
+def load(filename, cls, items_field):
+    """
+    Load a model of class cls (its items in the items_field of its state)
+    from a .pkl file, or an empty one if there is no file. Raises LoadError
+    for a file that cannot be read at all.
+    """
+    try:
+        f = open(filename, "rb")
     except FileNotFoundError:
-        return AddressBook()
+        return cls()
+    with f:
+        if is_block_file(f):
+            try:
+                return _load_blocks(f, filename, cls, items_field)
+            except BlockError as e:
+                raise LoadError(f"{filename}: {e}") from e
+        try:
+            return safe_load(f)
+        except Exception as e:
+            # A cut or damaged plain pickle fails in many ways (EOFError,
+            # UnpicklingError, a bad value...), and nothing of it can be kept.
+            raise LoadError(f"{filename} is damaged and cannot be loaded ({e or type(e).__name__}).") from e
+
+# ------------------------------
+# AddressBook persistence
+# ------------------------------
+
+def save_contacts(book, filename=CONTACTS_FILE, codec=DEFAULT_CODEC):
+    # A version, as the book may change meanwhile.
+    save_blocks(filename, book.version(), codec)
+
+def load_contacts(filename=CONTACTS_FILE):
+    return load(filename, AddressBook, "data")
 
 # ------------------------------
 # Notes persistence
 # ------------------------------
 
-def save_notes(notes, filename=NOTES_FILE):
-    with open(filename, "wb") as f:
-        pickle.dump(notes, f)
+def save_notes(notes, filename=NOTES_FILE, codec=DEFAULT_CODEC):
+    save_blocks(filename, notes.version(), codec)
 
 def load_notes(filename=NOTES_FILE):
-    try:
-        with open(filename, "rb") as f:
-            return pickle.load(f)
-    except FileNotFoundError:
-        return Notes()
+    return load(filename, Notes, "notes")
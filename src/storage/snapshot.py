@@ -0,0 +1,780 @@
+import io
+import mmap
+import os
+import struct
+import sys
+import threading
+import warnings
+import zlib
+from bisect import bisect_right
+from collections import Counter
+from datetime import date
+from itertools import islice
+
+from src.models.contacts import AddressBook, Record
+from src.models.notes import Notes, Note
+from src.utils.locking import reading
+from src.storage.blocks import BLOCK, SYNC, frame, read_frame
+from src.storage.persistence import CONTACTS_FILE, NOTES_FILE, DamagedFileWarning, LoadError, atomic_file, load_contacts as load_pickled_contacts, load_notes as load_pickled_notes
+
+CONTACTS_SNAPSHOT = "addressbook.snap"
+NOTES_SNAPSHOT = "notes.snap"
+
+# ------------------------------
+# File layout (all integers little-endian)
+#
+#   header   magic, version, kind, count, journal_seq, key table offset,
+#            string table offset, CRC-32 of the header
+#   strings  u32 count, count u64 string offsets, then the strings
+#   groups   the items in book order, up to GROUP_ITEMS per group, each
+#            prefixed with its u32 length
+#   table    count u64 item offsets, sorted by key (record name / note title)
+#
+# The string table, every group and the key table are framed as blocks (see
+# blocks.py, uncompressed: items are read in place through mmap). Opening a
+# file walks the frame headers and checks the CRCs of the header and the key
+# table only; a group's CRC (and the string table's) is checked the first
+# time one of its items is read, so startup does not grow with the file. A
+# file whose frames are not where the header says is checked whole at open,
+# and read back from the groups that are still whole, without the lazy
+# lookups; a group found damaged later makes the lazy book load the whole
+# groups the same way. Offsets in the header point at the data inside the
+# frames.
+#
+# An item is a few fixed fields, then one u32 slot per string, then the
+# UTF-8 of its strings back to back:
+#   record   u16 phones, emails, addresses counts, u32 birthday ordinal (0
+#            when unset); strings: name, phones, emails, addresses
+#   note     u16 tags count; strings: title, content, tags
+# A slot is the byte length of the string, or, with STRING_REF set, the
+# index of a string in the string table: values repeated across items (a
+# street, a tag) are stored once. All the slots of an item are read in one
+# unpack and its text in one decode. The first string of every item is its
+# key, so a key lookup is a binary search over the table.
+#
+# Version 2 files (items before the string table, no frames nor checksums)
+# and version 1 files (no string table either; each string a u32 length +
+# UTF-8, lists a u16 count + strings, the birthday last) are still read.
+# ------------------------------
+
+MAGIC = b"ABSNAP\x00\x00"
+VERSION = 3
+READABLE_VERSIONS = (1, 2, 3)
+KIND_CONTACTS = 1
+KIND_NOTES = 2
+
+HEADER = struct.Struct("<8sHBxIQQ")
+U16 = struct.Struct("<H")
+U32 = struct.Struct("<I")
+U64 = struct.Struct("<Q")
+RECORD_HEAD = struct.Struct("<HHHI")
+NOTE_HEAD = struct.Struct("<H")
+STRING_REF = 1 << 31
+# A repeated string goes to the table when that saves more than the table
+# entry costs (its u64 offset and u32 length).
+TABLE_ENTRY = U64.size + U32.size
+# Items per checksummed group: damage to a group loses this many.
+GROUP_ITEMS = 1000
+
+
+class SnapshotError(ValueError):
+    """The file is not a snapshot this version can read."""
+
+
+# Raised by decoding an item of a damaged file.
+DECODE_ERRORS = (SnapshotError, ValueError, struct.error)
+
+
+# ------------------------------
+# Encoding
+# ------------------------------
+
+def record_strings(record):
+    yield record.name.value.title()
+    for field in ("phones", "emails", "addresses"):
+        yield from record.field_values(field)
+
+def note_strings(note):
+    yield note.title
+    yield note.content
+    yield from note.tags
+
+def string_table(items, strings):
+    """Strings worth storing once: {text: index}, from the (key, item) pairs and their strings(item)."""
+    counts = Counter(text for _, item in items for text in strings(item))
+    shared = [text for text, count in counts.items() if count > 1 and (count - 1) * len(text) > TABLE_ENTRY]
+    return {text: index for index, text in enumerate(shared)}
+
+def _pack_str(out, text):
+    data = text.encode("utf-8")
+    out += U32.pack(len(data))
+    out += data
+
+_SLOTS = {}
+
+def _slots(count):
+    """Struct of count u32 slots, cached: items mostly have a handful of strings."""
+    slots = _SLOTS.get(count)
+    if slots is None:
+        slots = _SLOTS[count] = struct.Struct(f"<{count}I")
+    return slots
+
+def _pack_item(head, strings, shared):
+    slots = []
+    texts = []
+    for text in strings:
+        index = shared.get(text)
+        if index is None:
+            data = text.encode("utf-8")
+            slots.append(len(data))
+            texts.append(data)
+        else:
+            slots.append(STRING_REF | index)
+    return b"".join((head, _slots(len(slots)).pack(*slots), *texts))
+
+def encode_record(record, shared=None):
+    phones, emails, addresses = (record.field_values(field) for field in ("phones", "emails", "addresses"))
+    head = RECORD_HEAD.pack(len(phones), len(emails), len(addresses), record.birthday.value.toordinal() if record.birthday else 0)
+    return _pack_item(head, [record.name.value.title(), *phones, *emails, *addresses], shared or {})
+
+def encode_note(note, shared=None):
+    return _pack_item(NOTE_HEAD.pack(len(note.tags)), [note.title, note.content, *note.tags], shared or {})
+
+def _write(f, kind, version, encode, strings):
+    """
+    Write version as a snapshot to the seekable binary file f, a frame at a
+    time: the items are read twice (for the string table, then to encode
+    them) and only one group is held at once. The header, which needs the
+    key table offset, is written last over a placeholder.
+    """
+    shared = string_table(version.items(), strings)
+    start = f.tell()
+    offset = HEADER.size + U64.size + U32.size
+    f.write(bytes(offset))
+
+    strings_offset = offset + BLOCK.size
+    texts = bytearray()
+    text_offsets = []
+    texts_offset = strings_offset + U32.size + U64.size * len(shared)
+    for text in shared:
+        text_offsets.append(texts_offset + len(texts))
+        _pack_str(texts, text)
+    offset += f.write(frame(U32.pack(len(shared)) + b"".join(map(U64.pack, text_offsets)) + texts))
+
+    entries = []
+    items = iter(version.items())
+    while True:
+        chunk = list(islice(items, GROUP_ITEMS))
+        if not chunk:
+            break
+        group = bytearray()
+        for key, item in chunk:
+            blob = encode(item, shared)
+            entries.append((key, offset + BLOCK.size + len(group)))
+            group += U32.pack(len(blob))
+            group += blob
+        offset += f.write(frame(bytes(group)))
+
+    entries.sort()
+    end = start + offset + f.write(frame(b"".join(U64.pack(item_offset) for _, item_offset in entries)))
+    header = HEADER.pack(MAGIC, VERSION, kind, len(entries), version.journal_seq, offset + BLOCK.size) + U64.pack(strings_offset)
+    f.seek(start)
+    f.write(header + U32.pack(zlib.crc32(header)))
+    f.seek(end)
+
+def write_contacts(book, f):
+    """Write an address book (or a version of one) to the binary file f as a snapshot."""
+    _write(f, KIND_CONTACTS, book.version(), encode_record, record_strings)
+
+def write_notes(notes, f):
+    """Write notes (or a version of them) to the binary file f as a snapshot."""
+    _write(f, KIND_NOTES, notes.version(), encode_note, note_strings)
+
+def dump_contacts(book):
+    """Encode an address book (or a version of one) as snapshot bytes."""
+    f = io.BytesIO()
+    write_contacts(book, f)
+    return f.getvalue()
+
+def dump_notes(notes):
+    """Encode notes (or a version of them) as snapshot bytes."""
+    f = io.BytesIO()
+    write_notes(notes, f)
+    return f.getvalue()
+
+def save_contacts(book, filename=CONTACTS_SNAPSHOT):
+    with atomic_file(filename) as f:
+        write_contacts(book, f)
+
+def save_notes(notes, filename=NOTES_SNAPSHOT):
+    with atomic_file(filename) as f:
+        write_notes(notes, f)
+
+# ------------------------------
+# Decoding
+# ------------------------------
+
+class Snapshot:
+    """Read-only view of a snapshot file through mmap."""
+
+    def __init__(self, filename, kind):
+        with open(filename, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            raise SnapshotError(f"{filename} is too short to be a snapshot.")
+        magic, version, file_kind, self.count, self.journal_seq, self._table = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version not in READABLE_VERSIONS or file_kind != kind:
+            raise SnapshotError(f"{filename} is not a snapshot of this kind (versions {READABLE_VERSIONS}).")
+        self.filename = filename
+        self.version = version
+        # Fixed fields of an item and how many of them count list strings.
+        self._head, self._lists, self._fixed = (RECORD_HEAD, 3, 1) if kind == KIND_CONTACTS else (NOTE_HEAD, 1, 2)
+        self._items = HEADER.size
+        self._shared_count = 0
+        # What is wrong with the file: found at open by _verify(), or later
+        # as groups are checked. See damaged.
+        self._problems = []
+        # Whether the string table is whole: None until checked (version 3).
+        self._strings_whole = True
+        if version >= 2:
+            self._strings = U64.unpack_from(self._map, HEADER.size)[0]
+            self._items += U64.size
+        if version >= 3:
+            self._items += U32.size
+            if U32.unpack_from(self._map, HEADER.size + U64.size)[0] != zlib.crc32(self._map[:HEADER.size + U64.size]):
+                raise SnapshotError(f"{filename} is damaged: its header does not match its checksum.")
+            if not self._layout():
+                self._verify()
+        elif self._table + self.count * U64.size > len(self._map) or (version == 2 and self._strings + U32.size > len(self._map)):
+            raise SnapshotError(f"{filename} was cut short.")
+        if version >= 2 and self._strings_whole is not False:
+            self._shared_count = U32.unpack_from(self._map, self._strings)[0]
+            self._shared_offsets = self._strings + U32.size
+        # Table strings decoded so far: every item using one gets the same str object.
+        self._shared = {}
+
+    @property
+    def damaged(self):
+        """What is wrong with the file so far, or None."""
+        return "; ".join(self._problems) or None
+
+    def _layout(self):
+        """
+        Find the frames of a version 3 file from their headers alone: the
+        string table, the groups, then the key table ending the file. Checks
+        the key table's CRC, and leaves the others to _check_group() and
+        _check_strings(), the first time an item needs them; opening a large
+        file reads only its header and key table. Returns False if the frames
+        are not where the header says, for _verify() to find what is left.
+        """
+        frames = []
+        position = self._items
+        while position + BLOCK.size <= len(self._map):
+            sync, length, _, _ = BLOCK.unpack_from(self._map, position)
+            if sync != SYNC:
+                return False
+            frames.append((position + BLOCK.size, position + BLOCK.size + length))
+            position = frames[-1][1]
+        if position != len(self._map) or len(frames) < 2:
+            return False
+        (strings, _), *groups, (table, table_end) = frames
+        if strings != self._strings or table != self._table or table_end - table != self.count * U64.size:
+            return False
+        if read_frame(self._map, table - BLOCK.size) is None:
+            return False
+        self._set_groups(groups, checked=None)
+        self._strings_whole = None
+        return True
+
+    def _set_groups(self, groups, checked):
+        self._groups = groups
+        self._group_starts = [start for start, _ in groups]
+        # Per group: True (CRC checked), False (damaged) or None (not checked yet).
+        self._group_checked = [checked] * len(groups)
+
+    def _verify(self):
+        """
+        Check the frames of a version 3 file, from the first to the end of the
+        file, skipping damage up to the next sync marker. Finds the groups
+        still whole (_groups) and whether the string table is. Returns None
+        if the whole file is, else what is wrong.
+        """
+        groups = []
+        self._strings_whole = table_whole = False
+        damaged = []
+        in_sync = True
+        position = self._items
+        while position < len(self._map):
+            stored = read_frame(self._map, position)
+            if stored is None:
+                if in_sync:
+                    damaged.append(position)
+                in_sync = False
+                position = self._map.find(SYNC, position + 1)
+                if position < 0:
+                    break
+                continue
+            in_sync = True
+            start = position + BLOCK.size
+            position = start + len(stored)
+            if start == self._strings:
+                self._strings_whole = True
+            elif start == self._table:
+                table_whole = True
+            else:
+                groups.append((start, position))
+        self._set_groups(groups, checked=True)
+        if not self._strings_whole:
+            self._shared_count = 0
+        self._problems = [f"bad data at byte {offset}" for offset in damaged]
+        if not self._problems and not (self._strings_whole and table_whole):
+            self._problems.append("cut short")
+        return self.damaged
+
+    def verify(self):
+        """Check every CRC of the file now rather than as items are read. Returns what is wrong, or None."""
+        if self.version < 3:
+            # No checksums to check.
+            return None
+        return self._verify()
+
+    def _check_group(self, index):
+        """Check the CRC of group index the first time it is read. Raises SnapshotError if it is damaged."""
+        checked = self._group_checked[index]
+        if checked is None:
+            start = self._group_starts[index]
+            checked = self._group_checked[index] = read_frame(self._map, start - BLOCK.size) is not None
+            if not checked:
+                self._problems.append(f"bad data at byte {start - BLOCK.size}")
+        if not checked:
+            raise SnapshotError(f"{self.filename} is damaged: bad data at byte {self._group_starts[index] - BLOCK.size}.")
+
+    def _check(self, offset):
+        """Check the group holding the item at offset (version 3 only)."""
+        index = bisect_right(self._group_starts, offset) - 1
+        if index < 0 or offset >= self._groups[index][1]:
+            raise SnapshotError(f"{self.filename} has no item at byte {offset}.")
+        if self._group_checked[index] is not True:
+            self._check_group(index)
+
+    def _check_strings(self):
+        if self._strings_whole is None:
+            self._strings_whole = read_frame(self._map, self._strings - BLOCK.size) is not None
+            if not self._strings_whole:
+                self._problems.append(f"bad data at byte {self._strings - BLOCK.size}")
+                self._shared_count = 0
+
+    def close(self):
+        self._map.close()
+
+    def _shared_str(self, index):
+        text = self._shared.get(index)
+        if text is None:
+            if self._strings_whole is None:
+                self._check_strings()
+            if index >= self._shared_count:
+                raise SnapshotError(f"String {index} is not in the table.")
+            offset = U64.unpack_from(self._map, self._shared_offsets + index * U64.size)[0]
+            text = self._shared[index] = self._str(offset)[0]
+        return text
+
+    def _str(self, offset):
+        length = U32.unpack_from(self._map, offset)[0]
+        offset += U32.size
+        if length & STRING_REF:
+            return self._shared_str(length & ~STRING_REF), offset
+        return self._map[offset:offset + length].decode("utf-8"), offset + length
+
+    def _list(self, offset):
+        count = U16.unpack_from(self._map, offset)[0]
+        offset += U16.size
+        items = []
+        for _ in range(count):
+            item, offset = self._str(offset)
+            items.append(item)
+        return items, offset
+
+    def _item(self, offset):
+        """(fixed fields, strings) of the version 2 or 3 item at offset."""
+        if self.version >= 3:
+            self._check(offset)
+        end = offset + U32.size + U32.unpack_from(self._map, offset)[0]
+        offset += U32.size
+        head = self._head.unpack_from(self._map, offset)
+        offset += self._head.size
+        count = self._fixed + sum(head[:self._lists])
+        slots = _slots(count).unpack_from(self._map, offset)
+        data = self._map[offset + U32.size * count:end]
+        text = data.decode("utf-8")
+        # Pure ASCII (the usual case): character positions are byte positions.
+        ascii = len(text) == len(data)
+        strings = []
+        position = 0
+        for slot in slots:
+            if slot & STRING_REF:
+                strings.append(self._shared_str(slot & ~STRING_REF))
+                continue
+            start, position = position, position + slot
+            strings.append(text[start:position] if ascii else data[start:position].decode("utf-8"))
+        return head, strings
+
+    def key_at(self, offset):
+        if self.version == 1:
+            return self._str(offset + U32.size)[0]
+        if self.version >= 3:
+            self._check(offset)
+        offset += U32.size
+        head = self._head.unpack_from(self._map, offset)
+        offset += self._head.size
+        count = self._fixed + sum(head[:self._lists])
+        slot = U32.unpack_from(self._map, offset)[0]
+        if slot & STRING_REF:
+            return self._shared_str(slot & ~STRING_REF)
+        offset += U32.size * count
+        return self._map[offset:offset + slot].decode("utf-8")
+
+    def offsets(self):
+        """Item offsets in book order (of a damaged file: those in whole groups, see damaged)."""
+        if self.version < 3:
+            offset = self._items
+            for _ in range(self.count):
+                yield offset
+                offset += U32.size + U32.unpack_from(self._map, offset)[0]
+            return
+        for index, (offset, end) in enumerate(self._groups):
+            try:
+                self._check_group(index)
+            except SnapshotError:
+                continue
+            while offset < end:
+                yield offset
+                offset += U32.size + U32.unpack_from(self._map, offset)[0]
+
+    def lookup(self, key):
+        """Offset of the item with the given key, or None (binary search over the table)."""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            offset = U64.unpack_from(self._map, self._table + middle * U64.size)[0]
+            found = self.key_at(offset)
+            if found == key:
+                return offset
+            if found < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def record_at(self, offset):
+        if self.version == 1:
+            return self._record_at_v1(offset)
+        (phones, emails, addresses, ordinal), strings = self._item(offset)
+        emails += 1 + phones
+        addresses += emails
+        # Values in a snapshot were validated when they were saved.
+        return Record.from_values(strings[0], strings[1:1 + phones], strings[1 + phones:emails], strings[emails:addresses], date.fromordinal(ordinal) if ordinal else None)
+
+    def note_at(self, offset):
+        if self.version == 1:
+            return self._note_at_v1(offset)
+        _, strings = self._item(offset)
+        note = Note(strings[0], strings[1])
+        note.tags = dict.fromkeys(strings[2:])
+        return note
+
+    def _record_at_v1(self, offset):
+        name, offset = self._str(offset + U32.size)
+        phones, offset = self._list(offset)
+        emails, offset = self._list(offset)
+        addresses, offset = self._list(offset)
+        ordinal = U32.unpack_from(self._map, offset)[0]
+        return Record.from_values(name, phones, emails, addresses, date.fromordinal(ordinal) if ordinal else None)
+
+    def _note_at_v1(self, offset):
+        title, offset = self._str(offset + U32.size)
+        content, offset = self._str(offset)
+        tags, offset = self._list(offset)
+        note = Note(title, content)
+        note.tags = dict.fromkeys(tags)
+        return note
+
+
+def _loads_all(base, name):
+    """Wrap base.name so it first decodes the whole snapshot (it needs every item or the indexes)."""
+    def method(self, *args, **kwargs):
+        if self._snapshot is not None:
+            self._materialize()
+        return getattr(base, name)(self, *args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = getattr(base, name).__doc__
+    return method
+
+
+class LazyAddressBook(AddressBook):
+    """
+    AddressBook backed by a snapshot: find() decodes single records on demand.
+    Anything that needs the whole book (data, indexes, changes) decodes
+    every record once and the book becomes a regular AddressBook.
+    """
+
+    def __init__(self, snapshot):
+        self._snapshot = None
+        super().__init__()
+        self._snapshot = snapshot
+        self._decoded = {}
+        # Held while reading the snapshot: readers share the book lock, and
+        # one of them may be decoding everything while another looks a record up.
+        self._snapshot_lock = threading.Lock()
+        self.journal_seq = snapshot.journal_seq
+
+    @property
+    def data(self):
+        if self._snapshot is not None:
+            self._materialize()
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+    def _materialize(self):
+        with self._snapshot_lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                # Done by another thread meanwhile.
+                return
+            for offset in snapshot.offsets():
+                try:
+                    key = snapshot.key_at(offset)
+                    record = self._decoded.pop(key, None) or snapshot.record_at(offset)
+                except DECODE_ERRORS:
+                    # An item using a string of a damaged string table.
+                    continue
+                self._data[key] = record
+                self._bind(record, notify=False)
+            # Cleared last: a thread seeing no snapshot sees every record.
+            self._snapshot = None
+            snapshot.close()
+        if snapshot.damaged:
+            _warn_damaged(snapshot, len(self._data), "contacts")
+
+    def __len__(self):
+        snapshot = self._snapshot
+        return snapshot.count if snapshot is not None else len(self._data)
+
+    @reading
+    def find(self, name):
+        """Find record by name."""
+        if self._snapshot is None:
+            return super().find(name)
+        key = name.title()
+        with self._snapshot_lock:
+            if self._snapshot is None:
+                return super().find(name)
+            record = self._decoded.get(key)
+            if record is not None:
+                return record
+            try:
+                offset = self._snapshot.lookup(key)
+                if offset is None:
+                    return None
+                record = self._decoded[key] = self._snapshot.record_at(offset)
+            except DECODE_ERRORS:
+                # Damage found on the way: load what is still whole instead.
+                record = None
+            else:
+                record._book = self
+                return record
+        self._materialize()
+        return super().find(name)
+
+    # A changed record already carries the change when it is decoded with the
+    # rest, so its indexes pick up the current values and the update is a no-op.
+    _field_changed = _loads_all(AddressBook, "_field_changed")
+    search = _loads_all(AddressBook, "search")
+    find_owner = _loads_all(AddressBook, "find_owner")
+    fuzzy_search = _loads_all(AddressBook, "fuzzy_search")
+    complete_names = _loads_all(AddressBook, "complete_names")
+    ordered = _loads_all(AddressBook, "ordered")
+    version = _loads_all(AddressBook, "version")
+    upcoming_birthdays = _loads_all(AddressBook, "upcoming_birthdays")
+
+    def __getstate__(self):
+        return {"data": self.data, "journal_seq": self.journal_seq}
+
+    def __reduce__(self):
+        # Pickle as a plain AddressBook.
+        return (AddressBook, (), self.__getstate__())
+
+
+class LazyNotes(Notes):
+    """Notes backed by a snapshot, decoded on first access like LazyAddressBook."""
+
+    def __init__(self, snapshot):
+        self._snapshot = None
+        super().__init__()
+        self._snapshot = snapshot
+        self._decoded = {}
+        self._snapshot_lock = threading.Lock()
+        self.journal_seq = snapshot.journal_seq
+
+    @property
+    def notes(self):
+        if self._snapshot is not None:
+            self._materialize()
+        return self._notes_by_title
+
+    @notes.setter
+    def notes(self, value):
+        self._notes_by_title = value
+
+    def _materialize(self):
+        with self._snapshot_lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                return
+            for offset in snapshot.offsets():
+                try:
+                    key = snapshot.key_at(offset)
+                    note = self._decoded.pop(key, None) or snapshot.note_at(offset)
+                except DECODE_ERRORS:
+                    continue
+                self._notes_by_title[key] = note
+                self._bind(note, notify=False)
+            self._snapshot = None
+            snapshot.close()
+        if snapshot.damaged:
+            _warn_damaged(snapshot, len(self._notes_by_title), "notes")
+
+    @reading
+    def find(self, title):
+        """Find a note by its title."""
+        if self._snapshot is None:
+            return super().find(title)
+        with self._snapshot_lock:
+            if self._snapshot is None:
+                return super().find(title)
+            note = self._decoded.get(title)
+            if note is not None:
+                return note
+            try:
+                offset = self._snapshot.lookup(title)
+                if offset is None:
+                    return None
+                note = self._decoded[title] = self._snapshot.note_at(offset)
+            except DECODE_ERRORS:
+                note = None
+            else:
+                note._notes = self
+                return note
+        self._materialize()
+        return super().find(title)
+
+    _note_changed = _loads_all(Notes, "_note_changed")
+    find_note = _loads_all(Notes, "find_note")
+    search = _loads_all(Notes, "search")
+    find_by_tag = _loads_all(Notes, "find_by_tag")
+    find_by_tags = _loads_all(Notes, "find_by_tags")
+    tag_counts = _loads_all(Notes, "tag_counts")
+    complete_titles = _loads_all(Notes, "complete_titles")
+    complete_tags = _loads_all(Notes, "complete_tags")
+    ordered = _loads_all(Notes, "ordered")
+    version = _loads_all(Notes, "version")
+
+    def __getstate__(self):
+        return {"notes": self.notes, "journal_seq": self.journal_seq}
+
+    def __reduce__(self):
+        return (Notes, (), self.__getstate__())
+
+# ------------------------------
+# Loading
+# ------------------------------
+
+def _open(filename, kind):
+    try:
+        return Snapshot(filename, kind)
+    except (SnapshotError, struct.error) as e:
+        raise LoadError(str(e)) from e
+
+def _warn_damaged(snapshot, recovered, what):
+    warnings.warn(DamagedFileWarning(f"{snapshot.filename} is damaged ({snapshot.damaged}): recovered {recovered} of {snapshot.count} {what}. The file is left as it was until the next save."))
+
+def _recovered(snapshot, model, decode, insert, what):
+    """model filled with the items of a damaged snapshot that are still whole."""
+    model.journal_seq = snapshot.journal_seq
+    recovered = 0
+    for offset in snapshot.offsets():
+        try:
+            insert(decode(offset))
+        except DECODE_ERRORS:
+            # An item using a string of a damaged string table.
+            continue
+        recovered += 1
+    snapshot.close()
+    _warn_damaged(snapshot, recovered, what)
+    return model
+
+def load_contacts(filename=CONTACTS_SNAPSHOT, fallback=CONTACTS_FILE):
+    """Open a contacts snapshot lazily; without one, load the pickle file instead. Raises LoadError for an unreadable file."""
+    if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+        return load_pickled_contacts(fallback)
+    snapshot = _open(filename, KIND_CONTACTS)
+    if snapshot.damaged:
+        book = AddressBook()
+        return _recovered(snapshot, book, snapshot.record_at, book.add_record, "contacts")
+    return LazyAddressBook(snapshot)
+
+def load_notes(filename=NOTES_SNAPSHOT, fallback=NOTES_FILE):
+    """Open a notes snapshot lazily; without one, load the pickle file instead. Raises LoadError for an unreadable file."""
+    if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+        return load_pickled_notes(fallback)
+    snapshot = _open(filename, KIND_NOTES)
+    if snapshot.damaged:
+        notes = Notes()
+        return _recovered(snapshot, notes, snapshot.note_at, notes.add_note, "notes")
+    return LazyNotes(snapshot)
+
+def convert(contacts_file=CONTACTS_FILE, notes_file=NOTES_FILE, contacts_snapshot=CONTACTS_SNAPSHOT, notes_snapshot=NOTES_SNAPSHOT):
+    """Write the pickled address book and notes as snapshots. Returns (contacts, notes) counts."""
+    book, notes = load_pickled_contacts(contacts_file), load_pickled_notes(notes_file)
+    save_contacts(book, contacts_snapshot)
+    save_notes(notes, notes_snapshot)
+    return len(book), len(notes.notes)
+
+def check(filename):
+    """Check every CRC of a snapshot of either kind. Returns (items, what is wrong or None). Raises LoadError for an unreadable file."""
+    with open(filename, "rb") as f:
+        header = f.read(HEADER.size)
+    kind = HEADER.unpack(header)[2] if len(header) == HEADER.size else KIND_CONTACTS
+    snapshot = _open(filename, kind)
+    try:
+        return snapshot.count, snapshot.verify()
+    finally:
+        snapshot.close()
+
+def main(argv):
+    if argv[:1] == ["check"]:
+        status = 0
+        for filename in argv[1:]:
+            try:
+                count, damaged = check(filename)
+            except (OSError, LoadError) as e:
+                print(f"{filename}: {e}")
+                status = 1
+                continue
+            if damaged:
+                print(f"{filename}: {damaged}.")
+                status = 1
+            else:
+                print(f"{filename}: {count} items, ok.")
+        return status
+    contacts_count, notes_count = convert(*argv[:4])
+    print(f"Converted {contacts_count} contacts and {notes_count} notes.")
+    return 0
+
+
+if __name__ == "__main__":
+    # python -m src.storage.snapshot [addressbook.pkl notes.pkl addressbook.snap notes.snap] : convert .pkl files
+    # python -m src.storage.snapshot check FILE... : check every checksum of snapshot files
+    sys.exit(main(sys.argv[1:]))
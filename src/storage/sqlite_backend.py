@@ -0,0 +1,765 @@
+import heapq
+import sqlite3
+import sys
+import threading
+import weakref
+from collections.abc import Mapping
+from datetime import date, timedelta
+from itertools import chain
+from typing import Dict, Iterator, List, Optional
+
+from src.models.contacts import FUZZY_LIMIT, BookVersion, Record, Phone, Email, Address
+from src.models.indexes import BirthdayIndex, FuzzyIndex, tokenize
+from src.models.notes import Note, NotesVersion
+from src.models.versions import PersistentMap
+from src.utils.locking import RWLock, reading, writing
+from src.storage.journal import open_contacts, open_notes
+from src.storage.snapshot import CONTACTS_SNAPSHOT, NOTES_SNAPSHOT
+from src.utils.validators import format_date, phone_key, email_key
+
+DATABASE_FILE = "assistant.db"
+
+# Records are read and written in chunks of this size.
+CHUNK_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contacts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    name_lower TEXT NOT NULL,
+    birthday TEXT,          -- ISO date
+    birthday_text TEXT,     -- DD.MM.YYYY, as searched by "find birthday"
+    birthday_md TEXT,       -- MM-DD, for calendar range queries
+    position INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS contacts_position ON contacts(position);
+CREATE INDEX IF NOT EXISTS contacts_birthday_md ON contacts(birthday_md);
+CREATE INDEX IF NOT EXISTS contacts_name_lower ON contacts(name_lower);
+
+CREATE TABLE IF NOT EXISTS phones (
+    contact_id INTEGER NOT NULL REFERENCES contacts(id) ON DELETE CASCADE,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS phones_contact ON phones(contact_id);
+CREATE INDEX IF NOT EXISTS phones_value ON phones(value);
+
+CREATE TABLE IF NOT EXISTS emails (
+    contact_id INTEGER NOT NULL REFERENCES contacts(id) ON DELETE CASCADE,
+    value TEXT NOT NULL,
+    value_lower TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS emails_contact ON emails(contact_id);
+CREATE INDEX IF NOT EXISTS emails_value_lower ON emails(value_lower);
+
+CREATE TABLE IF NOT EXISTS addresses (
+    contact_id INTEGER NOT NULL REFERENCES contacts(id) ON DELETE CASCADE,
+    value TEXT NOT NULL,
+    value_lower TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS addresses_contact ON addresses(contact_id);
+
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL UNIQUE,
+    title_lower TEXT NOT NULL,
+    content TEXT NOT NULL,
+    content_lower TEXT NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS notes_position ON notes(position);
+CREATE INDEX IF NOT EXISTS notes_title_lower ON notes(title_lower);
+
+CREATE TABLE IF NOT EXISTS note_tags (
+    note_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE,
+    tag TEXT NOT NULL,
+    tag_lower TEXT NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS note_tags_note ON note_tags(note_id);
+CREATE INDEX IF NOT EXISTS note_tags_tag ON note_tags(tag);
+CREATE INDEX IF NOT EXISTS note_tags_tag_lower ON note_tags(tag_lower);
+
+-- Word search (find-note all / any / phrase, --sort rank): titles and contents.
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(title, content);
+
+-- Substring search (find, find-note): trigrams of the lowercase values, the
+-- values of a list field one per line. Kept up to date with the tables above.
+CREATE VIRTUAL TABLE IF NOT EXISTS contacts_trigrams USING fts5(name, phones, emails, addresses, birthday, tokenize = 'trigram');
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_trigrams USING fts5(title, content, tags, tokenize = 'trigram');
+"""
+# Stored in PRAGMA user_version; databases written before a version are
+# brought up to it on first connect. Version 1 added the trigram tables,
+# version 2 dropped the tags from notes_fts.
+SCHEMA_VERSION = 2
+
+# Trigram rows of contacts / notes, built from their tables; append "WHERE id = ?" for one.
+CONTACT_TRIGRAMS = """
+INSERT INTO contacts_trigrams (rowid, name, phones, emails, addresses, birthday)
+SELECT id, name_lower,
+    (SELECT group_concat(value, char(10)) FROM phones WHERE contact_id = contacts.id),
+    (SELECT group_concat(value_lower, char(10)) FROM emails WHERE contact_id = contacts.id),
+    (SELECT group_concat(value_lower, char(10)) FROM addresses WHERE contact_id = contacts.id),
+    birthday_text
+FROM contacts
+"""
+NOTE_TRIGRAMS = """
+INSERT INTO notes_trigrams (rowid, title, content, tags)
+SELECT id, title_lower, content_lower, (SELECT group_concat(tag_lower, char(10)) FROM note_tags WHERE note_id = notes.id)
+FROM notes
+"""
+# Shortest query the trigram tables can answer; shorter ones scan the table.
+TRIGRAM = 3
+
+# Multi-valued contact fields and their tables.
+CONTACT_TABLES = {"phones": ("phones", Phone), "emails": ("emails", Email), "addresses": ("addresses", Address)}
+
+
+def connect(path=DATABASE_FILE):
+    """Open a connection to the database, creating the schema if needed."""
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA foreign_keys = ON")
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.executescript(SCHEMA)
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    if version < SCHEMA_VERSION:
+        with connection:
+            if version < 1:
+                for table, fill in (("contacts_trigrams", CONTACT_TRIGRAMS), ("notes_trigrams", NOTE_TRIGRAMS)):
+                    connection.execute(f"DELETE FROM {table}")
+                    connection.execute(fill)
+            if version < 2:
+                connection.execute("DROP TABLE notes_fts")
+                connection.execute("CREATE VIRTUAL TABLE notes_fts USING fts5(title, content)")
+                connection.execute("INSERT INTO notes_fts (rowid, title, content) SELECT id, title, content FROM notes")
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return connection
+
+
+class Database:
+    """
+    A database file with a connection per thread. A connection is never
+    shared: a reader cannot see, or run its queries inside, a writer's
+    transaction that is not committed yet. In WAL mode readers go on while
+    the writer writes.
+    """
+
+    def __init__(self, path=DATABASE_FILE):
+        self.path = path
+        self._local = threading.local()
+        # The first connection creates (or upgrades) the schema, before any thread shares it.
+        self.connection()
+
+    def connection(self):
+        """This thread's connection, opened on its first use."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = connect(self.path)
+        return connection
+
+
+def _substring(column, text):
+    """FTS5 query for the rows whose column contains text: a phrase of its trigrams."""
+    return f'{column} : "{text.replace(chr(34), chr(34) * 2)}"'
+
+
+def _complete(db, table, column, prefix, limit):
+    """Distinct values of column starting with prefix (case insensitive): a range scan of its _lower index."""
+    prefix = prefix.lower()
+    query = (
+        f"SELECT DISTINCT {column} FROM {table} WHERE {column}_lower >= ? AND {column}_lower < ? "
+        f"ORDER BY {column}_lower, {column} LIMIT ?"
+    )
+    return [value for (value,) in db.execute(query, (prefix, prefix + "\U0010ffff", -1 if limit is None else limit))]
+
+
+def _lower_column(field, value):
+    """
+    Extra lowercase column stored next to a value (SQLite's lower() is ASCII only).
+    For emails it holds the canonical key, which is what duplicates are looked up by.
+    """
+    if field == "phones":
+        return ()
+    return (email_key(value),) if field == "emails" else (value.lower(),)
+
+
+# ------------------------------
+# Contacts
+# ------------------------------
+
+class _RecordsView(Mapping):
+    """Read-only name -> Record mapping over the contacts table (book.data)."""
+
+    def __init__(self, book):
+        self._book = book
+
+    def __getitem__(self, name):
+        record = self._book.find(name)
+        if record is None:
+            raise KeyError(name)
+        return record
+
+    def __contains__(self, name):
+        return self._book._contact_id(name) is not None
+
+    def __iter__(self):
+        for (name,) in self._book.db.execute("SELECT name FROM contacts ORDER BY position"):
+            yield name
+
+    def __len__(self):
+        return self._book.db.execute("SELECT COUNT(*) FROM contacts").fetchone()[0]
+
+    def values(self):
+        return self._book._iter_records("ORDER BY position")
+
+
+class SqliteAddressBook:
+    """AddressBook stored in SQLite; records are loaded on demand and written through on change."""
+
+    def __init__(self, database):
+        self.database = database
+        self.data = _RecordsView(self)
+        # Materialized records, so every lookup of a contact returns the same object.
+        self._records = weakref.WeakValueDictionary()
+        # Fuzzy name index over contact names, built on the first fuzzy search.
+        self._fuzzy = None
+        # Lookups share it; changes (to the book or its records) take it alone.
+        self.lock = RWLock()
+        # Guards the caches above, filled by lookups running side by side.
+        self._cache_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def db(self):
+        """The calling thread's connection."""
+        return self.database.connection()
+
+    # --- loading ---
+
+    def _contact_id(self, name):
+        row = self.db.execute("SELECT id FROM contacts WHERE name = ?", (name.title(),)).fetchone()
+        return row[0] if row else None
+
+    def _build(self, name, birthday, values):
+        with self._cache_lock:
+            record = self._records.get(name)
+            if record is not None:
+                return record
+            # Stored values were validated when they were written.
+            record = Record.from_values(
+                name,
+                values.get("phones", ()),
+                values.get("emails", ()),
+                values.get("addresses", ()),
+                date.fromisoformat(birthday) if birthday else None,
+            )
+            record._book = self
+            self._records[name] = record
+            return record
+
+    def _iter_records(self, where="", params=()):
+        """Yield records for a contacts query, loading their fields chunk by chunk."""
+        cursor = self.db.execute(f"SELECT id, name, birthday FROM contacts {where}", params)
+        while True:
+            rows = cursor.fetchmany(CHUNK_SIZE)
+            if not rows:
+                return
+            ids = [row[0] for row in rows]
+            marks = ",".join("?" * len(ids))
+            values: Dict[int, Dict[str, List[str]]] = {}
+            for field, (table, _) in CONTACT_TABLES.items():
+                query = f"SELECT contact_id, value FROM {table} WHERE contact_id IN ({marks}) ORDER BY rowid"
+                for contact_id, value in self.db.execute(query, ids):
+                    values.setdefault(contact_id, {}).setdefault(field, []).append(value)
+            for contact_id, name, birthday in rows:
+                yield self._build(name, birthday, values.get(contact_id, {}))
+
+    # --- AddressBook API ---
+
+    @writing
+    def add_record(self, record):
+        """Add a new record to the address book."""
+        name = record.name.value.title()
+        self.delete(name)
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO contacts (name, name_lower, position) VALUES (?, ?, (SELECT COALESCE(MAX(position), 0) + 1 FROM contacts))",
+                (name, name.lower()),
+            )
+            contact_id = cursor.lastrowid
+            for field, (table, _) in CONTACT_TABLES.items():
+                for value in record.field_values(field):
+                    self._insert_value(table, field, contact_id, value)
+            if record.birthday:
+                self._set_birthday(contact_id, record.birthday.value)
+            self._index(contact_id)
+        record._book = self
+        self._records[name] = record
+        if self._fuzzy is not None:
+            self._fuzzy.link(name, name)
+
+    @reading
+    def find(self, name):
+        """Find record by name."""
+        name = name.title()
+        record = self._records.get(name)
+        if record is not None:
+            return record
+        return next(self._iter_records("WHERE name = ?", (name,)), None)
+
+    @writing
+    def delete(self, name):
+        """Delete record by name."""
+        name = name.title()
+        with self.db:
+            self.db.execute("DELETE FROM contacts_trigrams WHERE rowid IN (SELECT id FROM contacts WHERE name = ?)", (name,))
+            deleted = self.db.execute("DELETE FROM contacts WHERE name = ?", (name,)).rowcount
+        record = self._records.pop(name, None)
+        if record is not None:
+            record._book = None
+        if deleted and self._fuzzy is not None:
+            self._fuzzy.unlink(name, name)
+        return bool(deleted)
+
+    @reading
+    def find_owner(self, field, value, exclude=None):
+        """Find the name of a record holding value in field ("phones" or "emails")."""
+        if field == "phones":
+            # Phones are stored as entered: look up both spellings of the canonical key.
+            key = phone_key(value)
+            query = "SELECT c.name FROM phones p JOIN contacts c ON c.id = p.contact_id WHERE p.value IN (?, ?) AND c.name != ? ORDER BY c.position LIMIT 1"
+            params = (key, key[1:])
+        else:
+            query = "SELECT c.name FROM emails e JOIN contacts c ON c.id = e.contact_id WHERE e.value_lower = ? AND c.name != ? ORDER BY c.position LIMIT 1"
+            params = (email_key(value),)
+        row = self.db.execute(query, (*params, exclude.title() if exclude else "")).fetchone()
+        return row[0] if row else None
+
+    @reading
+    def search(self, field, query):
+        """Find records whose field contains query, in book order."""
+        if len(query) >= TRIGRAM:
+            where = "WHERE id IN (SELECT rowid FROM contacts_trigrams WHERE contacts_trigrams MATCH ?)"
+            return list(self._iter_records(f"{where} ORDER BY position", (_substring(field, query.lower()),)))
+        if field == "name":
+            where, param = "WHERE instr(name_lower, ?)", query.lower()
+        elif field == "birthday":
+            where, param = "WHERE instr(birthday_text, ?)", query
+        else:
+            table = CONTACT_TABLES[field][0]
+            column = "value" if field == "phones" else "value_lower"
+            param = query if field == "phones" else query.lower()
+            where = f"WHERE id IN (SELECT contact_id FROM {table} WHERE instr({column}, ?))"
+        return list(self._iter_records(f"{where} ORDER BY position", (param,)))
+
+    @reading
+    def complete_names(self, prefix, limit=None):
+        """Contact names starting with prefix (case insensitive), sorted."""
+        return _complete(self.db, "contacts", "name", prefix, limit)
+
+    @reading
+    def fuzzy_search(self, query, limit=FUZZY_LIMIT):
+        """Records whose name matches every word of query up to a typo or two, closest first."""
+        with self._cache_lock:
+            if self._fuzzy is None:
+                fuzzy = FuzzyIndex()
+                for (name,) in self.db.execute("SELECT name FROM contacts"):
+                    fuzzy.link(name, name)
+                self._fuzzy = fuzzy
+        matches = self._fuzzy.matches(query)
+        names = heapq.nsmallest(limit, matches, key=lambda name: (matches[name], name))
+        return [self.find(name) for name in names]
+
+    @reading
+    def ordered(self, order=None, offset=0):
+        """
+        Iterate records from position offset in the given order: None (book
+        order), "name" or "birthday" (by month and day; no birthday last).
+        Each order is an indexed column, so a page is read without sorting the table.
+        """
+        if order is None:
+            return self._iter_records("ORDER BY position LIMIT -1 OFFSET ?", (offset,))
+        if order == "name":
+            return self._iter_records("ORDER BY name_lower, name LIMIT -1 OFFSET ?", (offset,))
+        if order != "birthday":
+            raise ValueError(f"Unknown order: '{order}'. Use name or birthday.")
+        dated = self.db.execute("SELECT COUNT(*) FROM contacts WHERE birthday_md IS NOT NULL").fetchone()[0]
+        return chain(
+            self._iter_records("WHERE birthday_md IS NOT NULL ORDER BY birthday_md, position LIMIT -1 OFFSET ?", (offset,)),
+            self._iter_records("WHERE birthday_md IS NULL ORDER BY position LIMIT -1 OFFSET ?", (max(offset - dated, 0),)),
+        )
+
+    @reading
+    def version(self):
+        """
+        The book as it is now, unaffected by later changes (see BookVersion).
+        Unlike the in-memory book, which keeps one up to date, this reads and
+        copies every contact: O(n).
+        """
+        return BookVersion(PersistentMap.from_values(record.copy() for record in self._iter_records("ORDER BY position")))
+
+    @reading
+    def upcoming_birthdays(self, start, days):
+        """Return (celebration date, record) pairs for the next days after start, sorted by date."""
+        end = start + timedelta(days=days)
+        found = []
+        for year in range(start.year, end.year + 1):
+            first = start if year == start.year else date(year, 1, 1)
+            last = end if year == end.year else date(year, 12, 31)
+            low, high = first.strftime("%m-%d"), last.strftime("%m-%d")
+            if high == "02-28":
+                # 29 February birthdays are celebrated on 28 February in non-leap years.
+                high = "02-29"
+            for record in self._iter_records("WHERE birthday_md BETWEEN ? AND ? ORDER BY birthday_md, position", (low, high)):
+                value = record.birthday.value
+                when = BirthdayIndex.occurrence((value.month, value.day), year)
+                if first <= when <= last:
+                    found.append((when, record))
+        return found
+
+    # --- write-through of record changes ---
+
+    def _index(self, contact_id):
+        """Rebuild the trigram row of a contact from its tables."""
+        self.db.execute("DELETE FROM contacts_trigrams WHERE rowid = ?", (contact_id,))
+        self.db.execute(f"{CONTACT_TRIGRAMS} WHERE id = ?", (contact_id,))
+
+    def _insert_value(self, table, field, contact_id, value):
+        columns = "contact_id, value" + ("" if field == "phones" else ", value_lower")
+        params = (contact_id, value, *_lower_column(field, value))
+        self.db.execute(f"INSERT INTO {table} ({columns}) VALUES ({','.join('?' * len(params))})", params)
+
+    def _set_birthday(self, contact_id, value):
+        if value is None:
+            params = (None, None, None, contact_id)
+        else:
+            params = (value.isoformat(), format_date(value), value.strftime("%m-%d"), contact_id)
+        self.db.execute("UPDATE contacts SET birthday = ?, birthday_text = ?, birthday_md = ? WHERE id = ?", params)
+
+    @writing
+    def _field_changed(self, record, field, old, new):
+        if field == "name":
+            old_key, new_key = old.title(), new.title()
+            if new_key != old_key:
+                self.delete(new_key)
+            with self.db:
+                self.db.execute(
+                    "UPDATE contacts SET name = ?, name_lower = ?, position = (SELECT MAX(position) + 1 FROM contacts) WHERE name = ?",
+                    (new_key, new_key.lower(), old_key),
+                )
+                self._index(self._contact_id(new_key))
+            self._records.pop(old_key, None)
+            self._records[new_key] = record
+            if self._fuzzy is not None:
+                self._fuzzy.unlink(old_key, old_key)
+                self._fuzzy.link(new_key, new_key)
+            return
+
+        contact_id = self._contact_id(record.name.value)
+        with self.db:
+            if field == "birthday":
+                self._set_birthday(contact_id, new)
+                self._index(contact_id)
+                return
+            table = CONTACT_TABLES[field][0]
+            if old is not None:
+                row = self.db.execute(f"SELECT rowid FROM {table} WHERE contact_id = ? AND value = ? LIMIT 1", (contact_id, old)).fetchone()
+            if old is None:
+                self._insert_value(table, field, contact_id, new)
+            elif new is None:
+                self.db.execute(f"DELETE FROM {table} WHERE rowid = ?", (row[0],))
+            else:
+                params = (new, *_lower_column(field, new), row[0])
+                assignments = "value = ?" + ("" if field == "phones" else ", value_lower = ?")
+                self.db.execute(f"UPDATE {table} SET {assignments} WHERE rowid = ?", params)
+            self._index(contact_id)
+
+
+# ------------------------------
+# Notes
+# ------------------------------
+
+class _NotesView(Mapping):
+    """Read-only title -> Note mapping over the notes table (notes.notes)."""
+
+    def __init__(self, notes):
+        self._notes = notes
+
+    def __getitem__(self, title):
+        note = self._notes.find(title)
+        if note is None:
+            raise KeyError(title)
+        return note
+
+    def __contains__(self, title):
+        return self._notes._note_id(title) is not None
+
+    def __iter__(self):
+        for (title,) in self._notes.db.execute("SELECT title FROM notes ORDER BY position"):
+            yield title
+
+    def __len__(self):
+        return self._notes.db.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+    def values(self):
+        return self._notes._iter_notes("ORDER BY position")
+
+
+class SqliteNotes:
+    """Notes stored in SQLite with an FTS5 index; notes are loaded on demand and written through on change."""
+
+    def __init__(self, database):
+        self.database = database
+        self.notes = _NotesView(self)
+        self._loaded = weakref.WeakValueDictionary()
+        self.lock = RWLock()
+        self._cache_lock = threading.Lock()
+
+    @property
+    def db(self):
+        """The calling thread's connection."""
+        return self.database.connection()
+
+    # --- loading ---
+
+    def _note_id(self, title):
+        row = self.db.execute("SELECT id FROM notes WHERE title = ?", (title,)).fetchone()
+        return row[0] if row else None
+
+    def _iter_notes(self, where="", params=()):
+        """Yield notes for a notes query, loading their tags chunk by chunk."""
+        cursor = self.db.execute(f"SELECT id, title, content FROM notes {where}", params)
+        while True:
+            rows = cursor.fetchmany(CHUNK_SIZE)
+            if not rows:
+                return
+            ids = [row[0] for row in rows]
+            tags: Dict[int, List[str]] = {}
+            query = f"SELECT note_id, tag FROM note_tags WHERE note_id IN ({','.join('?' * len(ids))}) ORDER BY position"
+            for note_id, tag in self.db.execute(query, ids):
+                tags.setdefault(note_id, []).append(tag)
+            for note_id, title, content in rows:
+                with self._cache_lock:
+                    note = self._loaded.get(title)
+                    if note is None:
+                        note = Note(title, content)
+                        note.tags = dict.fromkeys(tags.get(note_id, ()))
+                        note._notes = self
+                        self._loaded[title] = note
+                yield note
+
+    def _reindex(self, note_id, note, words=True):
+        """Rewrite the note's search rows; words=False keeps its notes_fts row (title and content unchanged)."""
+        if words:
+            self.db.execute("DELETE FROM notes_fts WHERE rowid = ?", (note_id,))
+            self.db.execute("INSERT INTO notes_fts (rowid, title, content) VALUES (?, ?, ?)", (note_id, note.title, note.content))
+        self.db.execute("DELETE FROM notes_trigrams WHERE rowid = ?", (note_id,))
+        self.db.execute(f"{NOTE_TRIGRAMS} WHERE id = ?", (note_id,))
+
+    # --- Notes API ---
+
+    @writing
+    def add_note(self, note: Note) -> None:
+        """Add a new note."""
+        self.delete_note(note.title)
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO notes (title, title_lower, content, content_lower, position) VALUES (?, ?, ?, ?, (SELECT COALESCE(MAX(position), 0) + 1 FROM notes))",
+                (note.title, note.title.lower(), note.content, note.content.lower()),
+            )
+            for tag in note.tags:
+                self._insert_tag(cursor.lastrowid, tag)
+            self._reindex(cursor.lastrowid, note)
+        note._notes = self
+        self._loaded[note.title] = note
+
+    @reading
+    def find(self, title: str) -> Optional[Note]:
+        """Find a note by its title."""
+        note = self._loaded.get(title)
+        if note is not None:
+            return note
+        return next(self._iter_notes("WHERE title = ?", (title,)), None)
+
+    @writing
+    def delete_note(self, title: str) -> bool:
+        """Delete a note by title."""
+        note_id = self._note_id(title)
+        if note_id is None:
+            return False
+        with self.db:
+            self.db.execute("DELETE FROM notes_fts WHERE rowid = ?", (note_id,))
+            self.db.execute("DELETE FROM notes_trigrams WHERE rowid = ?", (note_id,))
+            self.db.execute("DELETE FROM notes WHERE id = ?", (note_id,))
+        note = self._loaded.pop(title, None)
+        if note is not None:
+            note._notes = None
+        return True
+
+    @writing
+    def change_note(self, title: str, new_content: str) -> bool:
+        """Change content of an existing note."""
+        note = self.find(title)
+        if note:
+            note.change_content(new_content)
+            return True
+        return False
+
+    def _ranks(self, terms, mode):
+        """rowid -> bm25 rank (lower is better) for an FTS5 query over the terms."""
+        if not terms:
+            return {}
+        quoted = ['"' + term.replace('"', '""') + '"' for term in terms]
+        if mode == "phrase":
+            match = '"' + " ".join(terms).replace('"', '""') + '"'
+        else:
+            match = (" OR " if mode == "any" else " AND ").join(quoted)
+        query = "SELECT rowid, bm25(notes_fts) FROM notes_fts WHERE notes_fts MATCH ?"
+        return dict(self.db.execute(query, (match,)).fetchall())
+
+    @reading
+    def find_note(self, keyword: str, ranked: bool = False) -> List[Note]:
+        """Find notes containing the keyword in all (case insensitive), in insertion order or, ranked, best matches first."""
+        keyword_lower = keyword.lower()
+        if len(keyword_lower) >= TRIGRAM:
+            where = "WHERE id IN (SELECT rowid FROM notes_trigrams WHERE notes_trigrams MATCH ?)"
+            params = (_substring("{title content tags}", keyword_lower),)
+        else:
+            where = (
+                "WHERE instr(title_lower, ?) OR instr(content_lower, ?) "
+                "OR id IN (SELECT note_id FROM note_tags WHERE instr(tag_lower, ?))"
+            )
+            params = (keyword_lower,) * 3
+        if not ranked:
+            return list(self._iter_notes(f"{where} ORDER BY position", params))
+        rows = self.db.execute(f"SELECT id, title FROM notes {where} ORDER BY position", params).fetchall()
+        ranks = self._ranks(tokenize(keyword), "any")
+        rows.sort(key=lambda row: ranks.get(row[0], 0.0))
+        return [self.find(title) for _, title in rows]
+
+    @reading
+    def search(self, query: str, mode: str = "all") -> List[Note]:
+        """Full-text search by words: mode is "all", "any" or "phrase"; best matches first."""
+        if mode not in ("all", "any", "phrase"):
+            raise ValueError(f"Unknown search mode '{mode}'. Use all, any or phrase.")
+        ranks = self._ranks(tokenize(query), mode)
+        rows = self.db.execute(
+            f"SELECT id, title FROM notes WHERE id IN ({','.join('?' * len(ranks))})", list(ranks)
+        ).fetchall()
+        rows.sort(key=lambda row: ranks[row[0]])
+        return [self.find(title) for _, title in rows]
+
+    @reading
+    def find_by_tag(self, tag: str) -> List[Note]:
+        """Find notes containing a specific tag."""
+        return self.find_by_tags([tag])
+
+    @reading
+    def find_by_tags(self, tags: List[str], match_all: bool = True) -> List[Note]:
+        """Find notes having all (or, with match_all=False, any) of the tags."""
+        if not tags:
+            return []
+        marks = ",".join("?" * len(tags))
+        having = f"HAVING COUNT(DISTINCT tag) = {len(set(tags))}" if match_all else ""
+        where = f"WHERE id IN (SELECT note_id FROM note_tags WHERE tag IN ({marks}) GROUP BY note_id {having}) ORDER BY position"
+        return list(self._iter_notes(where, tags))
+
+    @reading
+    def tag_counts(self) -> Dict[str, int]:
+        """Return every tag with the number of notes using it."""
+        return dict(self.db.execute("SELECT tag, COUNT(*) FROM note_tags GROUP BY tag"))
+
+    @reading
+    def ordered(self, order: Optional[str] = None, offset: int = 0) -> Iterator[Note]:
+        """Iterate notes from position offset, in insertion order or by "title"."""
+        if order is None:
+            return self._iter_notes("ORDER BY position LIMIT -1 OFFSET ?", (offset,))
+        if order == "title":
+            return self._iter_notes("ORDER BY title_lower, title LIMIT -1 OFFSET ?", (offset,))
+        raise ValueError(f"Unknown order: '{order}'. Use title.")
+
+    @reading
+    def version(self) -> NotesVersion:
+        """The notes as they are now (see NotesVersion): reads and copies every note, O(n)."""
+        return NotesVersion(PersistentMap.from_values(note.copy() for note in self._iter_notes("ORDER BY position")))
+
+    @reading
+    def complete_titles(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        """Note titles starting with prefix (case insensitive), sorted."""
+        return _complete(self.db, "notes", "title", prefix, limit)
+
+    @reading
+    def complete_tags(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        """Tags starting with prefix (case insensitive), sorted."""
+        return _complete(self.db, "note_tags", "tag", prefix, limit)
+
+    # --- write-through of note changes ---
+
+    def _insert_tag(self, note_id, tag):
+        self.db.execute(
+            "INSERT INTO note_tags (note_id, tag, tag_lower, position) VALUES (?, ?, ?, (SELECT COALESCE(MAX(position), 0) + 1 FROM note_tags WHERE note_id = ?))",
+            (note_id, tag, tag.lower(), note_id),
+        )
+
+    @writing
+    def _note_changed(self, note: Note, field: str, old, new) -> None:
+        if field == "title" and old != new:
+            self.delete_note(new)
+        note_id = self._note_id(old if field == "title" else note.title)
+        with self.db:
+            if field == "title":
+                self.db.execute(
+                    "UPDATE notes SET title = ?, title_lower = ?, position = (SELECT MAX(position) + 1 FROM notes) WHERE id = ?",
+                    (new, new.lower(), note_id),
+                )
+                self._loaded.pop(old, None)
+                self._loaded[new] = note
+            elif field == "content":
+                self.db.execute("UPDATE notes SET content = ?, content_lower = ? WHERE id = ?", (new, new.lower(), note_id))
+            elif old is None:
+                self._insert_tag(note_id, new)
+            elif new is None:
+                self.db.execute("DELETE FROM note_tags WHERE note_id = ? AND tag = ?", (note_id, old))
+            else:
+                self.db.execute("UPDATE note_tags SET tag = ?, tag_lower = ? WHERE note_id = ? AND tag = ?", (new, new.lower(), note_id, old))
+            self._reindex(note_id, note, words=field != "tags")
+
+# ------------------------------
+# Loading and migration
+# ------------------------------
+
+def load_contacts(filename=DATABASE_FILE):
+    return SqliteAddressBook(Database(filename))
+
+def load_notes(filename=DATABASE_FILE):
+    return SqliteNotes(Database(filename))
+
+def migrate(contacts_file=CONTACTS_SNAPSHOT, notes_file=NOTES_SNAPSHOT, filename=DATABASE_FILE):
+    """Copy the address book and notes into the database. Returns (contacts, notes) counts.
+
+    They are read the way the app reads them: the snapshot with its journal
+    replayed on top, or the .pkl file of an older install when there is no
+    snapshot yet. The journals are closed again, which folds the replayed
+    changes into the snapshots.
+    """
+    book, notes = load_contacts(filename), load_notes(filename)
+    source_book, contacts_journal = open_contacts(contacts_file)
+    try:
+        for record in list(source_book.data.values()):
+            book.add_record(record.copy())
+    finally:
+        contacts_journal.close()
+    source_notes, notes_journal = open_notes(notes_file)
+    try:
+        for note in list(source_notes.notes.values()):
+            notes.add_note(note.copy())
+    finally:
+        notes_journal.close()
+    return len(book), len(notes.notes)
+
+if __name__ == "__main__":
+    # python -m src.storage.sqlite_backend [addressbook.snap notes.snap assistant.db]
+    contacts_count, notes_count = migrate(*sys.argv[1:4])
+    print(f"Migrated {contacts_count} contacts and {notes_count} notes.")
@@ -0,0 +1,206 @@
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from functools import partial
+
+from src.models.contacts import AddressBook, Record
+from src.models.notes import Note, Notes
+
+# ------------------------------
+# Stress test for the reader-writer locks of the book and the notes
+#
+# Phase 1: --writers threads rename contacts and notes back and forth and
+# add and remove phones and tags, while --readers threads check under the
+# read locks that every rename and change is seen whole:
+#   - exactly one of "Contact N" / "Moved N" exists, filed under its own name;
+#   - every phone of a contact is owned by that contact in the phone index;
+#   - the book and the notes keep their size;
+#   - every tag of a note finds the note, under its current title;
+#   - a version() holds every contact and note exactly once, and does not
+#     change while the writers go on.
+# Phase 2: only readers, 1, 2, 4 and 8 threads for --seconds each, to see
+# how lookups scale. Threads share the GIL, so pure Python lookups do not
+# run faster on more threads; what this shows is that the locks let them
+# run side by side without slowing down.
+# ------------------------------
+
+CONTACTS = 2_000
+WRITERS = 2
+READERS = 4
+SECONDS = 2.0
+SCALING = (1, 2, 4, 8)
+TAGS = 10
+
+
+def generated(size):
+    book = AddressBook()
+    notes = Notes()
+    for number in range(size):
+        book.add_record(Record.from_values(f"Contact {number}", [f"+38050{number:07d}"], [], [], None))
+        note = Note(f"Note {number}", f"Text of note {number}")
+        note.tags = {f"group{number % TAGS}": None}
+        notes.add_note(note)
+    return book, notes
+
+
+def find_contact(book, number):
+    return book.find(f"Contact {number}") or book.find(f"Moved {number}")
+
+
+def find_note(notes, number):
+    return notes.find(f"Note {number}") or notes.find(f"Moved note {number}")
+
+
+def write_once(book, notes, rnd, number, writer):
+    """One random change to contact and note number."""
+    action = rnd.randrange(4)
+    if action == 0:
+        record = find_contact(book, number)
+        record.change_name(f"Moved {number}" if record.name.value.startswith("Contact") else f"Contact {number}")
+    elif action == 1:
+        record = find_contact(book, number)
+        phone = f"+39{writer:03d}{rnd.randrange(10 ** 6):06d}"
+        record.add_phone(phone)
+        record.delete_phone(phone)
+    elif action == 2:
+        note = find_note(notes, number)
+        note.change_title(f"Moved note {number}" if note.title.startswith("Note") else f"Note {number}")
+    else:
+        note = find_note(notes, number)
+        tag = f"extra{writer}"
+        if tag in note.tags:
+            note.delete_tag(tag)
+        else:
+            note.add_tag(tag)
+
+
+def check_once(book, notes, number, size):
+    """Check the invariants for contact and note number. Returns a list of violations."""
+    violations = []
+    with book.lock.read(), notes.lock.read():
+        found = [book.find(f"Contact {number}"), book.find(f"Moved {number}")]
+        if sum(record is not None for record in found) != 1:
+            violations.append(f"contact {number}: {len([r for r in found if r])} copies")
+        for record in found:
+            if record is None:
+                continue
+            if record.name.value not in (f"Contact {number}", f"Moved {number}"):
+                violations.append(f"contact {number}: filed as {record.name.value}")
+            for phone in record.field_values("phones"):
+                owner = book.find_owner("phones", phone)
+                if owner != record.name.value:
+                    violations.append(f"phone {phone}: owned by {owner}, held by {record.name.value}")
+        if len(book) != size:
+            violations.append(f"book holds {len(book)} contacts")
+
+        found = [notes.find(f"Note {number}"), notes.find(f"Moved note {number}")]
+        if sum(note is not None for note in found) != 1:
+            violations.append(f"note {number}: {len([n for n in found if n])} copies")
+        for note in found:
+            if note is None:
+                continue
+            for tag in note.tags:
+                if note not in notes.find_by_tag(tag):
+                    violations.append(f"note {note.title}: missing from tag {tag}")
+        if len(notes.notes) != size:
+            violations.append(f"notes hold {len(notes.notes)} notes")
+    return violations
+
+
+def check_versions(book, notes, size):
+    """Check versions of the book and the notes, taken with no lock held. Returns a list of violations."""
+    violations = []
+    for version, prefixes in ((book.version(), ("Contact ", "Moved ")), (notes.version(), ("Note ", "Moved note "))):
+        keys = [key for key, _ in version.items()]
+        numbers = sorted(int(key.rsplit(" ", 1)[1]) for key in keys if key.startswith(prefixes))
+        if numbers != list(range(size)):
+            violations.append(f"version of {len(version)} items holds {len(numbers)} distinct numbers")
+        if [key for key, _ in version.items()] != keys:
+            violations.append("version changed while it was read")
+    return violations
+
+
+def run_threads(targets, seconds):
+    """Run each target(stopped) on a thread of its own for seconds."""
+    stopped = threading.Event()
+    threads = [threading.Thread(target=target, args=(stopped,)) for target in targets]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stopped.set()
+    for thread in threads:
+        thread.join()
+
+
+def invariants(book, notes, options):
+    size = options.contacts
+    checks = [0] * options.readers
+    writes = [0] * options.writers
+    violations = []
+
+    def writer(number, stopped):
+        rnd = random.Random(number)
+        while not stopped.is_set():
+            # Each writer owns the contacts with its remainder: its checks of
+            # the current name and the change that follows cannot be raced.
+            contact = rnd.randrange(number, size, options.writers)
+            write_once(book, notes, rnd, contact, number)
+            writes[number] += 1
+
+    def reader(number, stopped):
+        rnd = random.Random(1000 + number)
+        while not stopped.is_set():
+            violations.extend(check_once(book, notes, rnd.randrange(size), size))
+            checks[number] += 1
+
+    def version_reader(stopped):
+        while not stopped.is_set():
+            violations.extend(check_versions(book, notes, size))
+
+    targets = [partial(writer, number) for number in range(options.writers)]
+    targets += [partial(reader, number) for number in range(options.readers)]
+    targets.append(version_reader)
+    run_threads(targets, options.seconds)
+    # Once more, everything, with no one writing.
+    for number in range(size):
+        violations.extend(check_once(book, notes, number, size))
+    return {"writes": sum(writes), "checks": sum(checks) + size, "violations": len(violations), "examples": violations[:5]}
+
+
+def scaling(book, options):
+    results = []
+    for count in SCALING:
+        reads = [0] * count
+
+        def reader(number, stopped):
+            rnd = random.Random(number)
+            while not stopped.is_set():
+                find_contact(book, rnd.randrange(options.contacts))
+                reads[number] += 1
+
+        run_threads([partial(reader, number) for number in range(count)], options.seconds)
+        results.append({"threads": count, "reads_per_second": round(sum(reads) / options.seconds)})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.stress", description="Check the book and notes stay consistent under concurrent readers and writers, and measure read scaling.")
+    parser.add_argument("--contacts", type=int, default=CONTACTS, help=f"contacts and notes to generate (default: {CONTACTS})")
+    parser.add_argument("--writers", type=int, default=WRITERS, help=f"writer threads (default: {WRITERS})")
+    parser.add_argument("--readers", type=int, default=READERS, help=f"reader threads checking invariants (default: {READERS})")
+    parser.add_argument("--seconds", type=float, default=SECONDS, help=f"length of each run (default: {SECONDS})")
+    options = parser.parse_args(argv)
+    if options.contacts < options.writers:
+        parser.error("--contacts must be at least --writers")
+
+    book, notes = generated(options.contacts)
+    report = {"invariants": invariants(book, notes, options), "scaling": scaling(book, options)}
+    print(json.dumps(report))
+    return 1 if report["invariants"]["violations"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
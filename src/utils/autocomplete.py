@@ -1,32 +1,254 @@
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
 
-import difflib
-
-def guess_command(user_input, commands, aliases):
-    user_input = user_input.lower()
-    possible = list(commands.keys()) + list(aliases.keys())
-
-    prefix_matches = [cmd for cmd in possible if cmd.startswith(user_input)]
-    
-    if len(prefix_matches) == 1:
-        return prefix_matches[0]
-    elif len(prefix_matches) > 1:
-        return prefix_matches[0]
-
-    matches = difflib.get_close_matches(user_input, possible, n=1, cutoff=0.8)
-    if matches:
-        return matches[0]
-    
-    return None
-
-
-def smart_guess(user_input, commands, aliases):
-    text = user_input.lower()
-    
-    if text in aliases:
-        return aliases[text]
-    
-    for cmd in commands:
-        if cmd == text:
-            return cmd
-
-    return guess_command(text, commands, aliases)
+from src.models.indexes import FuzzyIndex, edit_distance
+
+try:
+    import readline
+except ImportError:
+    # No GNU readline (e.g. on Windows): the REPL works without completion.
+    readline = None
+
+# ------------------------------
+# Command resolution
+#
+# CommandResolver is built once from COMMANDS and ALIASES:
+#   - a prefix trie whose every node lists, sorted, the names below it, so
+#     completing a prefix is one step per typed letter;
+#   - a SymSpell-style typo index: every name with up to MAX_EDITS letters
+#     deleted -> the names it came from. A typed word with the same deletions
+#     applied meets the names within MAX_EDITS edits in that table, without
+#     comparing it to every name.
+# ------------------------------
+
+MAX_EDITS = 2
+
+
+class Resolution(NamedTuple):
+    """
+    command: the command to run, or None when unknown or ambiguous.
+    candidates: ranked names that fit the input (several: ambiguous).
+    exact: the input is a command or an alias as typed.
+    """
+    command: Optional[str]
+    candidates: Tuple[str, ...]
+    exact: bool = False
+
+
+def _deletions(word, edits=MAX_EDITS) -> Set[str]:
+    """word with every combination of up to edits letters removed (word included)."""
+    found = {word}
+    layer = {word}
+    for _ in range(edits):
+        layer = {item[:i] + item[i + 1:] for item in layer for i in range(len(item))}
+        found |= layer
+    return found
+
+
+class CommandResolver:
+    """Resolves typed command words to commands: exactly, by unique prefix, or by a close typo."""
+
+    def __init__(self, commands, aliases):
+        # Every name (command or alias) -> the command it runs.
+        self.targets: Dict[str, str] = {name: name for name in commands}
+        self.targets.update(aliases)
+        names = sorted(self.targets)
+
+        # Trie node: [children by letter, names below the node].
+        self._root = [{}, tuple(names)]
+        for name in names:
+            node = self._root
+            for letter in name:
+                child = node[0].get(letter)
+                if child is None:
+                    child = node[0][letter] = [{}, ()]
+                child[1] += (name,)
+                node = child
+
+        self._deletes: Dict[str, List[str]] = {}
+        for name in names:
+            for variant in _deletions(name):
+                self._deletes.setdefault(variant, []).append(name)
+
+    def completions(self, prefix) -> Tuple[str, ...]:
+        """Command and alias names starting with prefix, sorted."""
+        node = self._root
+        for letter in prefix.lower():
+            node = node[0].get(letter)
+            if node is None:
+                return ()
+        return node[1]
+
+    def suggestions(self, word) -> List[Tuple[str, int]]:
+        """(name, edit distance) of names within the typo tolerance of word, closest first."""
+        word = word.lower()
+        tolerance = min(FuzzyIndex.tolerance(word), MAX_EDITS)
+        if not tolerance:
+            return []
+        seen = set()
+        found = []
+        for variant in _deletions(word, tolerance):
+            for name in self._deletes.get(variant, ()):
+                if name in seen:
+                    continue
+                seen.add(name)
+                distance = edit_distance(word, name)
+                if distance <= tolerance:
+                    found.append((name, distance))
+        found.sort(key=lambda item: (item[1], item[0]))
+        return found
+
+    def _unique(self, names) -> Tuple[Optional[str], Tuple[str, ...]]:
+        """The command all names run (or None if they differ), and the names, one per command."""
+        by_command = {}
+        for name in names:
+            by_command.setdefault(self.targets[name], name)
+        commands = list(by_command)
+        return (commands[0] if len(commands) == 1 else None), tuple(by_command.values())
+
+    def resolve(self, word) -> Resolution:
+        """
+        Resolve a typed command word. An exact name wins, then a prefix shared
+        by names of a single command, then the closest typo. Several commands
+        fitting equally well are reported as candidates, never picked.
+        """
+        word = word.lower()
+        if word in self.targets:
+            return Resolution(self.targets[word], (word,), exact=True)
+
+        command, candidates = self._unique(self.completions(word))
+        if candidates:
+            return Resolution(command, candidates)
+
+        suggestions = self.suggestions(word)
+        if not suggestions:
+            return Resolution(None, ())
+        best = suggestions[0][1]
+        command, _ = self._unique(name for name, distance in suggestions if distance == best)
+        _, candidates = self._unique(name for name, _ in suggestions)
+        return Resolution(command, candidates)
+
+
+# ------------------------------
+# Tab completion
+#
+# Completer turns the line typed so far into replacements for its last
+# argument: command names first, then, by the command's ARGUMENTS spec,
+# contact names, note titles, tags or fixed choices. Names and titles come
+# from the sorted prefix indexes of the book and notes, so a completion is a
+# binary search however many contacts there are.
+# ------------------------------
+
+# Most completions offered at once.
+COMPLETION_LIMIT = 50
+
+
+def split_current(line) -> Tuple[List[str], str, int, str]:
+    """
+    Split a partly typed line like parse_input does.
+    Returns (finished words, current word, index where it starts, its open quote or "").
+    """
+    words = []
+    current = ""
+    start = 0
+    quote = ""
+    for index, c in enumerate(line):
+        if quote:
+            if c == quote:
+                quote = ""
+            else:
+                current += c
+        elif c in ('"', "'"):
+            if not current:
+                start = index
+            quote = c
+        elif c == " ":
+            if current:
+                words.append(current)
+                current = ""
+            start = index + 1
+        else:
+            if not current and line[start:start + 1] not in ('"', "'"):
+                start = index
+            current += c
+    if not current and not quote:
+        start = len(line)
+    return words, current, start, quote
+
+
+class Completer:
+    """Completions for the REPL, from a CommandResolver, the ARGUMENTS spec, the book and the notes."""
+
+    def __init__(self, resolver, arguments, book, notes, limit=COMPLETION_LIMIT):
+        self.resolver = resolver
+        self.arguments = arguments
+        self.book = book
+        self.notes = notes
+        self.limit = limit
+
+    def _kind(self, command, position):
+        kinds = self.arguments.get(command, ())
+        if position < len(kinds):
+            return kinds[position]
+        if kinds and isinstance(kinds[-1], str) and kinds[-1].endswith("..."):
+            return kinds[-1]
+        return None
+
+    def _values(self, kind, words, prefix):
+        if isinstance(kind, tuple):
+            return [choice for choice in kind if choice.startswith(prefix.lower())]
+        kind = kind.rstrip(".")
+        if kind == "contact":
+            return self.book.complete_names(prefix, self.limit)
+        if kind == "note":
+            return self.notes.complete_titles(prefix, self.limit)
+        if kind == "tag":
+            return self.notes.complete_tags(prefix, self.limit)
+        # A value of the contact named by the first argument.
+        record = self.book.find(words[1]) if len(words) > 1 else None
+        if record is None:
+            return []
+        field = {"phone": "phones", "email": "emails", "address": "addresses"}[kind]
+        prefix = prefix.lower()
+        return [value for value in record.field_values(field) if value.lower().startswith(prefix)]
+
+    def complete(self, line) -> Tuple[int, List[str]]:
+        """(index where the replaced word starts, replacements for it), quoted where needed."""
+        words, current, start, quote = split_current(line)
+        if not words:
+            return start, [name + " " for name in self.resolver.completions(current)[:self.limit]]
+        resolution = self.resolver.resolve(words[0])
+        kind = self._kind(resolution.command, len(words) - 1) if resolution.exact else None
+        if kind is None:
+            return start, []
+        values = self._values(kind, words, current)[:self.limit]
+        # Quote all or none: readline replaces the word by the common start of the replacements.
+        if not quote and any(" " in value for value in values):
+            quote = '"'
+        return start, [f"{quote}{value}{quote} " for value in values]
+
+
+def install_completion(completer):
+    """Complete on Tab in input() through readline. Returns False when readline is missing."""
+    if readline is None:
+        return False
+    matches = []
+
+    def complete(text, state):
+        if state == 0:
+            line = readline.get_line_buffer()[:readline.get_endidx()]
+            start, replacements = completer.complete(line)
+            # readline replaces only from its word start (after a space or a quote):
+            # drop what is typed before it from the replacements.
+            typed = line[start:readline.get_begidx()].lower()
+            matches[:] = [value[len(typed):] for value in replacements if value[:len(typed)].lower() == typed]
+        return matches[state] if state < len(matches) else None
+
+    readline.set_completer_delims(" \t\n\"'")
+    readline.set_completer(complete)
+    if "libedit" in (readline.__doc__ or ""):
+        readline.parse_and_bind("bind ^I rl_complete")
+    else:
+        readline.parse_and_bind("tab: complete")
+        # List the choices on the first Tab when it cannot complete further.
+        readline.parse_and_bind("set show-all-if-ambiguous on")
+    return True
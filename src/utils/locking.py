@@ -0,0 +1,204 @@
+import threading
+import weakref
+from functools import wraps
+
+# ------------------------------
+# Reader-writer lock
+#
+# Any number of threads may read at once; a writer waits for them to leave
+# and then has the object to itself. Waiting writers go first: once one
+# waits, new readers queue behind it, so a stream of lookups cannot starve
+# changes. Both sides are reentrant, and the writer may also read. A reader
+# asking to write raises RuntimeError instead of deadlocking: two readers
+# upgrading at once would wait for each other forever.
+# ------------------------------
+
+
+class _Side:
+    """Context manager calling acquire on enter and release on exit."""
+
+    __slots__ = ("acquire", "release")
+
+    def __init__(self, acquire, release):
+        self.acquire = acquire
+        self.release = release
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+        return False
+
+
+class _ThreadState:
+    """Read and write depth of one thread on one lock (reads inside a write count as writes)."""
+
+    __slots__ = ("reads", "writes", "__weakref__")
+
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+
+
+class RWLock:
+    """Reentrant reader-writer lock with writer preference. Use "with lock.read():" / "with lock.write():".
+
+    A reader only counts itself in its own thread state and then checks that
+    no writer is about; a writer announces itself and then waits until no
+    thread counts a read. Whichever goes second sees the other, so reading
+    an uncontended lock takes no mutex.
+    """
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._cond = threading.Condition(self._mutex)
+        # Held by the writer from the moment it asks until it is done: writers take turns.
+        self._writer_lock = threading.Lock()
+        self._writing = False
+        # Threads blocked on the condition, so releases notify only when someone waits.
+        self._sleepers = 0
+        # Weak references to the state of every thread using the lock.
+        self._threads = []
+        self._local = threading.local()
+        self._read = _Side(self.acquire_read, self.release_read)
+        self._write = _Side(self.acquire_write, self.release_write)
+
+    def read(self):
+        return self._read
+
+    def write(self):
+        return self._write
+
+    def _state(self):
+        try:
+            return self._local.state
+        except AttributeError:
+            state = self._local.state = _ThreadState()
+            with self._mutex:
+                # Drop the states of threads that ended.
+                self._threads = [ref for ref in self._threads if ref() is not None]
+                self._threads.append(weakref.ref(state))
+            return state
+
+    def _wait(self):
+        self._sleepers += 1
+        try:
+            self._cond.wait()
+        finally:
+            self._sleepers -= 1
+
+    def _reading_threads(self):
+        for ref in self._threads:
+            state = ref()
+            if state is not None and state.reads:
+                return True
+        return False
+
+    def acquire_read(self):
+        state = self._state()
+        if state.writes:
+            state.writes += 1
+            return
+        state.reads += 1
+        if state.reads == 1 and self._writing:
+            # A writer holds the lock or waits for it: step back until it is done.
+            with self._mutex:
+                state.reads = 0
+                if self._sleepers:
+                    self._cond.notify_all()
+                while self._writing:
+                    self._wait()
+                state.reads = 1
+
+    def release_read(self):
+        state = self._state()
+        if state.writes:
+            state.writes -= 1
+            return
+        state.reads -= 1
+        if not state.reads and self._writing:
+            with self._mutex:
+                if self._sleepers:
+                    self._cond.notify_all()
+
+    def acquire_write(self):
+        state = self._state()
+        if state.writes:
+            state.writes += 1
+            return
+        if state.reads:
+            raise RuntimeError("Cannot write while holding the read lock.")
+        self._writer_lock.acquire()
+        try:
+            with self._mutex:
+                self._writing = True
+                while self._reading_threads():
+                    self._wait()
+        except BaseException:
+            # Interrupted while waiting: let the readers queued behind it in.
+            self._done_writing()
+            raise
+        state.writes = 1
+
+    def release_write(self):
+        state = self._state()
+        state.writes -= 1
+        if not state.writes:
+            self._done_writing()
+
+    def _done_writing(self):
+        with self._mutex:
+            self._writing = False
+            if self._sleepers:
+                self._cond.notify_all()
+        self._writer_lock.release()
+
+
+def reading(method):
+    """Run the method under self.lock.read()."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        lock = self.lock
+        lock.acquire_read()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            lock.release_read()
+    return wrapper
+
+
+def writing(method):
+    """Run the method under self.lock.write()."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        lock = self.lock
+        lock.acquire_write()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            lock.release_write()
+    return wrapper
+
+
+def writing_through(owner):
+    """
+    Run the method under the write lock of the object in self.<owner> (e.g.
+    a record's book), or unlocked while it has none. A change to a record and
+    the index updates it triggers then happen as one step for readers.
+    """
+    def decorate(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            container = getattr(self, owner)
+            if container is None:
+                return method(self, *args, **kwargs)
+            lock = container.lock
+            lock.acquire_write()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                lock.release_write()
+        return wrapper
+    return decorate
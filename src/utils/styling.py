@@ -56,8 +56,8 @@ def sch(text):
     return style("search", text)
 
 
-def table_display_notes(items, title):
-    table = Table(title=title, title_style="bold magenta", box=box.MINIMAL_DOUBLE_HEAD)
+def table_display_notes(items, title, caption=None):
+    table = Table(title=title, caption=caption, title_style="bold magenta", box=box.MINIMAL_DOUBLE_HEAD)
     table.add_column("Title", style="bold green")
     table.add_column("Content", style="cyan")
     table.add_column("Tags", style="yellow")
@@ -71,8 +71,20 @@ def table_display_notes(items, title):
     return ""
 
 
-def table_display_contacts(items, title):
+def table_display_tags(counts, title):
     table = Table(title=title, title_style="bold magenta", box=box.MINIMAL_DOUBLE_HEAD)
+    table.add_column("Tag", style="yellow")
+    table.add_column("Notes", style="cyan", justify="right")
+
+    for tag, count in sorted(counts.items(), key=lambda item: (-item[1], item[0])):
+        table.add_row(tag, str(count))
+
+    console.print(table)
+    return ""
+
+
+def table_display_contacts(items, title, caption=None):
+    table = Table(title=title, caption=caption, title_style="bold magenta", box=box.MINIMAL_DOUBLE_HEAD)
     table.add_column("Name", style="bold green")
     table.add_column("Phones", style="cyan")
     table.add_column("Emails", style="yellow")
@@ -1,6 +1,8 @@
 
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+from functools import lru_cache
 import re
+import time
 
 PHONE_PATTERN = re.compile(r"^\+?\d{10,15}$")
 EMAIL_PATTERN = re.compile(r"^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$")
@@ -21,17 +23,71 @@ def validate_email(email):
         raise ValueError("Invalid email format: use text@text.text")
     return email
 
+def phone_key(phone):
+    """
+    Canonical form of a phone number for comparisons: E.164 style, "+" and
+    the digits, so "+380501234567" and "380501234567" are the same number.
+    """
+    return phone if phone.startswith("+") else "+" + phone
+
+def email_key(email):
+    """
+    Canonical form of an email address for comparisons: lowercased, with the
+    domain in its IDNA (ASCII) form.
+    """
+    local, _, domain = email.rpartition("@")
+    if not domain.isascii():
+        try:
+            domain = domain.encode("idna").decode("ascii")
+        except UnicodeError:
+            pass
+    return f"{local}@{domain}".lower() if local else email.lower()
+
+# Parsed and formatted dates are cached: birthdays repeat a lot across contacts.
+DATE_CACHE_SIZE = 4096
+
+_today = None
+_today_ends = 0.0
+
+def today():
+    """date.today(), recomputed only once the local day is over."""
+    global _today, _today_ends
+    now = time.time()
+    if now >= _today_ends:
+        _today = date.today()
+        midnight = datetime.combine(_today + timedelta(days=1), datetime.min.time())
+        _today_ends = midnight.timestamp()
+    return _today
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_date(text):
+    """
+    Parse DD.MM.YYYY. The usual zero-padded form is sliced by hand,
+    anything else goes through strptime (which also accepts e.g. 1.2.2000).
+    """
+    if len(text) == 10 and text.isascii() and text[2] == "." and text[5] == "." and text[:2].isdigit() and text[3:5].isdigit() and text[6:].isdigit():
+        try:
+            return date(int(text[6:]), int(text[3:5]), int(text[:2]))
+        except ValueError:
+            raise ValueError("Invalid date format. Use DD.MM.YYYY") from None
+    try:
+        return datetime.strptime(text, "%d.%m.%Y").date()
+    except ValueError:
+        raise ValueError("Invalid date format. Use DD.MM.YYYY") from None
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def format_date(value):
+    """Format a date as DD.MM.YYYY."""
+    return f"{value.day:02d}.{value.month:02d}.{value.year:04d}"
+
 def validate_birthday(birthday):
     """
     Validate birthday in format DD.MM.YYYY and ensure it's not in the future.
     """
     if not isinstance(birthday, date):
-        try:
-            birthday = datetime.strptime(birthday, "%d.%m.%Y").date()
-        except ValueError:
-            raise ValueError("Invalid date format. Use DD.MM.YYYY")
+        birthday = parse_date(birthday)
 
-    if birthday > date.today():
+    if birthday > today():
         raise ValueError("Birthday cannot be in the future")
 
     return birthday
@@ -0,0 +1,62 @@
+from datetime import date
+
+import pytest
+
+from src.models.contacts import AddressBook, Record
+from src.models.notes import Note, Notes
+
+# The same contacts and notes as the snapshot files in tests/data, which were
+# written by the version 1 and version 2 snapshot writers.
+CONTACTS = [
+    ("Alice Smith", ["0501234567"], ["alice@example.com"], ["1 Main Street, Kyiv"], date(1990, 2, 1)),
+    ("Bob Jones", ["0671234567"], [], ["1 Main Street, Kyiv"], None),
+    ("Carol White", ["0931234567"], ["carol@example.com"], [], date(2000, 2, 29)),
+]
+NOTES = [
+    ("Shopping", "Milk and bread", ["home", "todo"]),
+    ("Call Bob", "About the trip", ["todo"]),
+]
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Run every test in its own directory: the app reads and writes files (addressbook.pkl, ...) relative to it."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def make_book(contacts=CONTACTS):
+    book = AddressBook()
+    for name, phones, emails, addresses, birthday in contacts:
+        book.add_record(Record.from_values(name, phones, emails, addresses, birthday))
+    return book
+
+
+def make_notes(notes=NOTES):
+    collection = Notes()
+    for title, content, tags in notes:
+        note = Note(title, content)
+        for tag in tags:
+            note.add_tag(tag)
+        collection.add_note(note)
+    return collection
+
+
+def contacts_of(book):
+    """Everything a book holds, in its order, as plain values."""
+    return [
+        (record.name.value, [p.value for p in record.phones], [e.value for e in record.emails], [a.value for a in record.addresses], record.birthday.value if record.birthday else None)
+        for record in book.data.values()
+    ]
+
+
+def notes_of(notes):
+    return [(note.title, note.content, list(note.tags)) for note in notes.notes.values()]
+
+
+def stop(journal):
+    """Stop the background thread and drop the log file without folding it into the snapshot, as a crash would."""
+    journal._stop.set()
+    journal._jobs.put(None)
+    journal._thread.join()
+    journal._file.close()
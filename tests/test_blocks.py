@@ -0,0 +1,131 @@
+import io
+import os
+import pickle
+
+import pytest
+
+from src.storage import persistence
+from src.storage.blocks import BLOCK, CODECS, SYNC, BlockError, BlockReader, BlockWriter
+from src.storage.persistence import DamagedFileWarning, LoadError
+
+from conftest import contacts_of, make_book, make_notes, notes_of
+
+BLOCKS = [bytes([number]) * (500 + number) for number in range(5)]
+
+
+def written(blocks=BLOCKS, codec="zlib"):
+    f = io.BytesIO()
+    writer = BlockWriter(f, codec)
+    offsets = []
+    for block in blocks:
+        offsets.append(f.tell())
+        writer.write_block(block)
+    writer.close()
+    return bytearray(f.getvalue()), offsets
+
+
+def read(data):
+    reader = BlockReader(io.BytesIO(bytes(data)))
+    return list(reader), reader
+
+
+@pytest.mark.parametrize("codec", sorted(CODECS))
+def test_round_trip(codec):
+    data, _ = written(codec=codec)
+    blocks, reader = read(data)
+    assert blocks == BLOCKS
+    assert reader.codec == codec
+    assert reader.complete and reader.expected == 5
+
+
+def test_resyncs_after_a_damaged_block():
+    data, offsets = written()
+    data[offsets[2] + 20] ^= 0xFF
+    blocks, reader = read(data)
+    assert blocks == BLOCKS[:2] + BLOCKS[3:]
+    assert reader.damaged == [offsets[2]]
+    assert (reader.blocks, reader.expected, reader.complete) == (4, 5, False)
+    assert "1 of 5 blocks lost" in reader.report()
+
+
+def test_resyncs_after_garbage_between_blocks():
+    data, offsets = written()
+    data[offsets[1]:offsets[1]] = b"\x00garbage\xabBL"
+    blocks, reader = read(data)
+    assert blocks == BLOCKS
+    assert reader.damaged == [offsets[1]]
+    assert not reader.complete
+
+
+def test_cut_short_keeps_the_blocks_before():
+    data, offsets = written()
+    blocks, reader = read(data[:offsets[3] + 10])
+    assert blocks == BLOCKS[:3]
+    assert reader.expected is None
+    assert "cut short" in reader.report()
+
+
+def test_not_a_block_file():
+    with pytest.raises(BlockError):
+        BlockReader(io.BytesIO(b"not a block file at all"))
+
+
+def test_pkl_round_trip(workdir):
+    book, notes = make_book(), make_notes()
+    book.journal_seq = 4
+    persistence.save_contacts(book, "addressbook.pkl")
+    persistence.save_notes(notes, "notes.pkl")
+
+    loaded = persistence.load_contacts("addressbook.pkl")
+    assert loaded.journal_seq == 4
+    assert contacts_of(loaded) == contacts_of(book)
+    assert loaded.find_owner("emails", "ALICE@example.com") == "Alice Smith"
+    assert notes_of(persistence.load_notes("notes.pkl")) == notes_of(notes)
+
+
+def test_plain_pickle_still_loads(workdir):
+    book = make_book()
+    with open("addressbook.pkl", "wb") as f:
+        pickle.dump(book, f)
+    assert contacts_of(persistence.load_contacts("addressbook.pkl")) == contacts_of(book)
+
+
+def test_damaged_pkl_loads_the_good_blocks(workdir, monkeypatch):
+    monkeypatch.setattr(persistence, "BLOCK_ITEMS", 1)
+    persistence.save_contacts(make_book(), "addressbook.pkl")
+    with open("addressbook.pkl", "rb") as f:
+        data = bytearray(f.read())
+    # The header block, then one block per contact: damage Bob's.
+    starts = [offset for offset in range(len(data)) if data.startswith(SYNC, offset)]
+    data[starts[2] + BLOCK.size] ^= 0xFF
+    with open("addressbook.pkl", "wb") as f:
+        f.write(data)
+
+    with pytest.warns(DamagedFileWarning, match="1 of 4 blocks lost.*Loaded 2 items"):
+        loaded = persistence.load_contacts("addressbook.pkl")
+    assert list(loaded.data) == ["Alice Smith", "Carol White"]
+    assert loaded.find_owner("phones", "0671234567") is None
+
+
+def test_refused_block_is_skipped(workdir):
+    book = make_book()
+    good = pickle.dumps([(key, record) for key, record in book.data.items()][:1])
+    refused = pickle.dumps([("Evil", os.system)])
+    with open("addressbook.pkl", "wb") as f:
+        writer = BlockWriter(f)
+        writer.write_block(pickle.dumps({"journal_seq": 2}))
+        writer.write_block(good)
+        writer.write_block(refused)
+        writer.close()
+
+    with pytest.warns(DamagedFileWarning, match="1 blocks could not be unpickled"):
+        loaded = persistence.load_contacts("addressbook.pkl")
+    assert list(loaded.data) == ["Alice Smith"]
+    assert loaded.journal_seq == 2
+
+
+def test_unreadable_pkl_raises_load_error(workdir):
+    with open("addressbook.pkl", "wb") as f:
+        f.write(b"\x80\x05garbage")
+    with pytest.raises(LoadError):
+        persistence.load_contacts("addressbook.pkl")
@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+from src import commands
+from src.batch import run_command
+from src.models.notes import Notes
+
+from conftest import make_book
+
+
+@pytest.fixture
+def batch(monkeypatch):
+    """Prompts off, as in batch and server mode."""
+    monkeypatch.setattr(commands, "INTERACTIVE", False)
+    monkeypatch.setattr(commands, "ON_DUPLICATE", "skip")
+
+
+def test_unquoted_lines_split_as_the_quote_parser_does():
+    rnd = random.Random(0)
+    for _ in range(500):
+        line = "".join(rnd.choice("ab1 \t.") for _ in range(rnd.randrange(12)))
+        # An empty quoted string adds no argument, but sends the line down the character by character path.
+        assert commands.parse_input(line) == commands.parse_input(line.strip() + ' ""'), repr(line)
+
+
+def test_add_checks_every_phone_before_adding_the_contact(batch):
+    book = make_book()
+    command, status, message = run_command("add", ["Zed", "0501234567", "0671111111"], book, Notes())
+
+    assert status == "warning"
+    assert message.splitlines() == [
+        "This phone is already used in contact 'Alice Smith'. Skipped.",
+        "Contact 'Zed' added successfully.",
+        "Phone 0501234567 was not added.",
+        "Added phone to Zed.",
+    ]
+    assert book.find("Zed").str_phones() == "0671111111"
+    assert book.find_owner("phones", "0501234567") == "Alice Smith"
+
+
+def test_add_with_a_bad_phone_adds_nothing(batch):
+    book = make_book()
+    _, status, _ = run_command("add", ["Zed", "0671111111", "0671111111"], book, Notes())
+    assert status == "error"
+    assert book.find("Zed") is None
+    _, status, _ = run_command("add", ["Zed", "0671111111", "12"], book, Notes())
+    assert status == "error"
+    assert book.find("Zed") is None
+
+
+def test_find_note_sorts_by_rank_only_when_asked(batch):
+    notes = Notes()
+    for title, content in (("Plain", "bread"), ("Bread", "bread and more bread")):
+        run_command("add-note", [title, content], None, notes)
+    _, _, message = run_command("find-note", ["bread"], None, notes)
+    assert message.index("Plain") < message.index("more bread")
+    _, _, message = run_command("find-note", ["bread", "--sort", "rank"], None, notes)
+    assert message.index("more bread") < message.index("Plain")
+    assert run_command("find-note", ["bread", "--sort", "title"], None, notes)[1] == "warning"
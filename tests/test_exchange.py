@@ -0,0 +1,158 @@
+import csv
+import gc
+import json
+import os
+
+import pytest
+
+from src.models.contacts import AddressBook
+from src.models.notes import Notes
+from src.storage import exchange
+
+from conftest import contacts_of, make_book, make_notes, notes_of
+
+
+def write(filename, content):
+    with open(filename, "wb") as f:
+        f.write(content if isinstance(content, bytes) else content.encode("utf-8"))
+
+
+def imported(filename, book=None):
+    book = AddressBook() if book is None else book
+    return exchange.import_contacts(filename, book), book
+
+
+@pytest.mark.parametrize("filename", ["contacts.csv", "contacts.jsonl", "contacts.vcf"])
+def test_contacts_round_trip(workdir, filename):
+    book = make_book()
+    assert exchange.export_contacts(filename, book) == 3
+    result, loaded = imported(filename)
+    assert (result.imported, result.failed) == (3, 0)
+    assert contacts_of(loaded) == contacts_of(book)
+
+
+@pytest.mark.parametrize("filename", ["notes.csv", "notes.jsonl"])
+def test_notes_round_trip(workdir, filename):
+    notes = make_notes()
+    exchange.export_notes(filename, notes)
+    loaded = Notes()
+    result = exchange.import_notes(filename, loaded)
+    assert (result.imported, result.failed) == (2, 0)
+    assert notes_of(loaded) == notes_of(notes)
+
+
+def test_jsonl_error_rows(workdir):
+    rows = [
+        json.dumps({"name": "Good One", "phones": ["0501234567"]}),
+        "{not json",
+        json.dumps(["a", "list"]),
+        json.dumps({"name": "Dict Phone", "phones": {"home": "0501234567"}}),
+        json.dumps({"name": "Nested", "phones": [["0501234567"]]}),
+        json.dumps({"name": {"first": "Bad"}}),
+        json.dumps({"name": "Number Phone", "phones": 501234567}),
+        "",
+        json.dumps({"name": "Bad Phone", "phones": "123"}),
+        json.dumps({"name": "Good Two", "phones": "0671234567", "birthday": "01.02.1990"}),
+    ]
+    write("contacts.jsonl", "\n".join(rows) + "\n")
+    result, book = imported("contacts.jsonl")
+
+    assert list(book.data) == ["Good One", "Good Two"]
+    assert (result.imported, result.failed) == (2, 7)
+    errors = dict(result.errors)
+    assert errors[2].startswith("Invalid JSON")
+    assert errors[3] == "Expected a JSON object."
+    assert errors[4] == errors[5] == errors[7] == "'phones' must be a string or a list of strings."
+    assert errors[6] == "'name' must be a string."
+    assert errors[9].startswith("Invalid phone format")
+
+
+def test_csv_error_rows(workdir):
+    huge = "x" * (csv.field_size_limit() + 1)
+    content = (
+        b"name,phones,emails,addresses,birthday\r\n"
+        b"Good One,0501234567,,,\r\n"
+        b"Bad Email,0502222222,not-an-email,,\r\n"
+        b"Bad \xff Bytes,0503333333,,,\r\n"
+        + f"Huge,0504444444,,{huge},\r\n".encode("ascii")
+        + b"Future,0505555555,,,01.01.2999\r\n"
+        b"Good Two,0671234567;0931234567,two@example.com,1 Main Street,01.02.1990\r\n"
+    )
+    write("contacts.csv", content)
+    result, book = imported("contacts.csv")
+
+    assert list(book.data) == ["Good One", "Good Two"]
+    assert [p.value for p in book.find("Good Two").phones] == ["0671234567", "0931234567"]
+    assert (result.imported, result.failed) == (2, 4)
+    errors = dict(result.errors)
+    assert errors[3].startswith("Invalid email format")
+    assert errors[4] == "Not valid UTF-8."
+    assert errors[5].startswith("Invalid CSV")
+    assert errors[6] == "Birthday cannot be in the future"
+
+
+def test_vcard_error_rows(workdir):
+    content = (
+        "BEGIN:VCARD\r\nVERSION:3.0\r\nFN:Good One\r\nTEL:050-123-45-67\r\nBDAY:1990-02-01\r\nEND:VCARD\r\n"
+        "BEGIN:VCARD\r\nVERSION:3.0\r\nFN:Bad Birthday\r\nBDAY:tomorrow\r\nEND:VCARD\r\n"
+        "BEGIN:VCARD\r\nVERSION:3.0\r\nFN:\r\nTEL:0502222222\r\nEND:VCARD\r\n"
+    ).encode("utf-8") + (
+        b"BEGIN:VCARD\r\nVERSION:3.0\r\nFN:Bad \xff Bytes\r\nEND:VCARD\r\n"
+        b"BEGIN:VCARD\r\nVERSION:3.0\r\nFN:Good Two\r\nEMAIL:two@example.com\r\nADR:;;1 Main Street;Kyiv;;;\r\nEND:VCARD\r\n"
+    )
+    write("contacts.vcf", content)
+    result, book = imported("contacts.vcf")
+
+    assert list(book.data) == ["Good One", "Good Two"]
+    assert book.find("Good One").str_birthday() == "01.02.1990"
+    assert [a.value for a in book.find("Good Two").addresses] == ["1 Main Street, Kyiv"]
+    assert (result.imported, result.failed) == (2, 3)
+    errors = dict(result.errors)
+    assert errors[7] == "Invalid date format. Use DD.MM.YYYY"
+    assert errors[12] == "Name cannot be empty."
+    assert errors[17] == "Not valid UTF-8."
+
+
+def test_duplicate_phone_is_rejected(workdir):
+    book = make_book()
+    write("contacts.jsonl", json.dumps({"name": "Copycat", "phones": ["0501234567"]}) + "\n")
+    result, book = imported("contacts.jsonl", book)
+    assert result.errors == [(1, "Phone '0501234567' is already used by 'Alice Smith'.")]
+    assert book.find("Copycat") is None
+
+
+def test_notes_cannot_come_from_vcard(workdir):
+    write("notes.vcf", "")
+    with pytest.raises(ValueError, match="contacts only"):
+        exchange.import_notes("notes.vcf", Notes())
+
+
+def test_a_failed_export_keeps_the_old_file(workdir, monkeypatch):
+    exchange.export_contacts("contacts.csv", make_book())
+    with open("contacts.csv", "rb") as f:
+        before = f.read()
+
+    def failing(record):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(exchange, "contact_row", failing)
+    with pytest.raises(OSError, match="disk full"):
+        exchange.export_contacts("contacts.csv", make_book())
+    assert os.listdir(workdir) == ["contacts.csv"]
+    with open("contacts.csv", "rb") as f:
+        assert f.read() == before
+
+
+def test_import_leaves_the_garbage_collector_alone(workdir, monkeypatch):
+    # gc.disable() would stop collection in every thread of the process (the server's included).
+    exchange.export_contacts("contacts.csv", make_book())
+    insert_chunk = exchange._insert_chunk
+    during = []
+
+    def watched(*args):
+        during.append(gc.isenabled())
+        return insert_chunk(*args)
+
+    monkeypatch.setattr(exchange, "_insert_chunk", watched)
+    imported("contacts.csv")
+    assert during == [True]
@@ -0,0 +1,194 @@
+import pickle
+import random
+from datetime import date
+
+import pytest
+
+from src.models.contacts import AddressBook, Record
+from src.models.notes import Note, Notes
+
+SEARCHES = [("name", "contact 1"), ("name", "7"), ("phones", "0500000"), ("phones", "12"), ("emails", "example"), ("addresses", "street 3"), ("birthday", "02.19")]
+
+
+def changed_book(seed=0, contacts=200, changes=400):
+    """A book after a random run of adds, renames (some onto existing names), deletes and field changes."""
+    rnd = random.Random(seed)
+    book = AddressBook()
+    for number in range(contacts):
+        book.add_record(Record.from_values(
+            f"Contact {number}",
+            [f"050{number:07d}"],
+            [f"contact{number}@example.com"] if number % 2 else [],
+            [f"Street {number % 40}"] if number % 3 else [],
+            date(1980 + number % 30, 1 + number % 12, 1 + number % 28) if number % 4 else None,
+        ))
+    serial = contacts
+    for _ in range(changes):
+        record = rnd.choice(list(book.data.values()))
+        action = rnd.randrange(8)
+        serial += 1
+        if action == 0:
+            record.change_name(f"Renamed {serial}")
+        elif action == 1:
+            # Onto an existing contact, which it overwrites.
+            record.change_name(rnd.choice(list(book.data.values())).name.value)
+        elif action == 2:
+            book.delete(record.name.value)
+        elif action == 3 and record.phones:
+            record.change_phone(record.phones[0].value, f"067{serial:07d}")
+        elif action == 4:
+            record.add_email(f"New{serial}@Example.com")
+        elif action == 5 and record.emails:
+            record.delete_email(record.emails[0].value)
+        elif action == 6:
+            record.add_address(f"{serial} Street {serial % 50}")
+        else:
+            record.add_birthday(f"{1 + serial % 28:02d}.{1 + serial % 12:02d}.1990")
+        if rnd.random() < 0.2:
+            book.add_record(Record.from_values(f"Added {serial}", [f"093{serial:07d}"]))
+    return book
+
+
+def names(records):
+    return [record.name.value for record in records]
+
+
+def days(records):
+    return [(record.birthday.value.month, record.birthday.value.day) if record.birthday else None for record in records]
+
+
+def rebuilt(book):
+    """The same records with every index built from scratch, as on load."""
+    return pickle.loads(pickle.dumps(book))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_owners_match_the_records(seed):
+    book = changed_book(seed)
+    owners = {}
+    for record in book.data.values():
+        for phone in record.phones:
+            assert book.find_owner("phones", phone.value) == record.name.value
+            owners[phone.value] = record.name.value
+        for email in record.emails:
+            assert book.find_owner("emails", email.value.upper()) == record.name.value
+    for number in range(200):
+        phone = f"050{number:07d}"
+        assert book.find_owner("phones", phone) == owners.get(phone)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_searches_match_a_scan(seed):
+    book = changed_book(seed)
+    version = book.version()
+    for field, query in SEARCHES:
+        assert names(book.search(field, query)) == names(version.search(field, query)), (field, query)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_indexes_match_a_rebuild(seed):
+    book = changed_book(seed)
+    fresh = rebuilt(book)
+    assert list(book.data) == list(fresh.data)
+    for field, query in SEARCHES:
+        assert names(book.search(field, query)) == names(fresh.search(field, query)), (field, query)
+    for order in (None, "name"):
+        assert names(book.ordered(order)) == names(fresh.ordered(order)), order
+    # Contacts born on the same day come in no particular order.
+    assert days(book.ordered("birthday")) == days(fresh.ordered("birthday"))
+    assert set(names(book.ordered("birthday"))) == set(book.data)
+    assert book.complete_names("contact 1") == fresh.complete_names("contact 1")
+    assert names(book.fuzzy_search("Contcat 12")) == names(fresh.fuzzy_search("Contcat 12"))
+    start = date(2024, 12, 20)
+    for window in (7, 30, 365):
+        upcoming = sorted((when, record.name.value) for when, record in book.upcoming_birthdays(start, window))
+        assert upcoming == sorted((when, record.name.value) for when, record in fresh.upcoming_birthdays(start, window))
+
+
+def test_columns_follow_the_changes():
+    book = AddressBook()
+    for number in range(50):
+        book.add_record(Record.from_values(f"Contact {number}", [f"050{number:07d}"]))
+    book.use_columns()
+    book.find("Contact 7").change_name("Person 77")
+    book.delete("Contact 17")
+    book.find("Contact 27").change_phone("0500000027", "0670000077")
+    version = book.version()
+    for field, query in (("name", "7"), ("phones", "77")):
+        assert names(book.search(field, query)) == names(version.search(field, query))
+
+
+def test_rename_moves_the_owner():
+    book = AddressBook()
+    book.add_record(Record.from_values("Alice", ["0501234567"], ["alice@example.com"]))
+    book.find("Alice").change_name("Alicia")
+    assert book.find("Alice") is None
+    assert book.find_owner("phones", "0501234567") == "Alicia"
+    assert book.find_owner("emails", "alice@example.com") == "Alicia"
+    assert book.complete_names("ali") == ["Alicia"]
+    assert names(book.search("name", "alic")) == ["Alicia"]
+
+
+def test_rename_onto_an_existing_contact_overwrites_it():
+    book = AddressBook()
+    book.add_record(Record.from_values("Alice", ["0501234567"]))
+    book.add_record(Record.from_values("Bob", ["0671234567"]))
+    book.find("Bob").change_name("Alice")
+    assert list(book.data) == ["Alice"]
+    assert book.find_owner("phones", "0501234567") is None
+    assert book.find_owner("phones", "0671234567") == "Alice"
+
+
+def test_notes_tags_follow_the_changes():
+    notes = Notes()
+    for title, tags in (("One", ["a", "b"]), ("Two", ["b"]), ("Three", ["c"])):
+        note = Note(title, title.lower())
+        for tag in tags:
+            note.add_tag(tag)
+        notes.add_note(note)
+    notes.find("One").edit_tag("a", "c")
+    notes.find("Two").change_title("Deux")
+    notes.delete_note("Three")
+
+    assert [note.title for note in notes.find_by_tag("c")] == ["One"]
+    assert [note.title for note in notes.find_by_tag("b")] == ["One", "Deux"]
+    assert notes.find_by_tag("a") == []
+    assert notes.complete_titles("") == ["Deux", "One"]
+    fresh = pickle.loads(pickle.dumps(notes))
+    for tag in ("a", "b", "c"):
+        assert [note.title for note in notes.find_by_tag(tag)] == [note.title for note in fresh.find_by_tag(tag)]
+    assert notes.tag_counts() == fresh.tag_counts()
+
+
+def ranked_notes():
+    notes = Notes()
+    for title, content in (("Plain", "bread"), ("Bread", "bread and more bread"), ("Other", "no match"), ("Toast", "bread")):
+        notes.add_note(Note(title, content))
+    return notes
+
+
+def test_find_note_keeps_insertion_order():
+    notes = ranked_notes()
+    assert [note.title for note in notes.find_note("bread")] == ["Plain", "Bread", "Toast"]
+    # A renamed note moves to the end, as in notes.notes.
+    notes.find("Plain").change_title("Plainer")
+    assert [note.title for note in notes.find_note("bread")] == ["Bread", "Toast", "Plainer"]
+    assert [note.title for note in notes.find_note("bread")] == [note.title for note in notes.notes.values() if note.matches("bread")]
+
+
+def test_find_note_ranked_puts_the_best_matches_first():
+    notes = ranked_notes()
+    assert [note.title for note in notes.find_note("bread", ranked=True)] == ["Bread", "Plain", "Toast"]
+
+
+def test_tag_edits_leave_the_word_index_alone(monkeypatch):
+    notes = ranked_notes()
+    reindexed = []
+    monkeypatch.setattr(notes.text_index, "add", lambda note, texts: reindexed.append(note.title))
+    note = notes.find("Plain")
+    note.add_tag("kitchen")
+    note.edit_tag("kitchen", "pantry")
+    assert reindexed == []
+    assert [found.title for found in notes.find_note("pantry")] == ["Plain"]
+    note.change_content("rye bread")
+    assert reindexed == ["Plain"]
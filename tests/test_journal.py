@@ -0,0 +1,148 @@
+import os
+import time
+
+from src.models.contacts import Record
+from src.models.notes import Note
+from src.storage import snapshot
+from src.storage.journal import open_contacts, open_notes
+
+from conftest import contacts_of, make_book, notes_of, stop
+
+
+def wait_for_snapshot(journal, timeout=10):
+    """Wait until the background thread has written every queued snapshot (its frozen segments are gone)."""
+    deadline = time.monotonic() + timeout
+    while journal._segments() != [journal.path]:
+        assert time.monotonic() < deadline, "the snapshot was not written"
+        time.sleep(0.01)
+
+
+def change_book(book):
+    for name, phone in (("Dave Brown", "0501111111"), ("Eve Black", "0502222222")):
+        record = Record(name)
+        record.add_phone(phone)
+        book.add_record(record)
+    book.find("Alice Smith").change_phone("0501234567", "0503333333")
+    book.find("Bob Jones").change_name("Robert Jones")
+    book.delete("Carol White")
+
+
+def test_replays_the_log_after_a_crash(workdir):
+    filename = str(workdir / "addressbook.snap")
+    snapshot.save_contacts(make_book(), filename)
+    book, journal = open_contacts(filename, sync_every=1)
+    change_book(book)
+    expected = contacts_of(book)
+    stop(journal)
+
+    book, journal = open_contacts(filename)
+    try:
+        assert contacts_of(book) == expected
+        assert book.find_owner("phones", "0503333333") == "Alice Smith"
+        assert book.find_owner("phones", "0501234567") is None
+        assert book.find("Bob Jones") is None
+    finally:
+        journal.close()
+
+
+def test_ignores_a_torn_last_line(workdir):
+    filename = str(workdir / "notes.snap")
+    notes, journal = open_notes(filename, sync_every=1)
+    notes.add_note(Note("First", "kept"))
+    stop(journal)
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"op": "add", "title": "Sec')
+
+    notes, journal = open_notes(filename)
+    try:
+        assert notes_of(notes) == [("First", "kept", [])]
+    finally:
+        journal.close()
+
+
+def test_close_folds_the_log_into_the_snapshot(workdir):
+    filename = str(workdir / "addressbook.snap")
+    book, journal = open_contacts(filename)
+    for record in make_book().data.values():
+        book.add_record(record.copy())
+    change_book(book)
+    expected = contacts_of(book)
+    journal.close()
+
+    assert os.listdir(workdir) == ["addressbook.snap"]
+    book, journal = open_contacts(filename)
+    try:
+        assert contacts_of(book) == expected
+    finally:
+        journal.close()
+
+
+def test_close_without_changes_keeps_the_snapshot(workdir):
+    filename = str(workdir / "addressbook.snap")
+    snapshot.save_contacts(make_book(), filename)
+    before = os.stat(filename)
+    book, journal = open_contacts(filename)
+    assert book.find("Alice Smith") is not None
+    journal.close()
+
+    after = os.stat(filename)
+    assert (after.st_ino, after.st_mtime_ns) == (before.st_ino, before.st_mtime_ns)
+    assert not os.path.exists(journal.path)
+
+
+def test_compaction_writes_a_snapshot_and_drops_the_segment(workdir):
+    filename = str(workdir / "addressbook.snap")
+    snapshot.save_contacts(make_book(), filename)
+    book, journal = open_contacts(filename, compact_every=3)
+    try:
+        change_book(book)
+        assert journal.dirty >= 3
+        journal.checkpoint()
+        assert journal.dirty == 0
+        wait_for_snapshot(journal)
+        assert journal.error is None
+
+        loaded = snapshot.load_contacts(filename)
+        assert loaded.journal_seq == journal.seq
+        assert contacts_of(loaded) == contacts_of(book)
+    finally:
+        journal.close()
+
+
+def test_compaction_replays_only_newer_operations(workdir):
+    filename = str(workdir / "addressbook.snap")
+    snapshot.save_contacts(make_book(), filename)
+    book, journal = open_contacts(filename, sync_every=1)
+    change_book(book)
+    journal.compact()
+    wait_for_snapshot(journal)
+    book.find("Alice Smith").add_email("alice@work.example.com")
+    expected = contacts_of(book)
+    stop(journal)
+
+    book, journal = open_contacts(filename)
+    try:
+        assert contacts_of(book) == expected
+    finally:
+        journal.close()
+
+
+def test_a_second_rotation_with_nothing_logged_does_nothing(workdir):
+    filename = str(workdir / "addressbook.snap")
+    snapshot.save_contacts(make_book(), filename)
+    book, journal = open_contacts(filename)
+    change_book(book)
+    # Without the background thread, queued snapshots stay in the queue.
+    journal._stop.set()
+    journal._jobs.put(None)
+    journal._thread.join()
+
+    journal._rotate()
+    journal._rotate()
+    assert journal._jobs.qsize() == 1
+    assert len(journal._segments()) == 2
+
+    version, frozen = journal._jobs.get()
+    journal._write_snapshot(version, frozen)
+    journal._file.close()
+    assert contacts_of(snapshot.load_contacts(filename)) == contacts_of(book)
@@ -0,0 +1,54 @@
+import asyncio
+import os
+
+from src.models.contacts import AddressBook
+from src.models.notes import Notes
+from src.server import Server
+
+from conftest import contacts_of, make_book
+
+
+def run(server, *requests):
+    """Start the server on a free port, run the (command, args) requests in order, then stop it."""
+    async def main():
+        await server.start(port=0)
+        try:
+            return [await server.execute(command, args) for command, args in requests]
+        finally:
+            await server.stop()
+    return asyncio.run(main())
+
+
+def test_files_are_refused_without_a_data_directory(workdir):
+    server = Server(make_book(), Notes())
+    results = run(server, ("export", ["contacts.csv"]), ("import", ["/etc/passwd"]))
+    assert [status for _, status, _ in results] == ["error", "error"]
+    assert "--data-dir" in results[0][2]
+    assert os.listdir(workdir) == []
+
+
+def test_files_stay_inside_the_data_directory(workdir):
+    data = workdir / "data"
+    data.mkdir()
+    os.symlink(workdir, data / "up")
+    server = Server(make_book(), Notes(), data_dir=str(data))
+    results = run(
+        server,
+        ("export", ["contacts.csv"]),
+        ("export", ["../contacts.csv"]),
+        ("export", [str(workdir / "contacts.csv")]),
+        ("export", ["up/contacts.csv"]),
+    )
+    assert results[0][1] == "ok"
+    assert [message for _, _, message in results[1:]] == [
+        "'../contacts.csv' is outside the data directory.",
+        f"'{workdir / 'contacts.csv'}' is outside the data directory.",
+        "'up/contacts.csv' is outside the data directory.",
+    ]
+    assert sorted(os.listdir(data)) == ["contacts.csv", "up"]
+    assert not (workdir / "contacts.csv").exists()
+
+    book = AddressBook()
+    _, status, _ = run(Server(book, Notes(), data_dir=str(data)), ("import", ["contacts.csv"]))[0]
+    assert status == "ok"
+    assert contacts_of(book) == contacts_of(make_book())
@@ -0,0 +1,211 @@
+import os
+import shutil
+
+import pytest
+
+from src.models.contacts import AddressBook, Record
+from src.storage import snapshot
+from src.storage.persistence import DamagedFileWarning, LoadError
+
+from conftest import contacts_of, make_book, make_notes, notes_of
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+def big_book(contacts=2500):
+    """Enough contacts for three groups; the shared address goes to the string table."""
+    book = AddressBook()
+    for number in range(contacts):
+        book.add_record(Record.from_values(f"Contact {number:04d}", [f"050{number:07d}"], [], ["1 Main Street, Kyiv"]))
+    return book
+
+
+def rewrite(filename, change):
+    with open(filename, "rb") as f:
+        data = bytearray(f.read())
+    data = change(data)
+    with open(filename, "wb") as f:
+        f.write(data)
+
+
+def flip(offset):
+    def change(data):
+        data[offset] ^= 0xFF
+        return data
+    return change
+
+
+def groups(filename):
+    view = snapshot.Snapshot(filename, snapshot.KIND_CONTACTS)
+    try:
+        return view._groups
+    finally:
+        view.close()
+
+
+def test_contacts_round_trip(workdir):
+    book = make_book()
+    book.journal_seq = 5
+    snapshot.save_contacts(book, "addressbook.snap")
+
+    loaded = snapshot.load_contacts("addressbook.snap")
+    assert isinstance(loaded, snapshot.LazyAddressBook)
+    assert loaded.journal_seq == 5
+    assert len(loaded) == 3
+    assert loaded.find("carol white").str_birthday() == "29.02.2000"
+    assert loaded.find("Nobody") is None
+    assert contacts_of(loaded) == contacts_of(book)
+
+
+def test_notes_round_trip(workdir):
+    notes = make_notes()
+    snapshot.save_notes(notes, "notes.snap")
+
+    loaded = snapshot.load_notes("notes.snap")
+    assert loaded.find("Shopping").content == "Milk and bread"
+    assert notes_of(loaded) == notes_of(notes)
+
+
+def test_a_failed_save_keeps_the_old_snapshot(workdir, monkeypatch):
+    book = big_book()
+    snapshot.save_contacts(make_book(), "addressbook.snap")
+    encode = snapshot.encode_record
+
+    def failing(record, shared=None):
+        if record.name.value == "Contact 1500":
+            raise OSError("disk full")
+        return encode(record, shared)
+
+    # Frames reach the file as they are encoded: fail after the first group.
+    monkeypatch.setattr(snapshot, "encode_record", failing)
+    with pytest.raises(OSError, match="disk full"):
+        snapshot.save_contacts(book, "addressbook.snap")
+    assert os.listdir(workdir) == ["addressbook.snap"]
+    assert contacts_of(snapshot.load_contacts("addressbook.snap")) == contacts_of(make_book())
+
+
+@pytest.mark.parametrize("version", [1, 2])
+def test_reads_older_versions(version):
+    contacts = snapshot.load_contacts(os.path.join(DATA, f"contacts_v{version}.snap"))
+    assert contacts.journal_seq == 7
+    assert contacts.find("Alice Smith").str_emails() == "alice@example.com"
+    assert contacts_of(contacts) == contacts_of(make_book())
+
+    notes = snapshot.load_notes(os.path.join(DATA, f"notes_v{version}.snap"))
+    assert notes.journal_seq == 3
+    assert notes_of(notes) == notes_of(make_notes())
+
+
+@pytest.mark.parametrize("version", [1, 2])
+def test_older_versions_cut_short_do_not_load(workdir, version):
+    shutil.copy(os.path.join(DATA, f"contacts_v{version}.snap"), "addressbook.snap")
+    rewrite("addressbook.snap", lambda data: data[:-10])
+    with pytest.raises(LoadError, match="cut short"):
+        snapshot.load_contacts("addressbook.snap")
+
+
+def test_cut_short_recovers_the_whole_groups(workdir):
+    book = big_book()
+    snapshot.save_contacts(book, "addressbook.snap")
+    third_start, _ = groups("addressbook.snap")[2]
+    rewrite("addressbook.snap", lambda data: data[:third_start + 100])
+
+    with pytest.warns(DamagedFileWarning, match="recovered 2000 of 2500 contacts"):
+        loaded = snapshot.load_contacts("addressbook.snap")
+    assert contacts_of(loaded) == contacts_of(book)[:2000]
+    assert loaded.find_owner("phones", "0500000042") == "Contact 0042"
+
+
+def test_missing_key_table_recovers_every_group(workdir):
+    book = big_book()
+    snapshot.save_contacts(book, "addressbook.snap")
+    _, last_end = groups("addressbook.snap")[-1]
+    rewrite("addressbook.snap", lambda data: data[:last_end])
+
+    with pytest.warns(DamagedFileWarning, match="cut short.*recovered 2500 of 2500 contacts"):
+        loaded = snapshot.load_contacts("addressbook.snap")
+    assert contacts_of(loaded) == contacts_of(book)
+
+
+def test_bad_group_is_skipped(workdir):
+    book = big_book()
+    snapshot.save_contacts(book, "addressbook.snap")
+    start, end = groups("addressbook.snap")[1]
+    rewrite("addressbook.snap", flip((start + end) // 2))
+
+    # Opening checks only the header and the key table: the bad group is found when read.
+    loaded = snapshot.load_contacts("addressbook.snap")
+    assert isinstance(loaded, snapshot.LazyAddressBook)
+    with pytest.warns(DamagedFileWarning, match="bad data at byte.*recovered 1500 of 2500 contacts"):
+        found = contacts_of(loaded)
+    expected = contacts_of(book)
+    assert found == expected[:1000] + expected[2000:]
+
+
+def test_find_in_a_bad_group_loads_the_whole_groups(workdir):
+    book = big_book()
+    snapshot.save_contacts(book, "addressbook.snap")
+    start, end = groups("addressbook.snap")[1]
+    rewrite("addressbook.snap", flip((start + end) // 2))
+
+    loaded = snapshot.load_contacts("addressbook.snap")
+    with pytest.warns(DamagedFileWarning, match="recovered 1500 of 2500 contacts"):
+        assert loaded.find("Contact 1500") is None
+    assert loaded.find("Contact 2400").str_phones() == "0500002400"
+    assert len(loaded) == 1500
+
+
+def test_groups_are_checked_when_first_read(workdir):
+    snapshot.save_contacts(big_book(), "addressbook.snap")
+    view = snapshot.Snapshot("addressbook.snap", snapshot.KIND_CONTACTS)
+    try:
+        assert view._group_checked == [None, None, None]
+        view.record_at(view.lookup("Contact 2100"))
+        assert view._group_checked[2] is True
+        assert view.verify() is None
+        assert view._group_checked == [True, True, True]
+    finally:
+        view.close()
+
+
+def test_check_reports_damage(workdir, capsys):
+    snapshot.save_contacts(big_book(), "addressbook.snap")
+    snapshot.save_notes(make_notes(), "notes.snap")
+    assert snapshot.main(["check", "addressbook.snap", "notes.snap"]) == 0
+    start, end = groups("addressbook.snap")[0]
+    rewrite("addressbook.snap", flip(start + 10))
+
+    assert snapshot.main(["check", "addressbook.snap", "notes.snap"]) == 1
+    assert capsys.readouterr().out.splitlines()[2:] == [
+        f"addressbook.snap: bad data at byte {start - 16}.",
+        "notes.snap: 2 items, ok.",
+    ]
+
+
+def test_damaged_string_table_loses_only_the_items_using_it(workdir):
+    book = big_book(10)
+    book.add_record(Record.from_values("Alone", ["0990000000"]))
+    snapshot.save_contacts(book, "addressbook.snap")
+    strings = snapshot.Snapshot("addressbook.snap", snapshot.KIND_CONTACTS)
+    offset = strings._strings
+    strings.close()
+    rewrite("addressbook.snap", flip(offset + 20))
+
+    loaded = snapshot.load_contacts("addressbook.snap")
+    assert loaded.find("Alone").str_phones() == "0990000000"
+    with pytest.warns(DamagedFileWarning, match="recovered 1 of 11 contacts"):
+        assert [record.name.value for record in loaded.data.values()] == ["Alone"]
+
+
+@pytest.mark.parametrize("change", [lambda data: data[:20], flip(12)], ids=["cut in the header", "bad header"])
+def test_damaged_header_does_not_load(workdir, change):
+    snapshot.save_contacts(make_book(), "addressbook.snap")
+    rewrite("addressbook.snap", change)
+    with pytest.raises(LoadError):
+        snapshot.load_contacts("addressbook.snap")
+
+
+def test_wrong_kind_does_not_load(workdir):
+    snapshot.save_notes(make_notes(), "notes.snap")
+    with pytest.raises(LoadError, match="not a snapshot of this kind"):
+        snapshot.load_contacts("notes.snap")
@@ -0,0 +1,115 @@
+import threading
+
+from src.models.contacts import Record
+from src.models.notes import Note
+from src.storage import persistence, snapshot, sqlite_backend
+from src.storage.journal import open_contacts, open_notes
+
+from conftest import CONTACTS, contacts_of, make_book, make_notes, notes_of, stop
+
+
+def test_migrate_copies_the_journaled_changes(workdir):
+    snapshot.save_contacts(make_book(), "addressbook.snap")
+    snapshot.save_notes(make_notes(), "notes.snap")
+    book, contacts_journal = open_contacts("addressbook.snap", sync_every=1)
+    notes, notes_journal = open_notes("notes.snap", sync_every=1)
+    book.add_record(Record.from_values("Zed", ["0509999999"]))
+    book.delete("Bob Jones")
+    notes.add_note(Note("Later", "only in the log"))
+    expected_contacts, expected_notes = contacts_of(book), notes_of(notes)
+    # Leave the changes in the logs only, as after a crash.
+    stop(contacts_journal)
+    stop(notes_journal)
+
+    assert sqlite_backend.migrate() == (3, 3)
+    assert contacts_of(sqlite_backend.load_contacts()) == expected_contacts
+    assert notes_of(sqlite_backend.load_notes()) == expected_notes
+    # The source files still hold everything, now folded into the snapshots.
+    assert contacts_of(snapshot.load_contacts("addressbook.snap")) == expected_contacts
+    assert notes_of(snapshot.load_notes("notes.snap")) == expected_notes
+
+
+def test_migrate_reads_the_pickle_files_of_an_older_install(workdir):
+    persistence.save_contacts(make_book(), "addressbook.pkl")
+    persistence.save_notes(make_notes(), "notes.pkl")
+
+    assert sqlite_backend.migrate() == (3, 2)
+    assert contacts_of(sqlite_backend.load_contacts()) == contacts_of(make_book())
+    assert notes_of(sqlite_backend.load_notes()) == notes_of(make_notes())
+
+
+def names(records):
+    return [record.name.value for record in records]
+
+
+def changed(book, notes):
+    """The same changes to a book and notes of either kind."""
+    book.find("Alice Smith").change_phone("0501234567", "0503333333")
+    book.find("Bob Jones").change_name("Robert Jones")
+    book.find("Carol White").add_address("2 Side Street, Lviv")
+    book.delete("Dave Brown")
+    notes.find("Shopping").change_content("Eggs and cheese")
+    notes.find("Call Bob").add_tag("phone")
+
+
+def test_searches_match_the_in_memory_book(workdir):
+    contacts = CONTACTS + [("Dave Brown", ["0501111111"], [], ["1 Main Street, Kyiv"], None)]
+    book, notes = make_book(contacts), make_notes()
+    stored, stored_notes = sqlite_backend.load_contacts(), sqlite_backend.load_notes()
+    for record in book.data.values():
+        stored.add_record(record.copy())
+    for note in notes.notes.values():
+        stored_notes.add_note(note.copy())
+    changed(book, notes)
+    changed(stored, stored_notes)
+
+    # Short queries scan the tables, longer ones go through the trigram tables.
+    for field, query in [("name", "o"), ("name", "ROBERT"), ("name", "smith"), ("phones", "333"), ("phones", "0501234"),
+                         ("emails", "EXAMPLE"), ("addresses", "street"), ("addresses", "lviv"), ("birthday", "02.2000"), ("name", 'a"b')]:
+        assert names(stored.search(field, query)) == names(book.search(field, query)), (field, query)
+    for keyword in ["b", "bread", "EGGS", "phone", "todo", "shop"]:
+        assert [note.title for note in stored_notes.find_note(keyword)] == [note.title for note in notes.find_note(keyword)], keyword
+
+
+def test_old_databases_get_the_trigram_tables_filled(workdir):
+    book = sqlite_backend.load_contacts()
+    book.add_record(Record.from_values("Alice Smith", ["0501234567"]))
+    db = book.db
+    with db:
+        db.execute("DELETE FROM contacts_trigrams")
+        db.execute("PRAGMA user_version = 0")
+
+    assert [record.name.value for record in sqlite_backend.load_contacts().search("name", "smith")] == ["Alice Smith"]
+
+
+def test_old_databases_get_notes_fts_without_tags(workdir):
+    notes = sqlite_backend.load_notes()
+    for note in make_notes().notes.values():
+        notes.add_note(note.copy())
+    db = notes.db
+    with db:
+        db.execute("DROP TABLE notes_fts")
+        db.execute("CREATE VIRTUAL TABLE notes_fts USING fts5(title, content, tags)")
+        db.execute("INSERT INTO notes_fts (rowid, title, content, tags) SELECT id, title, content, 'todo' FROM notes")
+        db.execute("PRAGMA user_version = 1")
+
+    notes = sqlite_backend.load_notes()
+    assert [note.title for note in notes.search("milk")] == ["Shopping"]
+    assert notes.search("todo") == []
+    assert [note.title for note in notes.find_note("todo")] == ["Shopping", "Call Bob"]
+
+
+def test_a_reader_does_not_see_a_write_in_progress(workdir):
+    book = sqlite_backend.load_contacts()
+    book.add_record(Record.from_values("Alice Smith", ["0501234567"]))
+    seen = []
+
+    def reader():
+        seen.extend(name for (name,) in book.db.execute("SELECT name FROM contacts"))
+
+    with book.db:
+        book.db.execute("UPDATE contacts SET name = 'Uncommitted' WHERE name = 'Alice Smith'")
+        thread = threading.Thread(target=reader)
+        thread.start()
+        thread.join()
+    assert seen == ["Alice Smith"]
@@ -0,0 +1,19 @@
+from argparse import Namespace
+
+from src import stress
+
+
+def test_readers_see_only_whole_changes():
+    options = Namespace(contacts=200, writers=2, readers=3, seconds=0.5)
+    book, notes = stress.generated(options.contacts)
+    report = stress.invariants(book, notes, options)
+    assert report["violations"] == 0, report["examples"]
+    assert report["writes"] > 0
+    assert report["checks"] > options.contacts
+
+
+def test_check_once_reports_a_broken_index():
+    book, notes = stress.generated(10)
+    # Change a phone behind the index's back.
+    book.find("Contact 3").phones[0].value = "+380509999999"
+    assert stress.check_once(book, notes, 3, 10) == ["phone +380509999999: owned by None, held by Contact 3"]